@@ -5,17 +5,18 @@ Génère des propositions d'actions stratégiques basées sur les 4 analyses pr
 """
 
 import os
+import time
 import logging
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 from polco_llm_client import get_llm_client
+from polco_firestore_client import get_captation_document
 
 # Configuration
 PROJECT_ID = "polcoaigeneration-ved6"
 REGION = "us-central1"
 MODEL_NAME = "gemini-2.5-flash"
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class PolcoActionsProcessorV3:
@@ -39,16 +40,12 @@ class PolcoActionsProcessorV3:
     def get_captation_results(self, store_id: str) -> str:
         """Récupère les résultats de captation depuis polco_magasins_enhanced."""
         try:
-            from google.cloud import firestore
-            db = firestore.Client(project="polcoaigeneration-ved6")
-            doc_ref = db.collection(self.captation_collection).document(f"store_{store_id}")
-            doc = doc_ref.get()
+            data = get_captation_document(self.captation_collection, store_id)
             
-            if not doc.exists:
+            if data is None:
                 logger.warning(f"⚠️ Aucun résultat de captation trouvé pour store {store_id}")
                 return ""
             
-            data = doc.to_dict()
             prompts_results = data.get('prompts_results', {})
             
             if len(prompts_results) < 6:
@@ -205,33 +202,16 @@ Génère maintenant le contenu complet selon cette structure, en te basant EXCLU
             logger.info(f"📝 Prompt actions: {len(prompt)} caractères")
             
             # Générer l'analyse avec retry
-            start_time = datetime.now()
-            max_retries = 3
+            start_time = time.perf_counter()
+            # Les tentatives (backoff exponentiel avec jitter) sont gérées par le client LLM
+            response_text = self.llm_client.generate_simple(
+                prompt=prompt,
+                max_retries=3,
+                temperature=0.3,  # Créatif mais pas trop
+                max_tokens=8192
+            )
             
-            for attempt in range(max_retries):
-                try:
-                    response = self.model.generate_content(
-                        prompt,
-                        generation_config={
-                            "max_output_tokens": 32000,  
-                            "temperature": 0.3,  # Créatif mais pas trop
-                            "top_p": 0.8,
-                            "top_k": 40
-                        }
-                    )
-                    break  # Succès, sortir de la boucle
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 5
-                        logger.warning(f"⚠️ Erreur API Vertex (tentative {attempt + 1}/{max_retries}): {e}")
-                        logger.info(f"⏳ Attente {wait_time}s avant nouvelle tentative...")
-                        import time
-                        time.sleep(wait_time)
-                    else:
-                        raise e
-            
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
+            duration = time.perf_counter() - start_time
             
             if response_text:
                 result_length = len(response_text)
@@ -262,6 +242,7 @@ Génère maintenant le contenu complet selon cette structure, en te basant EXCLU
 
 def main():
     """Point d'entrée pour test."""
+    logging.basicConfig(level=logging.INFO)
     processor = PolcoActionsProcessorV3()
     logger.info("🎯 Test Processeur ACTIONS v3")
     logger.info("✅ Processeur ACTIONS v3 initialisé")
@@ -6,15 +6,24 @@ Coordonne les 4 processeurs spécialisés + graphiques + assembleur final
 """
 
 import os
+import re
 import sys
+import time
+import asyncio
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import logging
 
+from polco_firestore_client import get_firestore_client, hydrate_store_document, prefetch_captation_documents, IO_POOL
+
 # Configuration
 PROJECT_ID = "polcoaigeneration-ved6"
 DATA_COLLECTION = "polco_magasins_data"
 RESULT_COLLECTION = "polco_analyzer_3_0"
+# Magasins traités ensemble : les sections indépendantes sont lancées pour tout le lot
+STORE_BATCH_SIZE = 16
+# Appels LLM simultanés par section (plafond de requêtes côté fournisseur)
+LLM_MAX_CONCURRENCY = 16
 
 # Configuration des logs
 logging.basicConfig(
@@ -38,6 +47,8 @@ class PolcoAnalyzer30:
         self.result_collection = RESULT_COLLECTION
         self.captation_collection = captation_collection
         self.db = None
+        # Boucle créée par run() et réutilisée d'un magasin à l'autre (le client GenAI async y reste attaché)
+        self.event_loop = None
         self.stats = {
             'total_stores': 0,
             'successful_analyses': 0,
@@ -62,8 +73,8 @@ class PolcoAnalyzer30:
     def init_firestore(self) -> bool:
         """Initialise Firestore."""
         try:
-            from google.cloud import firestore
-            self.db = firestore.Client(project=self.project_id)
+            # Même client que les processeurs de section (canal gRPC partagé)
+            self.db = get_firestore_client(self.project_id)
             logger.info("✅ Firestore initialisé")
             return True
         except Exception as e:
@@ -95,7 +106,7 @@ class PolcoAnalyzer30:
             stores_data = []
             
             for doc in docs:
-                store_data = doc.to_dict()
+                store_data = hydrate_store_document(self.data_collection, doc.to_dict())
                 stores_data.append(store_data)
             
             self.stats['total_stores'] = len(stores_data)
@@ -132,8 +143,6 @@ class PolcoAnalyzer30:
 
     def detect_country_and_language(self, store_name: str, max_retries: int = 3) -> tuple:
         """Détecte le pays et la langue via LLM avec une logique de tentatives multiples."""
-        import re
-        import time
         try:
             # 1. Préparation du prompt
             city_match = re.search(r'(?:DECATHLON\s+)?(.+?)(?:\s+\d+)?$', store_name.strip(), re.IGNORECASE)
@@ -194,85 +203,173 @@ Exemples:
         logger.info(f"🌍 Fallback par défaut pour {store_name}: France, Français")
         return 'France', 'Français'
 
-    def process_single_store(self, store_data: Dict[str, Any], force_regenerate: bool = False) -> Optional[Dict[str, Any]]:
-        """Traite un magasin avec les 4 processeurs + graphiques + assemblage."""
+    async def run_independent_sections(self, stores: List[Tuple[Dict[str, Any], str, str]],
+                                       processors: Dict[str, Any]) -> List[List[Any]]:
+        """
+        Lance les 4 sections indépendantes pour tout un lot de magasins (store_data, country, language).
         
-        store_id = store_data.get('store_id', 'unknown')
-        store_name = store_data.get('store_name', f'Store_{store_id}')
+        CONTEXTE et CIBLES passent par aprocess_stores (appels LLM async, au plus
+        LLM_MAX_CONCURRENCY simultanés ; CIBLES regroupe plusieurs magasins par
+        appel) ; POTENTIEL et OFFRE, sans variante async,
+        sont exécutés magasin par magasin dans le pool d'E/S partagé.
+        
+        Returns:
+            Pour chaque magasin (dans l'ordre), ses résultats CONTEXTE, CIBLES, POTENTIEL, OFFRE
+        """
+        loop = asyncio.get_running_loop()
+        
+        async def _in_pool(processor):
+            return await asyncio.gather(
+                *(loop.run_in_executor(IO_POOL, processor.process_store, *store) for store in stores),
+                return_exceptions=True
+            )
+        
+        by_section = await asyncio.gather(
+            processors['CONTEXTE'].aprocess_stores(stores, LLM_MAX_CONCURRENCY),
+            processors['CIBLES'].aprocess_stores(stores, LLM_MAX_CONCURRENCY),
+            _in_pool(processors['POTENTIEL']),
+            _in_pool(processors['OFFRE']),
+            return_exceptions=True
+        )
+        # Une section en échec global compte comme un échec pour chaque magasin du lot
+        by_section = [[results] * len(stores) if isinstance(results, Exception) else results
+                      for results in by_section]
+        return [list(store_results) for store_results in zip(*by_section)]
+
+    def create_processors(self) -> Dict[str, Any]:
+        """Instancie les 5 processeurs, le générateur de graphiques et l'assembleur (une fois par lot)."""
+        from polco_contexte_processor import PolcoContexteProcessorV3
+        from polco_cibles_processor import PolcoCiblesProcessorV3
+        from polco_potentiel_processor import PolcoPotentielProcessorV3
+        from polco_offre_processor import PolcoOffreProcessorV3
+        from polco_actions_processor import PolcoActionsProcessorV3
+        from polco_graphics_generator import PolcoGraphicsGenerator
+        from polco_final_assembler import PolcoFinalAssembler
+        
+        # Processeurs v3 avec la collection de captation configurée
+        return {
+            'CONTEXTE': PolcoContexteProcessorV3(self.captation_collection),
+            'CIBLES': PolcoCiblesProcessorV3(self.captation_collection),
+            'POTENTIEL': PolcoPotentielProcessorV3(self.captation_collection),
+            'OFFRE': PolcoOffreProcessorV3(self.captation_collection),
+            'ACTIONS': PolcoActionsProcessorV3(self.captation_collection),
+            'GRAPHICS': PolcoGraphicsGenerator(),
+            'ASSEMBLER': PolcoFinalAssembler(),
+        }
+
+    def process_store_batch(self, stores_data: List[Dict[str, Any]], force_regenerate: bool = False) -> List[Optional[Dict[str, Any]]]:
+        """
+        Traite un lot de magasins : sections indépendantes en parallèle pour tout le lot,
+        puis ACTIONS + graphiques + assemblage magasin par magasin.
+        
+        Returns:
+            Le rapport final de chaque magasin (None en cas d'échec), dans l'ordre du lot
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(stores_data)
         force_regenerate = True
         try:
-            # Vérifier si l'analyse existe déjà (sauf si force)
-            if not force_regenerate:
-                existing_analysis = self.check_existing_analysis(store_id)
-                if existing_analysis:
-                    logger.info(f"✅ [{store_id}] Utilisation analyse existante")
-                    return existing_analysis
-            
-            logger.info(f"🏪 [{store_id}] Démarrage analyse complète POLCO 3.0")
-            start_time = datetime.now()
-            
-            # NOUVELLE LIGNE: Détection centralisée du pays et de la langue
-            country, language = self.detect_country_and_language(store_name)
+            pending = []  # (index, store_data, country, language)
+            for index, store_data in enumerate(stores_data):
+                store_id = store_data.get('store_id', 'unknown')
+                store_name = store_data.get('store_name', f'Store_{store_id}')
+                
+                # Vérifier si l'analyse existe déjà (sauf si force)
+                if not force_regenerate:
+                    existing_analysis = self.check_existing_analysis(store_id)
+                    if existing_analysis:
+                        logger.info(f"✅ [{store_id}] Utilisation analyse existante")
+                        results[index] = existing_analysis
+                        continue
+                
+                logger.info(f"🏪 [{store_id}] Démarrage analyse complète POLCO 3.0")
+                # Détection centralisée du pays et de la langue
+                country, language = self.detect_country_and_language(store_name)
+                pending.append((index, store_data, country, language))
             
-            # Importer les processeurs spécialisés
-            from polco_contexte_processor import PolcoContexteProcessorV3
-            from polco_cibles_processor import PolcoCiblesProcessorV3
-            from polco_potentiel_processor import PolcoPotentielProcessorV3
-            from polco_offre_processor import PolcoOffreProcessorV3
-            from polco_actions_processor import PolcoActionsProcessorV3
-            from polco_graphics_generator import PolcoGraphicsGenerator
-            from polco_final_assembler import PolcoFinalAssembler
+            if not pending:
+                return results
             
-            # Initialiser les processeurs v3 avec la collection de captation configurée
-            contexte_processor = PolcoContexteProcessorV3(self.captation_collection)
-            cibles_processor = PolcoCiblesProcessorV3(self.captation_collection)
-            potentiel_processor = PolcoPotentielProcessorV3(self.captation_collection)
-            offre_processor = PolcoOffreProcessorV3(self.captation_collection)
-            actions_processor = PolcoActionsProcessorV3(self.captation_collection)
-            graphics_generator = PolcoGraphicsGenerator()
-            final_assembler = PolcoFinalAssembler()
+            start_time = datetime.now()
+            processors = self.create_processors()
+            stores = [(store_data, country, language) for _, store_data, country, language in pending]
             
-            sections_results = []
+            # Charger la captation du lot juste avant les sections : les processeurs lancés
+            # en parallèle la lisent alors depuis le cache (un seul get_all pour le lot)
+            try:
+                prefetch_captation_documents(self.captation_collection,
+                                             [str(store_data.get('store_id')) for store_data, _, _ in stores])
+            except Exception as e:
+                logger.warning(f"⚠️ Préchargement captation du lot impossible: {e}")
             
-            # 1. PROCESSEUR CONTEXTE v2
-            logger.info(f"🎯 [{store_id}] Analyse CONTEXTE...")
-            contexte_result = contexte_processor.process_store(store_data, country, language)
-            if contexte_result:
-                sections_results.append(contexte_result)
-                logger.info(f"✅ [{store_id}] Contexte terminé ({contexte_result['metadata']['output_length']} chars)")
-            else:
-                logger.error(f"❌ [{store_id}] Échec processeur CONTEXTE")
+            # 1-4. PROCESSEURS CONTEXTE, CIBLES, POTENTIEL, OFFRE en parallèle pour tout le lot
+            # (sections indépendantes : même store_data, aucun état partagé)
+            logger.info(f"🚀 Analyses CONTEXTE, CIBLES, POTENTIEL, OFFRE en parallèle pour {len(stores)} magasin(s)...")
+            independent_results = self.event_loop.run_until_complete(
+                self.run_independent_sections(stores, processors)
+            )
             
-            # 2. PROCESSEUR CIBLES v2
-            logger.info(f"👥 [{store_id}] Analyse CIBLES...")
-            cibles_result = cibles_processor.process_store(store_data, country, language)
-            if cibles_result:
-                sections_results.append(cibles_result)
-                logger.info(f"✅ [{store_id}] Cibles terminé ({cibles_result['metadata']['output_length']} chars)")
-            else:
-                logger.error(f"❌ [{store_id}] Échec processeur CIBLES")
+            completed = []  # (index, store_data, sections, intégration graphiques, statistiques)
+            for (index, store_data, country, language), store_results in zip(pending, independent_results):
+                analysis = self.complete_store_analysis(
+                    store_data, country, language, store_results, processors
+                )
+                if analysis:
+                    completed.append((index, store_data, *analysis))
             
-            # 3. PROCESSEUR POTENTIEL v2
-            logger.info(f"📈 [{store_id}] Analyse POTENTIEL...")
-            potentiel_result = potentiel_processor.process_store(store_data, country, language)
-            if potentiel_result:
-                sections_results.append(potentiel_result)
-                logger.info(f"✅ [{store_id}] Potentiel terminé ({potentiel_result['metadata']['output_length']} chars)")
-            else:
-                logger.error(f"❌ [{store_id}] Échec processeur POTENTIEL")
+            # 7-8. ASSEMBLAGE puis SAUVEGARDE FIRESTORE groupée : un commit pour tous les rapports du lot
+            logger.info(f"🔧 Assemblage et sauvegarde de {len(completed)} rapport(s)...")
+            final_reports = processors['ASSEMBLER'].assemble_and_save_batch(
+                [(store_data.get('store_id', 'unknown'), sections_results, store_data, chart_integration)
+                 for _, store_data, sections_results, chart_integration, _ in completed],
+                self.db, self.result_collection
+            )
             
-            # 4. PROCESSEUR OFFRE v3
-            logger.info(f"🛍️ [{store_id}] Analyse OFFRE...")
-            offre_result = offre_processor.process_store(store_data, country, language)
-            if offre_result:
-                sections_results.append(offre_result)
-                logger.info(f"✅ [{store_id}] Offre terminé ({offre_result['metadata']['output_length']} chars)")
-            else:
-                logger.error(f"❌ [{store_id}] Échec processeur OFFRE")
+            for (index, store_data, _, _, processing_stats), final_report in zip(completed, final_reports):
+                store_id = store_data.get('store_id', 'unknown')
+                if not final_report:
+                    logger.error(f"❌ [{store_id}] Échec assemblage ou sauvegarde")
+                    continue
+                
+                processing_stats['total_output_length'] = final_report['total_length']
+                processing_stats['processing_time'] = (datetime.now() - start_time).total_seconds()
+                self.stats['processing_details'][store_id] = processing_stats
+                
+                logger.info(f"🎉 [{store_id}] Analyse POLCO 3.0 terminée !")
+                logger.info(f"📊 [{store_id}] Stats: {processing_stats['sections_completed']} sections, "
+                           f"{final_report['total_length']:,} chars, {processing_stats['processing_time']:.1f}s")
+                results[index] = final_report
+        except Exception as e:
+            logger.error(f"❌ Erreur traitement du lot: {e}")
+            self.stats['errors'].append(f"lot: {str(e)}")
+        
+        return results
+
+    def complete_store_analysis(self, store_data: Dict[str, Any], country: str, language: str,
+                                independent_results: List[Any],
+                                processors: Dict[str, Any]) -> Optional[Tuple[List[Dict[str, Any]], str, Dict[str, Any]]]:
+        """
+        Termine les sections d'un magasin : ACTIONS puis graphiques.
+        
+        Returns:
+            Les sections, l'intégration markdown des graphiques et les statistiques,
+            à assembler et sauvegarder avec le reste du lot ; None en cas d'échec
+        """
+        
+        store_id = store_data.get('store_id', 'unknown')
+        try:
+            sections_results = []
+            for section_name, result in zip(('CONTEXTE', 'CIBLES', 'POTENTIEL', 'OFFRE'), independent_results):
+                if isinstance(result, dict):
+                    sections_results.append(result)
+                    logger.info(f"✅ [{store_id}] {section_name.capitalize()} terminé ({result['metadata']['output_length']} chars)")
+                else:
+                    if isinstance(result, Exception):
+                        logger.error(f"❌ [{store_id}] Erreur processeur {section_name}: {result}")
+                    logger.error(f"❌ [{store_id}] Échec processeur {section_name}")
             
             # 5. PROCESSEUR ACTIONS v3 (Propositions d'actions basées sur les 4 analyses)
             logger.info(f"🎯 [{store_id}] Génération PROPOSITIONS D'ACTIONS...")
-            actions_result = actions_processor.process_store(store_data, sections_results, country, language)
+            actions_result = processors['ACTIONS'].process_store(store_data, sections_results, country, language)
             if actions_result:
                 sections_results.append(actions_result)
                 logger.info(f"✅ [{store_id}] Actions terminé ({actions_result['metadata']['output_length']} chars)")
@@ -285,6 +382,7 @@ Exemples:
                 return None
             
             # 6. GÉNÉRATEUR DE GRAPHIQUES
+            graphics_generator = processors['GRAPHICS']
             logger.info(f"📊 [{store_id}] Génération graphiques...")
             chart_filenames = graphics_generator.create_performance_dashboard(store_data, store_id)
             chart_integration = graphics_generator.generate_chart_markdown_integration(chart_filenames)
@@ -294,40 +392,13 @@ Exemples:
             else:
                 logger.warning(f"⚠️ [{store_id}] Aucun graphique généré")
             
-            # 6. ASSEMBLEUR FINAL
-            logger.info(f"🔧 [{store_id}] Assemblage rapport final...")
-            final_report = final_assembler.assemble_final_report(
-                store_id, sections_results, store_data, chart_integration
-            )
-            
-            # 7. SAUVEGARDE FIRESTORE
-            logger.info(f"💾 [{store_id}] Sauvegarde Firestore...")
-            saved = final_assembler.save_final_report_to_firestore(
-                final_report, self.db, self.result_collection
-            )
-            
-            if saved:
-                total_time = (datetime.now() - start_time).total_seconds()
-                
-                # Statistiques de traitement
-                processing_stats = {
-                    'sections_completed': len(sections_results),
-                    'total_output_length': final_report['total_length'],
-                    'charts_generated': len(chart_filenames),
-                    'processing_time': total_time,
-                    'sections_list': [s['section'] for s in sections_results]
-                }
-                
-                self.stats['processing_details'][store_id] = processing_stats
-                
-                logger.info(f"🎉 [{store_id}] Analyse POLCO 3.0 terminée !")
-                logger.info(f"📊 [{store_id}] Stats: {len(sections_results)} sections, "
-                           f"{final_report['total_length']:,} chars, {total_time:.1f}s")
-                
-                return final_report
-            else:
-                logger.error(f"❌ [{store_id}] Échec sauvegarde")
-                return None
+            # Statistiques de traitement (taille et durée ajoutées une fois le rapport sauvegardé)
+            processing_stats = {
+                'sections_completed': len(sections_results),
+                'charts_generated': len(chart_filenames),
+                'sections_list': [s['section'] for s in sections_results]
+            }
+            return sections_results, chart_integration, processing_stats
                 
         except Exception as e:
             logger.error(f"❌ [{store_id}] Erreur analyse complète: {e}")
@@ -356,18 +427,18 @@ Exemples:
             stores_data = stores_data[:limit]
             logger.info(f"🔬 Mode test: traitement de {limit} magasins seulement")
         
-        # Traiter chaque magasin
-        for i, store_data in enumerate(stores_data, 1):
-            store_id = store_data.get('store_id', f'store_{i}')
-            
-            logger.info(f"🏪 [{i}/{len(stores_data)}] Traitement magasin {store_id}")
+        # Traiter les magasins par lots (sections lancées en parallèle pour tout le lot)
+        for start in range(0, len(stores_data), STORE_BATCH_SIZE):
+            batch = stores_data[start:start + STORE_BATCH_SIZE]
+            store_ids = ', '.join(str(s.get('store_id', f'store_{start + i}')) for i, s in enumerate(batch, 1))
             
-            result = self.process_single_store(store_data, force_regenerate=getattr(self, 'force_regenerate', False))
+            logger.info(f"🏪 [{start + 1}-{start + len(batch)}/{len(stores_data)}] Traitement magasins {store_ids}")
             
-            if result:
-                self.stats['successful_analyses'] += 1
-            else:
-                self.stats['failed_analyses'] += 1
+            for result in self.process_store_batch(batch, force_regenerate=getattr(self, 'force_regenerate', False)):
+                if result:
+                    self.stats['successful_analyses'] += 1
+                else:
+                    self.stats['failed_analyses'] += 1
         
         return True
     
@@ -381,27 +452,34 @@ Exemples:
         logger.info("📊 Architecture: 4 Processeurs + Graphiques + Assembleur")
         logger.info("=" * 80)
         
-        # Vérifications
-        if not self.check_credentials():
-            return False
-        
-        if not self.init_firestore():
-            return False
-        
-        if not self.check_dependencies():
-            return False
-        
-        # Traitement
-        if target_store:
-            success = self.process_all_stores(target_store=target_store)
-        else:
-            limit = test_limit if test_mode else None
-            success = self.process_all_stores(limit)
-        
-        # Résumé final
-        self.print_final_summary()
-        
-        return success and self.stats['successful_analyses'] > 0
+        self.event_loop = asyncio.new_event_loop()
+        try:
+            # Vérifications
+            if not self.check_credentials():
+                return False
+            
+            if not self.init_firestore():
+                return False
+            
+            if not self.check_dependencies():
+                return False
+            
+            # Traitement
+            if target_store:
+                success = self.process_all_stores(target_store=target_store)
+            else:
+                limit = test_limit if test_mode else None
+                success = self.process_all_stores(limit)
+            
+            # Résumé final
+            self.print_final_summary()
+            
+            return success and self.stats['successful_analyses'] > 0
+        finally:
+            # Fermer la boucle partagée par tous les magasins (comme le ferait asyncio.run)
+            self.event_loop.run_until_complete(self.event_loop.shutdown_asyncgens())
+            self.event_loop.close()
+            self.event_loop = None
     
     def print_final_summary(self):
         """Affiche le résumé final."""
@@ -22,6 +22,30 @@ MODEL_NAME = "gemini-2.5-flash"  # Modèle plus puissant pour analyses complexes
 CSV_FILE = "polco_mag_test - Feuille 1.csv"
 PROMPTS_FILE = "prompts/prompt_captation.md"
 
+# Budget de tokens de sortie par prompt (la latence Gemini croît avec la longueur générée)
+DEFAULT_MAX_TOKENS = 8192
+PROMPT_MAX_TOKENS = {
+    1: 4096,  # Zone de chalandise
+    2: 4096,  # SWOT
+    3: 2048,  # Démographie
+    4: 2048,  # Tourisme/Infrastructures
+    5: 4096,  # Concurrence
+    6: 2048,  # Mobilité/Potentiel
+    7: 4096,  # Concurrence détaillée
+}
+# gemini-2.5-flash compte ses tokens de réflexion dans max_output_tokens : marge ajoutée au budget
+THINKING_HEADROOM_TOKENS = 2048
+
+# Schéma de sortie structurée pour la détection pays/langue
+COUNTRY_LANGUAGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "pays": {"type": "string"},
+        "langue": {"type": "string"}
+    },
+    "required": ["pays", "langue"]
+}
+
 # Configuration des logs
 logging.basicConfig(
     level=logging.INFO,
@@ -98,15 +122,18 @@ class PolcoCaptationProcessor:
                 content = f.read()
             
             # Extraire les 7 prompts avec regex améliorée
-            prompt_pattern = r'\*\*Prompt (\d+)\s*:\s*([^*]+)\*\*(.*?)(?=\*\*Prompt \d+|---|\Z)'
+            # Annotation optionnelle du budget de sortie: **Prompt 3 [max=2048]: Titre**
+            prompt_pattern = r'\*\*Prompt (\d+)\s*(?:\[max=(\d+)\])?\s*:\s*([^*]+)\*\*(.*?)(?=\*\*Prompt \d+|---|\Z)'
             matches = re.findall(prompt_pattern, content, re.DOTALL)
             
             for match in matches:
-                prompt_num, title, content = match
+                prompt_num, max_tokens, title, content = match
+                number = int(prompt_num)
                 self.prompts.append({
-                    'number': int(prompt_num),
+                    'number': number,
                     'title': title.strip(),
-                    'content': content.strip()
+                    'content': content.strip(),
+                    'max_tokens': int(max_tokens) if max_tokens else PROMPT_MAX_TOKENS.get(number, DEFAULT_MAX_TOKENS)
                 })
             
             if len(self.prompts) != 7:
@@ -115,7 +142,7 @@ class PolcoCaptationProcessor:
             
             logger.info(f"✅ {len(self.prompts)} prompts de captation chargés")
             for prompt in self.prompts:
-                logger.info(f"   📋 Prompt {prompt['number']}: {prompt['title']}")
+                logger.info(f"   📋 Prompt {prompt['number']}: {prompt['title']} (max {prompt['max_tokens']} tokens)")
             
             return True
             
@@ -141,7 +168,7 @@ class PolcoCaptationProcessor:
             return False
     
     def detect_country_and_language(self, store_row, max_retries: int = 3) -> tuple:
-        """Détecte le pays et la langue via LLM avec une logique de tentatives multiples."""
+        """Détecte le pays et la langue via LLM en sortie structurée JSON."""
         try:
             # 1. Préparation du prompt avec les informations du CSV
             store_name = store_row.get('store_name', 'INCONNU')
@@ -174,54 +201,36 @@ class PolcoCaptationProcessor:
             
             detection_prompt = f"""Dans quel pays est située la ville "{city_name}", et quelle langue officielle principale y est utilisée?
 
-Réponds UNIQUEMENT sous ce format exact:
-PAYS: [Nom du pays en français]
-LANGUE: [Langue principale]
+Renseigne "pays" avec le nom du pays en français et "langue" avec la langue principale.
 
 Exemples:
-- Pour "Forbach": PAYS: France, LANGUE: Français  
-- Pour "München": PAYS: Allemagne, LANGUE: Deutsch
-- Pour "Barcelona": PAYS: Espagne, LANGUE: Español
-- Pour "Milano": PAYS: Italie, LANGUE: Italiano"""
+- Pour "Forbach": pays France, langue Français
+- Pour "München": pays Allemagne, langue Deutsch
+- Pour "Barcelona": pays Espagne, langue Español
+- Pour "Milano": pays Italie, langue Italiano"""
 
-            # 2. Boucle de tentatives avec le client LLM standardisé
-            for attempt in range(max_retries):
-                try:
-                    # Utiliser le client LLM standardisé avec Google Search
-                    result = self.llm_client.generate_with_search(
-                        prompt=detection_prompt,
-                        max_retries=3,
-                        temperature=0.1,
-                        max_tokens=150
-                    )
+            # 2. Appel unique en sortie structurée (les tentatives réseau sont gérées par le client LLM)
+            result = self.llm_client.generate_json(
+                prompt=detection_prompt,
+                response_schema=COUNTRY_LANGUAGE_SCHEMA,
+                max_retries=max_retries,
+                temperature=0.1,
+                max_tokens=1024
+            )
 
-                    # 3. Validation de la réponse (logique adaptée à cette fonction)
-                    if result:
-                        country_match = re.search(r'PAYS:\s*([^,\n]+)', result, re.IGNORECASE)
-                        language_match = re.search(r'LANGUE:\s*([^,\n]+)', result, re.IGNORECASE)
-                        
-                        if country_match and language_match:
-                            country = country_match.group(1).strip()
-                            language = language_match.group(1).strip()
-                            logger.info(f"🌍 Détection LLM réussie: {city_name} -> {country}, {language}")
-                            return country, language # Succès, on quitte la fonction
-                    
-                    logger.warning(f"⚠️ Réponse invalide ou mal formatée pour {store_name} (tentative {attempt + 1}/{max_retries})")
+            # 3. Validation de la réponse
+            if result and result.get('pays') and result.get('langue'):
+                country = result['pays'].strip()
+                language = result['langue'].strip()
+                logger.info(f"🌍 Détection LLM réussie: {city_name} -> {country}, {language}")
+                return country, language
 
-                except Exception as e:
-                    logger.error(f"❌ Erreur détection LLM pour {store_name} (tentative {attempt + 1}): {e}")
-                    if attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 5 # Attente plus courte pour cette fonction rapide
-                        logger.info(f"⏳ Attente {wait_time}s avant nouvelle tentative...")
-                        time.sleep(wait_time)
-            
-            logger.error(f"❌ Échec définitif de la détection pour {store_name} après {max_retries} tentatives.")
+            logger.error(f"❌ Échec de la détection pour {store_name}: réponse {result}")
 
         except Exception as e:
-            # Gère les erreurs en amont de la boucle (ex: préparation du prompt)
             logger.error(f"❌ Erreur critique dans detect_country_and_language pour {store_name}: {e}")
 
-        # 4. Fallback par défaut si toutes les tentatives échouent
+        # 4. Fallback par défaut si la détection échoue
         logger.info(f"🌍 Fallback par défaut pour {store_name}: France, Français")
         return 'France', 'Français'
 
@@ -319,7 +328,7 @@ Exclusion : Ne mentionner AUCUN magasin si sa fermeture est confirmée."
         
         return queries_by_prompt.get(prompt_number, [f"{city} sport infrastructure"])
     
-    def execute_captation_prompt(self, store_row, prompt_content: str, prompt_number: int, context: str, max_retries: int = 3) -> Optional[str]:
+    def execute_captation_prompt(self, store_row, prompt_content: str, prompt_number: int, context: str, max_retries: int = 3, max_tokens: int = DEFAULT_MAX_TOKENS) -> Optional[str]:
         """Exécute un prompt avec recherches Google multiples et ciblées."""
         
         # Extraire les informations complètes du magasin
@@ -348,14 +357,18 @@ RAPPEL CRITIQUE: Utilise Google Search pour obtenir des informations précises,
                 logger.info(f"📋 {len(search_queries)} requêtes ciblées préparées")
                 
                 # Utiliser le client LLM standardisé avec Google Search
-                response_text = self.llm_client.generate_with_search(
+                response_text, truncated = self.llm_client.generate_with_search_checked(
                     prompt=full_prompt,
                     max_retries=3,
                     temperature=0.1,
-                    max_tokens=8192
+                    max_tokens=max_tokens + THINKING_HEADROOM_TOKENS
                 )
                 
-                if response_text and len(response_text) > 100:
+                if truncated:
+                    # Réponse coupée (MAX_TOKENS) : ne pas la sauvegarder, relancer avec un budget plus large
+                    logger.warning(f"⚠️ Prompt {prompt_number} coupé à {max_tokens} tokens (tentative {attempt + 1})")
+                    max_tokens = min(max_tokens * 2, DEFAULT_MAX_TOKENS)
+                elif response_text and len(response_text) > 100:
                     logger.info(f"✅ Prompt {prompt_number} réussi ({len(response_text)} chars)")
                     return response_text
                 else:
@@ -410,7 +423,8 @@ RAPPEL CRITIQUE: Utilise Google Search pour obtenir des informations précises,
                 store_row, 
                 prompt['content'], 
                 prompt['number'],
-                context
+                context,
+                max_tokens=prompt.get('max_tokens', DEFAULT_MAX_TOKENS)
             )
             
             execution_time = time.time() - start_time
@@ -5,19 +5,73 @@ Génère une analyse des cibles clients propre pour les rapports professionnels.
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Callable
 from datetime import datetime
-from polco_llm_client import get_llm_client
+from polco_llm_client import get_llm_client, get_generative_cache, GenerativeCache, gather_with_concurrency
+from polco_firestore_client import get_prompts_results, select_prompt_responses, IO_POOL
 
 # Configuration
 PROJECT_ID = "polcoaigeneration-ved6"
 REGION = "us-central1"
 MODEL_NAME = "gemini-2.5-flash"
+PROMPT_TEMPLATE_VERSION = "v3_standardized"
+RELEVANT_PROMPTS_CIBLES = ('prompt_1', 'prompt_2', 'prompt_7')
+REQUIRED_PROMPTS_CIBLES = frozenset(RELEVANT_PROMPTS_CIBLES)
+CIBLES_BATCH_SIZE = 4  # Magasins regroupés dans un même appel LLM (generate_batch)
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Parties statiques du prompt, construites une seule fois à l'import
+CIBLES_PROMPT_HEADER = """Tu es un analyste retail expert. Génère une analyse des cibles clients DIRECTEMENT UTILISABLE dans un rapport professionnel.
+
+🌍 **LOCALISATION ET ACTUALITÉ OBLIGATOIRES:**
+
+- RÉDIGER ENTIÈREMENT la réponse en {language}
+- Adapter les références culturelles et contextuelles au pays {country}
+
+🕐 **VÉRIFICATION D'ACTUALITÉ CRITIQUE:**
+- PRIORISER uniquement les informations actuelles et vérifiées (2024-2025)
+- EXCLURE les données manifestement périmées ou incertaines
+- SIGNALER explicitement toute information douteuse avec "À VÉRIFIER"
+- Privilégier les tendances et comportements clients RÉCENTS
+
+=== INSTRUCTIONS CRITIQUES ===
+- NE PAS inclure de formules de politesse ("Voici", "Absolument", etc.)
+- NE PAS mentionner de limitations de données ou fichiers manquants
+- NE PAS répéter les instructions
+- Générer UNIQUEMENT le contenu du rapport
+- Format Markdown professionnel
+- Ton factuel et analytique
+- CONSERVER TOUS LES DÉTAILS des données ultra enhanced (chiffres exacts, noms précis, adresses, coordonnées)
+- DÉVELOPPER EXHAUSTIVEMENT plutôt que résumer
+- INTÉGRER TOUS les éléments factuels des analyses sectorielles
+- ADAPTER le vocabulaire et les références au contexte {country}
+- **PRÉFÉRER LES TABLEAUX** aux listes complexes pour une meilleure lisibilité et mise en forme
+- Utiliser des tableaux Markdown pour les données structurées (segments clients, métriques, comparaisons)
+- Éviter les listes à puces trop longues ou complexes
+
+"""
+
+CIBLES_PROMPT_FOOTER = """=== CONTENU À GÉNÉRER ===
+
+## II. À QUI VENDRE (CIBLES CLIENTS)
+
+### 2.1 Segmentation Clientèle Actuelle
+[Profils démographiques et socio-économiques des clients existants, comportements d'achat, sports pratiqués, analyses de fidélité]
+
+### 2.2 Potentiel de Clientèle et Cibles à Conquérir
+[Segments de marché non exploités, besoins non satisfaits, nouvelles cibles prioritaires, stratégies d'acquisition et fidélisation]
+
+### 2.3 Parcours Client Omni-canal
+[Points de contact, optimisation expérience client, rôle du digital, synergies entre canaux]
+
+=== GÉNÉRATION ===
+Génère maintenant le contenu complet et professionnel selon cette structure, en te basant UNIQUEMENT sur les données fournies.
+"""
+
 class PolcoCiblesProcessorV3:
     """Processeur CIBLES v3 pour analyse propre et professionnelle."""
     
@@ -29,48 +83,37 @@ class PolcoCiblesProcessorV3:
         """Initialise Vertex AI."""
         try:
             # Le client LLM est déjà initialisé dans le constructeur
-            logger.info(f"✅ Client LLM standardisé initialisé ({MODEL_NAME})")
+            logger.info("✅ Client LLM standardisé initialisé (%s)", MODEL_NAME)
             return True
         except Exception as e:
-            logger.error(f"❌ Erreur Vertex AI: {e}")
+            logger.error("❌ Erreur Vertex AI: %s", e)
             return False
     
     def get_captation_results(self, store_id: str) -> str:
         """Récupère les résultats de captation depuis polco_magasins_enhanced."""
         try:
-            from google.cloud import firestore
-            db = firestore.Client(project="polcoaigeneration-ved6")
-            doc_ref = db.collection(self.captation_collection).document(f"store_{store_id}")
-            doc = doc_ref.get()
+            prompts_results = get_prompts_results(self.captation_collection, store_id)
             
-            if not doc.exists:
-                logger.warning(f"⚠️ Aucun résultat de captation trouvé pour store {store_id}")
+            if prompts_results is None:
+                logger.warning("⚠️ Aucun résultat de captation trouvé pour store %s", store_id)
                 return ""
             
-            data = doc.to_dict()
-            prompts_results = data.get('prompts_results', {})
-            
-            if len(prompts_results) < 6:
-                logger.warning(f"⚠️ Store {store_id}: seulement {len(prompts_results)}/6 prompts disponibles")
+            # Seuls les prompts utilisés par cette section sont exigés
+            if not REQUIRED_PROMPTS_CIBLES.issubset(prompts_results):
+                logger.warning("⚠️ Store %s: prompts manquants %s", store_id, sorted(REQUIRED_PROMPTS_CIBLES.difference(prompts_results)))
                 return ""
             
             # FILTRAGE CIBLÉ POUR CIBLES : seulement prompts 1, 2 (démographie + comportements)
-            relevant_prompts = ['prompt_1', 'prompt_2', 'prompt_7']
-            captation_content = "\n=== DONNÉES PERTINENTES POUR CIBLES ===\n"
+            captation_parts = ["\n=== DONNÉES PERTINENTES POUR CIBLES ===\n"]
             
-            for prompt_key in relevant_prompts:
-                if prompt_key in prompts_results:
-                    prompt_data = prompts_results[prompt_key]
-                    if prompt_data.get('status') == 'completed' and prompt_data.get('response'):
-                        # Limiter chaque prompt à 20k caractères
-                        response_text = prompt_data['response']
-                        captation_content += f"\n--- {prompt_key.upper()} (DÉMOGRAPHIE & COMPORTEMENTS) ---\n{response_text}\n"
+            for prompt_key, response_text in select_prompt_responses(prompts_results, RELEVANT_PROMPTS_CIBLES):
+                captation_parts.append(f"\n--- {prompt_key.upper()} (DÉMOGRAPHIE & COMPORTEMENTS) ---\n{response_text}\n")
             
-            logger.info(f"✅ Store {store_id}: données cibles récupérées (prompts 1-2)")
-            return captation_content
+            logger.info("✅ Store %s: données cibles récupérées (prompts 1-2)", store_id)
+            return "".join(captation_parts)
             
         except Exception as e:
-            logger.error(f"❌ Erreur récupération captation store {store_id}: {e}")
+            logger.error("❌ Erreur récupération captation store %s: %s", store_id, e)
             return ""
     
     def extract_client_data(self, complete_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -97,135 +140,219 @@ class PolcoCiblesProcessorV3:
     def build_clean_prompt(self, store_id: str, client_data: Dict[str, Any], country: str, language: str) -> str:
         """Construit un prompt propre pour l'analyse des cibles clients."""
         
-        prompt = f"""Tu es un analyste retail expert. Génère une analyse des cibles clients DIRECTEMENT UTILISABLE dans un rapport professionnel.
-
-🌍 **LOCALISATION ET ACTUALITÉ OBLIGATOIRES:**
-
-- RÉDIGER ENTIÈREMENT la réponse en {language}
-- Adapter les références culturelles et contextuelles au pays {country}
-
-🕐 **VÉRIFICATION D'ACTUALITÉ CRITIQUE:**
-- PRIORISER uniquement les informations actuelles et vérifiées (2024-2025)
-- EXCLURE les données manifestement périmées ou incertaines
-- SIGNALER explicitement toute information douteuse avec "À VÉRIFIER"
-- Privilégier les tendances et comportements clients RÉCENTS
-
-=== INSTRUCTIONS CRITIQUES ===
-- NE PAS inclure de formules de politesse ("Voici", "Absolument", etc.)
-- NE PAS mentionner de limitations de données ou fichiers manquants
-- NE PAS répéter les instructions
-- Générer UNIQUEMENT le contenu du rapport
-- Format Markdown professionnel
-- Ton factuel et analytique
-- CONSERVER TOUS LES DÉTAILS des données ultra enhanced (chiffres exacts, noms précis, adresses, coordonnées)
-- DÉVELOPPER EXHAUSTIVEMENT plutôt que résumer
-- INTÉGRER TOUS les éléments factuels des analyses sectorielles
-- ADAPTER le vocabulaire et les références au contexte {country}
-- **PRÉFÉRER LES TABLEAUX** aux listes complexes pour une meilleure lisibilité et mise en forme
-- Utiliser des tableaux Markdown pour les données structurées (segments clients, métriques, comparaisons)
-- Éviter les listes à puces trop longues ou complexes
-
-=== DONNÉES DISPONIBLES ===
-
-Données Magasin {store_id}:
-{client_data.get('synthesis', 'Données de synthèse non disponibles')}
-
-Analyses Sectorielles:
-{client_data.get('captation_content', 'Analyses sectorielles non disponibles')}
-
-=== CONTENU À GÉNÉRER ===
-
-## II. À QUI VENDRE (CIBLES CLIENTS)
-
-### 2.1 Segmentation Clientèle Actuelle
-[Profils démographiques et socio-économiques des clients existants, comportements d'achat, sports pratiqués, analyses de fidélité]
-
-### 2.2 Potentiel de Clientèle et Cibles à Conquérir
-[Segments de marché non exploités, besoins non satisfaits, nouvelles cibles prioritaires, stratégies d'acquisition et fidélisation]
-
-### 2.3 Parcours Client Omni-canal
-[Points de contact, optimisation expérience client, rôle du digital, synergies entre canaux]
-
-=== GÉNÉRATION ===
-Génère maintenant le contenu complet et professionnel selon cette structure, en te basant UNIQUEMENT sur les données fournies.
-"""
+        prompt = "".join([
+            CIBLES_PROMPT_HEADER.format(country=country, language=language),
+            f"=== DONNÉES DISPONIBLES ===\n\nDonnées Magasin {store_id}:\n",
+            client_data.get('synthesis', 'Données de synthèse non disponibles'),
+            "\n\nAnalyses Sectorielles:\n",
+            client_data.get('captation_content', 'Analyses sectorielles non disponibles'),
+            "\n\n",
+            CIBLES_PROMPT_FOOTER
+        ])
         
         return prompt
     
+    def prepare_prompt(self, store_data: Dict[str, Any], country: str, language: str) -> Optional[str]:
+        """Récupère les données clients et construit le prompt (partie bloquante)."""
+        
+        store_id = store_data.get('store_id', 'unknown')
+        
+        # Initialiser Vertex AI
+        if not self.init_vertex_ai():
+            return None
+        
+        # Extraire les données clients
+        client_data = self.extract_client_data(store_data)
+        
+        # Construire le prompt propre
+        prompt = self.build_clean_prompt(store_id, client_data, country, language)
+        
+        logger.info("👥 Génération analyse CIBLES v3 magasin %s", store_id)
+        logger.info("📝 Prompt cibles: %s caractères", len(prompt))
+        return prompt
+    
+    def build_result(self, store_id: str, prompt: str, response_text: Optional[str], duration: float) -> Optional[Dict[str, Any]]:
+        """Construit le résultat de section à partir de la réponse du LLM."""
+        if response_text:
+            result_length = len(response_text)
+            logger.info("✅ Cibles v3 générées: %s caractères en %.1fs", result_length, duration)
+            
+            return {
+                'section': 'CIBLES',
+                'content': response_text,
+                'metadata': {
+                    'store_id': store_id,
+                    'generation_time': duration,
+                    'input_length': len(prompt),
+                    'output_length': result_length,
+                    'timestamp': datetime.now().isoformat(),
+                    'model_used': MODEL_NAME,
+                    'version': 'v3_standardized'
+                }
+            }
+        else:
+            logger.error("❌ Réponse vide pour %s", store_id)
+            return None
+    
+    def cache_key(self, store_id: str, prompt: str, country: str, language: str) -> str:
+        """Clé du cache de réponses LLM pour ce magasin et ce prompt."""
+        return GenerativeCache.make_key(
+            store_id, 'CIBLES', country, language, PROMPT_TEMPLATE_VERSION,
+            self.llm_client.model_name, prompt
+        )
+    
     def process_store(self, store_data: Dict[str, Any], country: str, language: str) -> Optional[Dict[str, Any]]:
         """Traite un magasin pour l'analyse des cibles v3."""
         
         store_id = store_data.get('store_id', 'unknown')
-        logger.info(f"👥 PROCESSEUR CIBLES v3 - Magasin {store_id}")
+        logger.info("👥 PROCESSEUR CIBLES v3 - Magasin %s", store_id)
         
         try:
-            # Initialiser Vertex AI
-            if not self.init_vertex_ai():
+            prompt = self.prepare_prompt(store_data, country, language)
+            if prompt is None:
                 return None
             
-            # Extraire les données clients
-            client_data = self.extract_client_data(store_data)
-            
-            # Construire le prompt propre
-            prompt = self.build_clean_prompt(store_id, client_data, country, language)
-            
-            logger.info(f"👥 Génération analyse CIBLES v3 magasin {store_id}")
-            logger.info(f"📝 Prompt cibles: {len(prompt)} caractères")
-            
-            # Générer l'analyse avec retry
-            start_time = datetime.now()
-            max_retries = 3
-            
-            for attempt in range(max_retries):
-                try:
-                    response_text = self.llm_client.generate_simple(
-                prompt=prompt,
-                max_retries=3,
-                temperature=0.2,
-                max_tokens=32000
+            # Générer l'analyse sauf si la réponse est déjà en cache (retry géré par le client LLM)
+            start_time = time.perf_counter()
+            response_text = get_generative_cache().get_or_compute(
+                self.cache_key(store_id, prompt, country, language),
+                lambda: self.llm_client.generate_simple(
+                    prompt=prompt,
+                    max_retries=3,
+                    temperature=0.2,
+                    max_tokens=8192
+                ),
+                self.llm_client.model_name,
+                0.2
             )
-                    break  # Succès, sortir de la boucle
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 5
-                        logger.warning(f"⚠️ Erreur API Vertex (tentative {attempt + 1}/{max_retries}): {e}")
-                        logger.info(f"⏳ Attente {wait_time}s avant nouvelle tentative...")
-                        import time
-                        time.sleep(wait_time)
-                    else:
-                        raise e
             
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
+            duration = time.perf_counter() - start_time
             
-            if response_text:
-                result_length = len(response_text)
-                logger.info(f"✅ Cibles v3 générées: {result_length} caractères en {duration:.1f}s")
+            return self.build_result(store_id, prompt, response_text, duration)
                 
-                return {
-                    'section': 'CIBLES',
-                    'content': response_text,
-                    'metadata': {
-                        'store_id': store_id,
-                        'generation_time': duration,
-                        'input_length': len(prompt),
-                        'output_length': result_length,
-                        'timestamp': datetime.now().isoformat(),
-                        'model_used': MODEL_NAME,
-                        'version': 'v3_standardized'
-                    }
-                }
-            else:
-                logger.error(f"❌ Réponse vide pour {store_id}")
+        except Exception as e:
+            logger.error("❌ Erreur traitement cibles v3 %s: %s", store_id, e)
+            return None
+    
+    async def aprocess_store(self, store_data: Dict[str, Any], country: str, language: str,
+                             on_chunk: Optional[Callable[[str], None]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Version asynchrone de process_store : l'appel LLM n'occupe pas la boucle d'événements.
+        
+        La réponse est reçue en streaming ; on_chunk permet à l'appelant de traiter
+        chaque fragment (écriture fichier, rapport) avant la fin de la génération.
+        """
+        
+        store_id = store_data.get('store_id', 'unknown')
+        logger.info("👥 PROCESSEUR CIBLES v3 (async) - Magasin %s", store_id)
+        
+        try:
+            # La lecture Firestore reste synchrone : déportée dans le pool d'E/S partagé
+            prompt = await asyncio.get_running_loop().run_in_executor(
+                IO_POOL, self.prepare_prompt, store_data, country, language
+            )
+            if prompt is None:
                 return None
+            
+            start_time = time.perf_counter()
+            response_text = await get_generative_cache().aget_or_compute(
+                self.cache_key(store_id, prompt, country, language),
+                lambda: self.llm_client.generate_simple_streamed(
+                    prompt=prompt,
+                    max_retries=3,
+                    temperature=0.2,
+                    max_tokens=8192,
+                    on_chunk=on_chunk
+                ),
+                self.llm_client.model_name,
+                0.2
+            )
+            duration = time.perf_counter() - start_time
+            
+            return self.build_result(store_id, prompt, response_text, duration)
                 
         except Exception as e:
-            logger.error(f"❌ Erreur traitement cibles v3 {store_id}: {e}")
+            logger.error("❌ Erreur traitement cibles v3 %s: %s", store_id, e)
             return None
+    
+    def process_batch(self, stores: List[Tuple[Dict[str, Any], str, str]]) -> Tuple[List[Optional[Dict[str, Any]]], List[int]]:
+        """
+        Traite un lot de magasins (store_data, country, language) en un seul appel LLM groupé.
+        
+        Les réponses déjà en cache ne sont pas renvoyées au modèle ; les réponses
+        groupées sont mises en cache comme celles de process_store.
+        
+        Returns:
+            Les résultats dans l'ordre du lot, et les index des magasins absents (ou coupés)
+            de la réponse groupée, à retraiter individuellement
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(stores)
+        cache = get_generative_cache()
+        pending = []  # (index, store_id, prompt, cache_key)
+        
+        for index, (store_data, country, language) in enumerate(stores):
+            store_id = store_data.get('store_id', 'unknown')
+            try:
+                prompt = self.prepare_prompt(store_data, country, language)
+            except Exception as e:
+                logger.error("❌ Erreur préparation cibles v3 %s: %s", store_id, e)
+                continue
+            if prompt is None:
+                continue
+            cache_key = self.cache_key(store_id, prompt, country, language)
+            cached = cache.get(cache_key, self.llm_client.model_name, 0.2)
+            if cached is not None:
+                results[index] = self.build_result(store_id, prompt, cached, 0.0)
+            else:
+                pending.append((index, store_id, prompt, cache_key))
+        
+        if not pending:
+            return results, []
+        
+        logger.info("📦 Lot CIBLES v3: %s magasins en un appel (%s)", len(pending), ', '.join(str(p[1]) for p in pending))
+        start_time = time.perf_counter()
+        responses = self.llm_client.generate_batch(
+            [prompt for _, _, prompt, _ in pending],
+            max_retries=3,
+            temperature=0.2,
+            max_tokens=8192
+        )
+        duration = time.perf_counter() - start_time
+        
+        missing = []
+        for (index, store_id, prompt, cache_key), response_text in zip(pending, responses):
+            if response_text:
+                cache.set(cache_key, response_text, self.llm_client.model_name, 0.2)
+                results[index] = self.build_result(store_id, prompt, response_text, duration)
+            else:
+                logger.warning("⚠️ Store %s: absent de la réponse groupée, traitement individuel", store_id)
+                missing.append(index)
+        return results, missing
+    
+    async def aprocess_stores(self, stores: List[Tuple[Dict[str, Any], str, str]], max_concurrency: int = 16) -> List[Optional[Dict[str, Any]]]:
+        """
+        Traite plusieurs magasins (store_data, country, language) par lots de CIBLES_BATCH_SIZE.
+        
+        Chaque lot part en un seul appel groupé (process_batch, dans le pool d'E/S partagé) ;
+        au plus max_concurrency appels simultanés. Un magasin absent de la réponse groupée
+        est retraité seul via aprocess_store.
+        """
+        loop = asyncio.get_running_loop()
+        
+        async def _process_group(group):
+            results, missing = await loop.run_in_executor(IO_POOL, self.process_batch, group)
+            for index in missing:
+                results[index] = await self.aprocess_store(*group[index])
+            return results
+        
+        groups = [stores[start:start + CIBLES_BATCH_SIZE] for start in range(0, len(stores), CIBLES_BATCH_SIZE)]
+        group_results = await gather_with_concurrency([_process_group(group) for group in groups], max_concurrency)
+        return [result for results in group_results for result in results]
 
 
 def main():
     """Point d'entrée pour test."""
+    logging.basicConfig(level=logging.INFO)
     processor = PolcoCiblesProcessorV3()
     logger.info("👥 Test Processeur CIBLES v3 (Version Nettoyée)")
     logger.info("✅ Processeur CIBLES v3 initialisé")
@@ -6,90 +6,123 @@ Utilise la classe LLM standardisée pour éviter les erreurs de connexion.
 """
 
 import os
+import time
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Callable
 from datetime import datetime
-from polco_llm_client import get_llm_client
+from polco_llm_client import get_llm_client, get_generative_cache, GenerativeCache, gather_with_concurrency
+from polco_firestore_client import get_prompts_results, select_prompt_responses, IO_POOL
 
 # Configuration
 PROJECT_ID = "polcoaigeneration-ved6"
 REGION = "us-central1"
 MODEL_NAME = "gemini-2.5-flash"
+PROMPT_TEMPLATE_VERSION = "v3_standardized"
+RELEVANT_PROMPTS_CONTEXTE = ('prompt_1', 'prompt_2', 'prompt_3', 'prompt_7')
+REQUIRED_PROMPTS_CONTEXTE = frozenset(RELEVANT_PROMPTS_CONTEXTE)
+CAPTATION_RESPONSE_MAX_CHARS = 10000  # par prompt, pour éviter les timeouts
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Parties statiques du prompt, construites une seule fois à l'import
+CONTEXTE_PROMPT_HEADER = """Tu es un analyste retail expert. Génère une analyse de contexte DIRECTEMENT UTILISABLE dans un rapport professionnel.
+
+🌍 **LOCALISATION ET ACTUALITÉ OBLIGATOIRES:**
+
+- RÉDIGER ENTIÈREMENT la réponse en {language}
+- Adapter l'analyse au contexte économique et culturel du pays {country}
+
+=== INSTRUCTIONS CRITIQUES ===
+- NE PAS inclure de formules de politesse ("Voici", "Absolument", etc.)
+- NE PAS mentionner de limitations de données ou fichiers manquants
+- NE PAS répéter les instructions
+- Générer UNIQUEMENT le contenu du rapport
+- Format Markdown professionnel
+- Ton factuel et analytique
+- CONSERVER TOUS LES DÉTAILS des données ultra enhanced (chiffres exacts, noms précis, adresses, coordonnées)
+- DÉVELOPPER EXHAUSTIVEMENT plutôt que résumer
+- INTÉGRER TOUS les éléments factuels des analyses sectorielles
+- ADAPTER le vocabulaire et les références au contexte {country}
+- **PRÉFÉRER LES TABLEAUX** aux listes complexes pour une meilleure lisibilité et mise en forme
+- Utiliser des tableaux Markdown pour les données structurées (concurrents, métriques, comparaisons)
+- Éviter les listes à puces trop longues ou complexes
+
+"""
+
+CONTEXTE_PROMPT_FOOTER = """=== CONTENU À GÉNÉRER ===
+
+## I. CONTEXTE GÉNÉRAL ET LOCAL
+
+### 1.1 Stratégie Nationale Decathlon (Vision 2025-2027)
+[DÉVELOPPER EXHAUSTIVEMENT : orientations stratégiques complètes, ambitions PDM détaillées avec chiffres exacts, sports prioritaires avec pourcentages, implications directes et chiffrées pour le magasin {store_id}]
+
+### 1.2 Profil et Positionnement du Magasin
+[DÉVELOPPER EXHAUSTIVEMENT : format magasin avec surface exacte, positionnement national avec rang précis, CA exact, rentabilité par m², flux détaillés, rôle précis dans l'écosystème Decathlon local/régional]
+
+### 1.3 Zone de Chalandise et Environnement Local
+[DÉVELOPPER EXHAUSTIVEMENT : zone de chalandise avec limites précises, analyse démographique complète (population exacte, CSP détaillées avec %), économie (revenus exacts, taux chômage), infrastructures sportives nommées avec adresses, saisonnalité chiffrée, potentiel touristique quantifié]
+
+### 1.4 Analyse Concurrentielle Locale
+[DÉVELOPPER EXHAUSTIVEMENT : mapping concurrents avec noms exacts, adresses précises, distances, forces/faiblesses détaillées par segment, positionnement prix quantifié, opportunités de différenciation factuelles]
+
+### 1.5 Matrice SWOT Approfondie du Magasin
+[DÉVELOPPER EXHAUSTIVEMENT : FORCES, FAIBLESSES, OPPORTUNITÉS, MENACES avec tous les éléments concrets, chiffres exacts, noms précis et données mesurables des analyses sectorielles]
+
+=== GÉNÉRATION ===
+Génère maintenant le contenu complet et professionnel selon cette structure, en te basant UNIQUEMENT sur les données fournies.
+"""
+
+
 class PolcoContexteProcessorV3:
     """Processeur CONTEXTE v3 pour analyse propre et professionnelle."""
     
     def __init__(self, captation_collection="polco_magasins_captation"):
         self.llm_client = get_llm_client()
-        self.polco_fr_content = ""
         self.captation_collection = captation_collection
     
 
     def init_vertex_ai(self) -> bool:
         """Initialise le client LLM standardisé."""
         try:
-            logger.info(f"🔧 Initialisation client LLM standardisé...")
-            logger.info(f"  - Project: {PROJECT_ID}")
-            logger.info(f"  - Region: {REGION}")
-            logger.info(f"  - Model: {self.llm_client.model_name}")
+            logger.info("🔧 Initialisation client LLM standardisé...")
+            logger.info("  - Project: %s", PROJECT_ID)
+            logger.info("  - Region: %s", REGION)
+            logger.info("  - Model: %s", self.llm_client.model_name)
             
             # Le client LLM est déjà initialisé dans le constructeur
-            logger.info(f"✅ Client LLM standardisé initialisé ({self.llm_client.model_name})")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Erreur client LLM: {e}")
-            return False
-    
-    def load_polco_fr(self) -> bool:
-        """Charge le contenu polcoFR.txt."""
-        try:
-            with open("polcoFR.txt", 'r', encoding='utf-8') as f:
-                self.polco_fr_content = f.read()
-            logger.info(f"✅ polcoFR.txt chargé ({len(self.polco_fr_content)} caractères)")
+            logger.info("✅ Client LLM standardisé initialisé (%s)", self.llm_client.model_name)
             return True
         except Exception as e:
-            logger.error(f"❌ Erreur lecture polcoFR.txt: {e}")
+            logger.error("❌ Erreur client LLM: %s", e)
             return False
     
     def get_captation_results(self, store_id: str) -> str:
         """Récupère les résultats de captation depuis la collection configurée."""
         try:
-            from google.cloud import firestore
-            db = firestore.Client(project="polcoaigeneration-ved6")
-            doc_ref = db.collection(self.captation_collection).document(f"store_{store_id}")
-            doc = doc_ref.get()
+            prompts_results = get_prompts_results(self.captation_collection, store_id)
             
-            if not doc.exists:
-                logger.warning(f"⚠️ Aucun résultat de captation trouvé pour store {store_id}")
+            if prompts_results is None:
+                logger.warning("⚠️ Aucun résultat de captation trouvé pour store %s", store_id)
                 return ""
             
-            data = doc.to_dict()
-            prompts_results = data.get('prompts_results', {})
-            
-            if len(prompts_results) < 6:
-                logger.warning(f"⚠️ Store {store_id}: seulement {len(prompts_results)}/6 prompts disponibles")
+            # Seuls les prompts utilisés par cette section sont exigés
+            if not REQUIRED_PROMPTS_CONTEXTE.issubset(prompts_results):
+                logger.warning("⚠️ Store %s: prompts manquants %s", store_id, sorted(REQUIRED_PROMPTS_CONTEXTE.difference(prompts_results)))
                 return ""
             
             # FILTRAGE CIBLÉ POUR CONTEXTE : seulement prompts 1, 2, 3
-            relevant_prompts = ['prompt_1', 'prompt_2', 'prompt_3', 'prompt_7']
-            captation_content = "\n=== DONNÉES PERTINENTES POUR CONTEXTE ===\n"
+            captation_parts = ["\n=== DONNÉES PERTINENTES POUR CONTEXTE ===\n"]
             
-            for prompt_key in relevant_prompts:
-                if prompt_key in prompts_results:
-                    prompt_data = prompts_results[prompt_key]
-                    if prompt_data.get('status') == 'completed' and prompt_data.get('response'):
-                        # Limiter chaque prompt à 10k caractères pour éviter les timeouts
-                        response_text = prompt_data['response'][:10000]
-                        captation_content += f"\n--- {prompt_key.upper()} (ZONE & CONCURRENCE) ---\n{response_text}\n"
+            responses = select_prompt_responses(prompts_results, RELEVANT_PROMPTS_CONTEXTE, CAPTATION_RESPONSE_MAX_CHARS)
+            for prompt_key, response_text in responses:
+                captation_parts.append(f"\n--- {prompt_key.upper()} (ZONE & CONCURRENCE) ---\n{response_text}\n")
             
-            logger.info(f"✅ Store {store_id}: données contexte récupérées (prompts 1-3)")
-            return captation_content
+            logger.info("✅ Store %s: données contexte récupérées (prompts 1-3)", store_id)
+            return "".join(captation_parts)
             
         except Exception as e:
-            logger.error(f"❌ Erreur récupération captation store {store_id}: {e}")
+            logger.error("❌ Erreur récupération captation store %s: %s", store_id, e)
             return ""
     
     def extract_available_data(self, complete_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -116,131 +149,156 @@ class PolcoContexteProcessorV3:
     def build_clean_prompt(self, store_id: str, available_data: Dict[str, Any], country: str, language: str) -> str:
         """Construit un prompt propre pour génération de rapport professionnel."""
         
-        prompt = f"""Tu es un analyste retail expert. Génère une analyse de contexte DIRECTEMENT UTILISABLE dans un rapport professionnel.
-
-🌍 **LOCALISATION ET ACTUALITÉ OBLIGATOIRES:**
-
-- RÉDIGER ENTIÈREMENT la réponse en {language}
-- Adapter l'analyse au contexte économique et culturel du pays {country}
-
-=== INSTRUCTIONS CRITIQUES ===
-- NE PAS inclure de formules de politesse ("Voici", "Absolument", etc.)
-- NE PAS mentionner de limitations de données ou fichiers manquants
-- NE PAS répéter les instructions
-- Générer UNIQUEMENT le contenu du rapport
-- Format Markdown professionnel
-- Ton factuel et analytique
-- CONSERVER TOUS LES DÉTAILS des données ultra enhanced (chiffres exacts, noms précis, adresses, coordonnées)
-- DÉVELOPPER EXHAUSTIVEMENT plutôt que résumer
-- INTÉGRER TOUS les éléments factuels des analyses sectorielles
-- ADAPTER le vocabulaire et les références au contexte {country}
-- **PRÉFÉRER LES TABLEAUX** aux listes complexes pour une meilleure lisibilité et mise en forme
-- Utiliser des tableaux Markdown pour les données structurées (concurrents, métriques, comparaisons)
-- Éviter les listes à puces trop longues ou complexes
-
-=== DONNÉES DISPONIBLES ===
-
-Données Magasin {store_id}:
-{available_data.get('synthesis', 'Données de synthèse non disponibles')[:15000]}
-
-Analyses Sectorielles:
-{available_data.get('captation_content', 'Analyses sectorielles non disponibles')}
-
-=== CONTENU À GÉNÉRER ===
-
-## I. CONTEXTE GÉNÉRAL ET LOCAL
-
-### 1.1 Stratégie Nationale Decathlon (Vision 2025-2027)
-[DÉVELOPPER EXHAUSTIVEMENT : orientations stratégiques complètes, ambitions PDM détaillées avec chiffres exacts, sports prioritaires avec pourcentages, implications directes et chiffrées pour le magasin {store_id}]
-
-### 1.2 Profil et Positionnement du Magasin
-[DÉVELOPPER EXHAUSTIVEMENT : format magasin avec surface exacte, positionnement national avec rang précis, CA exact, rentabilité par m², flux détaillés, rôle précis dans l'écosystème Decathlon local/régional]
-
-### 1.3 Zone de Chalandise et Environnement Local
-[DÉVELOPPER EXHAUSTIVEMENT : zone de chalandise avec limites précises, analyse démographique complète (population exacte, CSP détaillées avec %), économie (revenus exacts, taux chômage), infrastructures sportives nommées avec adresses, saisonnalité chiffrée, potentiel touristique quantifié]
-
-### 1.4 Analyse Concurrentielle Locale
-[DÉVELOPPER EXHAUSTIVEMENT : mapping concurrents avec noms exacts, adresses précises, distances, forces/faiblesses détaillées par segment, positionnement prix quantifié, opportunités de différenciation factuelles]
+        prompt = "".join([
+            CONTEXTE_PROMPT_HEADER.format(country=country, language=language),
+            f"=== DONNÉES DISPONIBLES ===\n\nDonnées Magasin {store_id}:\n",
+            available_data.get('synthesis', 'Données de synthèse non disponibles')[:15000],
+            "\n\nAnalyses Sectorielles:\n",
+            available_data.get('captation_content', 'Analyses sectorielles non disponibles'),
+            "\n\n",
+            CONTEXTE_PROMPT_FOOTER.format(store_id=store_id)
+        ])
+        #logger.info("🔍 Prompt envoyé : %s...", prompt)
+        return prompt
+    
+    def prepare_prompt(self, store_data: Dict[str, Any], country: str, language: str) -> Optional[str]:
+        """Récupère les données disponibles et construit le prompt (partie bloquante)."""
+        
+        store_id = store_data.get('store_id', 'unknown')
+        
+        # Initialiser Vertex AI
+        if not self.init_vertex_ai():
+            return None
+        
+        # Extraire les données disponibles
+        available_data = self.extract_available_data(store_data)
 
-### 1.5 Matrice SWOT Approfondie du Magasin
-[DÉVELOPPER EXHAUSTIVEMENT : FORCES, FAIBLESSES, OPPORTUNITÉS, MENACES avec tous les éléments concrets, chiffres exacts, noms précis et données mesurables des analyses sectorielles]
+        # Construire le prompt propre
+        prompt = self.build_clean_prompt(store_id, available_data, country, language)
 
-=== GÉNÉRATION ===
-Génère maintenant le contenu complet et professionnel selon cette structure, en te basant UNIQUEMENT sur les données fournies.
-"""
-        #logger.info(f"🔍 Prompt envoyé : {prompt}...")
+        logger.info("📊 Génération analyse CONTEXTE v3 magasin %s", store_id)
+        logger.info("📝 Prompt contexte: %s caractères", len(prompt))
+        
+        # Diagnostic détaillé
+        logger.info("🔍 Diagnostic prompt store %s:", store_id)
+        logger.info("  - Taille synthesis: %s chars", len(available_data.get('synthesis', '')))  
+        logger.info("  - Taille captation: %s chars", len(available_data.get('captation_content', '')))
+        logger.info("  - Model: %s", self.llm_client.model_name)
         return prompt
     
+    def build_result(self, store_id: str, prompt: str, response_text: Optional[str], duration: float) -> Optional[Dict[str, Any]]:
+        """Construit le résultat de section à partir de la réponse du LLM."""
+        if response_text:
+            result_length = len(response_text)
+            logger.info("✅ Contexte v3 généré: %s caractères en %.1fs", result_length, duration)
+            
+            return {
+                'section': 'CONTEXTE',
+                'content': response_text,
+                'metadata': {
+                    'store_id': store_id,
+                    'generation_time': duration,
+                    'input_length': len(prompt),
+                    'output_length': result_length,
+                    'timestamp': datetime.now().isoformat(),
+                    'model_used': self.llm_client.model_name,
+                    'version': 'v3_standardized'
+                }
+            }
+        else:
+            logger.error("❌ Réponse vide pour %s", store_id)
+            return None
+    
+    def cache_key(self, store_id: str, prompt: str, country: str, language: str) -> str:
+        """Clé du cache de réponses LLM pour ce magasin et ce prompt."""
+        return GenerativeCache.make_key(
+            store_id, 'CONTEXTE', country, language, PROMPT_TEMPLATE_VERSION,
+            self.llm_client.model_name, prompt
+        )
+    
     def process_store(self, store_data: Dict[str, Any], country: str, language: str) -> Optional[Dict[str, Any]]:
         """Traite un magasin pour l'analyse contextuelle v3."""
         
         store_id = store_data.get('store_id', 'unknown')
-        logger.info(f"🎯 PROCESSEUR CONTEXTE v3 - Magasin {store_id}")
+        logger.info("🎯 PROCESSEUR CONTEXTE v3 - Magasin %s", store_id)
         
         try:
-            # Initialiser Vertex AI
-            if not self.init_vertex_ai():
-                return None
-            
-            # Charger polcoFR
-            if not self.load_polco_fr():
+            prompt = self.prepare_prompt(store_data, country, language)
+            if prompt is None:
                 return None
-            
-            # Extraire les données disponibles
-            available_data = self.extract_available_data(store_data)
-
-            # Construire le prompt propre
-            prompt = self.build_clean_prompt(store_id, available_data, country, language)
-
-            logger.info(f"📊 Génération analyse CONTEXTE v3 magasin {store_id}")
-            logger.info(f"📝 Prompt contexte: {len(prompt)} caractères")
-            
-            # Diagnostic détaillé
-            logger.info(f"🔍 Diagnostic prompt store {store_id}:")
-            logger.info(f"  - Taille synthesis: {len(available_data.get('synthesis', ''))} chars")  
-            logger.info(f"  - Taille captation: {len(available_data.get('captation_content', ''))} chars")
-            logger.info(f"  - Model: {self.llm_client.model_name}")
 
             # Générer l'analyse avec le client LLM standardisé
-            start_time = datetime.now()
+            start_time = time.perf_counter()
             
-            logger.info(f"🔄 Génération avec client LLM standardisé pour store {store_id}")
+            logger.info("🔄 Génération avec client LLM standardisé pour store %s", store_id)
             
-            response_text = self.llm_client.generate_simple(
-                prompt=prompt,
-                max_retries=3,
-                temperature=0.1,
-                max_tokens=20000
+            response_text = get_generative_cache().get_or_compute(
+                self.cache_key(store_id, prompt, country, language),
+                lambda: self.llm_client.generate_simple(
+                    prompt=prompt,
+                    max_retries=3,
+                    temperature=0.1,
+                    max_tokens=8192
+                ),
+                self.llm_client.model_name,
+                0.1
             )
             
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
+            duration = time.perf_counter() - start_time
             
-            if response_text:
-                result_length = len(response_text)
-                logger.info(f"✅ Contexte v3 généré: {result_length} caractères en {duration:.1f}s")
+            return self.build_result(store_id, prompt, response_text, duration)
                 
-                return {
-                    'section': 'CONTEXTE',
-                    'content': response_text,
-                    'metadata': {
-                        'store_id': store_id,
-                        'generation_time': duration,
-                        'input_length': len(prompt),
-                        'output_length': result_length,
-                        'timestamp': datetime.now().isoformat(),
-                        'model_used': self.llm_client.model_name,
-                        'version': 'v3_standardized'
-                    }
-                }
-            else:
-                logger.error(f"❌ Réponse vide pour {store_id}")
+        except Exception as e:
+            logger.error("❌ Erreur traitement contexte v3 %s: %s", store_id, e)
+            return None
+    
+    async def aprocess_store(self, store_data: Dict[str, Any], country: str, language: str,
+                             on_chunk: Optional[Callable[[str], None]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Version asynchrone de process_store : l'appel LLM n'occupe pas la boucle d'événements.
+        
+        La réponse est reçue en streaming ; on_chunk permet à l'appelant de traiter
+        chaque fragment (écriture fichier, rapport) avant la fin de la génération.
+        """
+        
+        store_id = store_data.get('store_id', 'unknown')
+        logger.info("🎯 PROCESSEUR CONTEXTE v3 (async) - Magasin %s", store_id)
+        
+        try:
+            # La lecture Firestore reste synchrone : déportée dans le pool d'E/S partagé
+            prompt = await asyncio.get_running_loop().run_in_executor(
+                IO_POOL, self.prepare_prompt, store_data, country, language
+            )
+            if prompt is None:
                 return None
+            
+            start_time = time.perf_counter()
+            response_text = await get_generative_cache().aget_or_compute(
+                self.cache_key(store_id, prompt, country, language),
+                lambda: self.llm_client.generate_simple_streamed(
+                    prompt=prompt,
+                    max_retries=3,
+                    temperature=0.1,
+                    max_tokens=8192,
+                    on_chunk=on_chunk
+                ),
+                self.llm_client.model_name,
+                0.1
+            )
+            duration = time.perf_counter() - start_time
+            
+            return self.build_result(store_id, prompt, response_text, duration)
                 
         except Exception as e:
-            logger.error(f"❌ Erreur traitement contexte v3 {store_id}: {e}")
+            logger.error("❌ Erreur traitement contexte v3 %s: %s", store_id, e)
             return None
-
+    
+    async def aprocess_stores(self, stores: List[Tuple[Dict[str, Any], str, str]], max_concurrency: int = 16) -> List[Optional[Dict[str, Any]]]:
+        """Traite plusieurs magasins (store_data, country, language) en parallèle, concurrence bornée."""
+        return await gather_with_concurrency(
+            [self.aprocess_store(store_data, country, language) for store_data, country, language in stores],
+            max_concurrency
+        )
 
     def test_api_simple(self) -> bool:
         """Test simple de l'API avec le client LLM standardisé."""
@@ -253,23 +311,24 @@ Génère maintenant le contenu complet et professionnel selon cette structure, e
                 prompt=simple_prompt,
                 max_retries=3,
                 temperature=0.1,
-                max_tokens=1000
+                max_tokens=4096  # le budget inclut les tokens de réflexion du modèle
             )
             
             if response_text:
-                logger.info(f"✅ Test API réussi: {len(response_text)} chars")
-                logger.info(f"📝 Réponse: {response_text[:100]}...")
+                logger.info("✅ Test API réussi: %s chars", len(response_text))
+                logger.info("📝 Réponse: %s...", response_text[:100])
                 return True
             else:
                 logger.error("❌ Test API échoué: réponse vide")
                 return False
                 
         except Exception as e:
-            logger.error(f"❌ Test API échoué: {e}")
+            logger.error("❌ Test API échoué: %s", e)
             return False
 
 def main():
     """Point d'entrée pour test."""
+    logging.basicConfig(level=logging.INFO)
     processor = PolcoContexteProcessorV3()
     logger.info("🎯 Test Processeur CONTEXTE v3 (Version Nettoyée)")
     
@@ -8,21 +8,41 @@ Basé sur le code fourni, adapté pour l'architecture POLCO
 import os
 import sys
 import time
+import random
+import string
+import asyncio
+import io
+import csv
 import json
+import hashlib
+import uuid
+import multiprocessing
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 import threading
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import logging
 from pathlib import Path
 import subprocess
+from datetime import datetime, timezone
 
 # Configuration matplotlib pour macOS et multithreading
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import seaborn as sns
 
+# Décodage CSV en C++ si pyarrow est disponible
+try:
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pa_parquet
+    import pyarrow as pa
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
 # Configuration du logging
 logging.basicConfig(
     level=logging.INFO,
@@ -39,6 +59,17 @@ ENV = 'prod'
 PROFILE_NAME = 'decathlon-prod'  # Profil pour le compte Decathlon
 QUERIES_CONFIG_FILE = 'polco_queries_config.json'
 DATA_ROOT_DIR = 'data'
+# Sortie partitionnée (Hive) : racine distincte de data/, qui est parcouru par magasin
+PARTITIONED_ROOT_DIR = 'data_partitioned'
+PARQUET_ZSTD_LEVEL = 3
+# Journal des couples (magasin, requête) déjà produits, pour reprendre un run interrompu
+MANIFEST_FILENAME = '_manifest.jsonl'
+# Seules les requêtes de lecture peuvent être enveloppées dans un UNLOAD
+UNLOAD_SQL_PREFIXES = ('select', 'with')
+# Colonnes d'identification ignorées pour trouver la métrique d'un graphique
+PLOT_ID_COLUMNS = frozenset({'mois', 'store_id', 'currency', 'store_name', 'date'})
+STORES_CSV_FILE = 'polco_mag_test - Feuille 1.csv'
+PLOT_POOL_MAX_WORKERS = max(1, (os.cpu_count() or 2) // 2)
 
 CONFIG = {
     'prod': {'output_location': 's3://prd-dct-wksp-askr/'},
@@ -49,21 +80,248 @@ CONFIG = {
 DATABASE = 'askr'
 WORKGROUP = 'cebitools-askr'
 REGION = 'eu-west-1'
+BOTO_MAX_POOL_CONNECTIONS = 64
+S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+S3_DOWNLOAD_CONCURRENCY = 16
+THROTTLING_ERROR_CODES = {'ThrottlingException', 'TooManyRequestsException', 'RequestLimitExceeded'}
+SSO_START_URL = 'https://decathlon.awsapps.com/start/'
+SSO_CACHE_DIR = Path.home() / '.aws' / 'sso' / 'cache'
 
 QUERY_CONFIG = {
-    'sleep_time': 10,
+    'poll_initial_delay': 0.2,  # Attente initiale entre deux vérifications d'état (s)
+    'poll_max_delay': 5.0,
+    'poll_backoff': 1.5,
+    'poll_batch_size': 50,  # Maximum accepté par BatchGetQueryExecution
     'max_concurrent_queries': 5,
     'retry_attempts': 3,
-    'timeout_minutes': 30
+    'timeout_minutes': 30,
+    'result_reuse_minutes': 60  # Réutilisation des résultats Athena (0 = désactivée)
 }
 
+
+def sso_token_valid(start_url: str = SSO_START_URL) -> bool:
+    """Indique si le jeton SSO en cache (~/.aws/sso/cache/<sha1(start_url)>.json) n'a pas expiré."""
+    cache_file = SSO_CACHE_DIR / f"{hashlib.sha1(start_url.encode('utf-8')).hexdigest()}.json"
+    try:
+        expires_at = json.loads(cache_file.read_text(encoding='utf-8'))['expiresAt']
+        expires = datetime.fromisoformat(expires_at.replace('UTC', '+00:00').replace('Z', '+00:00'))
+    except (OSError, ValueError, KeyError):
+        return False
+    return expires > datetime.now(timezone.utc)
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    """Découpe une URI s3://bucket/cle en (bucket, cle)."""
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def read_athena_csv(body: bytes) -> pd.DataFrame:
+    """
+    Décode un CSV de résultat Athena en DataFrame de chaînes.
+    
+    Avec pyarrow, le parsing se fait en C++ (toutes colonnes typées string,
+    champ vide non quoté = NULL comme les VarCharValue absents) ; sinon
+    repli sur pandas.read_csv.
+    """
+    if not HAS_PYARROW:
+        return pd.read_csv(io.BytesIO(body), dtype=str)
+    
+    header_end = body.find(b'\n')
+    header = body[:header_end if header_end >= 0 else len(body)].decode('utf-8').rstrip('\r')
+    columns = next(csv.reader([header]), [])
+    table = pa_csv.read_csv(
+        io.BytesIO(body),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={column: pa.string() for column in columns},
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False
+        )
+    )
+    return table.to_pandas()
+
+
+def compile_sql_template(sql_template: str) -> Optional[Tuple[Tuple[str, Optional[str]], ...]]:
+    """
+    Découpe un template SQL en (texte littéral, nom de champ) une fois pour toutes.
+    
+    Returns:
+        Les morceaux du template, ou None si un champ utilise une conversion,
+        un format ou un accès attribut/index (rendu alors via str.format)
+    """
+    parts = []
+    for literal, field_name, format_spec, conversion in string.Formatter().parse(sql_template):
+        if field_name is not None and (format_spec or conversion or not field_name.isidentifier()):
+            return None
+        parts.append((literal, field_name))
+    return tuple(parts)
+
+
+def render_sql(compiled: Tuple[Tuple[str, Optional[str]], ...], params: Dict[str, Any]) -> str:
+    """Assemble un template compilé par compile_sql_template (équivalent à str.format)."""
+    return "".join(
+        literal if field_name is None else f"{literal}{params[field_name]}"
+        for literal, field_name in compiled
+    )
+
+
+def build_unload_query(query: str, destination: str) -> str:
+    """Enveloppe un SELECT dans un UNLOAD Parquet/ZSTD vers le préfixe S3 destination."""
+    return f"UNLOAD ({query.strip().rstrip(';')}) TO '{destination}' WITH (format = 'PARQUET', compression = 'ZSTD')"
+
+
+def write_parquet(df: pd.DataFrame, file_path: Path):
+    """Écrit un DataFrame en Parquet compressé ZSTD (écrivain pyarrow, GIL relâché)."""
+    pa_parquet.write_table(
+        pa.Table.from_pandas(df, preserve_index=False),
+        str(file_path),
+        compression='zstd',
+        compression_level=PARQUET_ZSTD_LEVEL
+    )
+
+
+def read_store_ids(csv_path: str) -> List[str]:
+    """Lit uniquement la colonne store_id (en texte) du CSV des magasins."""
+    if HAS_PYARROW:
+        table = pa_csv.read_csv(
+            csv_path,
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=['store_id'],
+                column_types={'store_id': pa.string()}
+            )
+        )
+        return table.column('store_id').to_pylist()
+    
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return [row['store_id'] for row in csv.DictReader(f)]
+
+
+def write_csv(df: pd.DataFrame, file_path: Path):
+    """
+    Écrit un DataFrame en CSV, avec l'écrivain C++ de pyarrow si disponible.
+    
+    L'écrivain pyarrow relâche le GIL : les autres requêtes du pool
+    continuent pendant l'écriture. Repli sur DataFrame.to_csv sinon.
+    """
+    if HAS_PYARROW:
+        try:
+            pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), str(file_path))
+            return
+        except Exception as e:
+            logger.warning(f"⚠️ Écriture pyarrow impossible pour {file_path.name}, repli pandas: {e}")
+    df.to_csv(file_path, index=False)
+
+
+_plot_local = threading.local()
+
+
+def get_plot_axes():
+    """
+    Retourne la figure et les axes de graphique réutilisés par ce thread.
+    
+    Une seule Figure Agg (hors registre pyplot) est créée par thread de
+    rendu puis vidée entre deux graphiques, au lieu d'une figure par appel.
+    """
+    if getattr(_plot_local, 'axes', None) is None:
+        sns.set_theme(style="whitegrid")
+        fig = Figure(figsize=(16, 8))
+        FigureCanvasAgg(fig)
+        _plot_local.axes = (fig, fig.add_subplot())
+    return _plot_local.axes
+
+
+def plot_metric_label(metric_col: str) -> str:
+    """Libellé affiché d'une colonne de métrique (ex: monthly_revenue -> Monthly Revenue)."""
+    return metric_col.replace('_', ' ').title()
+
+
+def save_plot(df: pd.DataFrame, file_path: Path, metric_col: Optional[str] = None, metric_label: Optional[str] = None):
+    """
+    Crée et sauvegarde un graphique linéaire.
+    
+    Fonction de module (et non méthode) pour pouvoir être exécutée dans
+    un processus du pool de graphiques. La colonne de métrique et son libellé
+    viennent de la configuration de la requête quand elle les précise ;
+    sinon ils sont déduits des colonnes du résultat.
+    """
+    try:
+        if metric_col not in df.columns:
+            metric_col = next((col for col in df.columns if col not in PLOT_ID_COLUMNS), None)
+            metric_label = None
+        
+        if not metric_col:
+            logger.warning(f"⚠️ Impossible de trouver la colonne de métrique pour {file_path.name}")
+            return
+        
+        df_plot = df.copy()
+        df_plot['mois'] = pd.to_datetime(df_plot['mois'])
+        df_plot = df_plot.sort_values('mois')
+        df_plot[metric_col] = pd.to_numeric(df_plot[metric_col], errors='coerce')
+        df_plot.dropna(subset=[metric_col], inplace=True)
+        
+        if df_plot.empty:
+            logger.warning(f"⚠️ Aucune donnée numérique valide pour {file_path.name}")
+            return
+        
+        store_id = df_plot['store_id'].iloc[0]
+        fig, ax = get_plot_axes()
+        ax.clear()
+        
+        metric_label = metric_label or plot_metric_label(metric_col)
+        plot_title = f"{metric_label} par mois pour le magasin {store_id}"
+        sns.lineplot(data=df_plot, x='mois', y=metric_col, marker='o', color='royalblue', linewidth=2, ax=ax)
+        
+        ax.set_title(plot_title, fontsize=18, weight='bold')
+        ax.set_ylabel(metric_label, fontsize=14)
+        ax.set_xlabel("Mois", fontsize=14)
+        
+        ax.get_yaxis().set_major_formatter(
+            matplotlib.ticker.FuncFormatter(lambda x, p: f'{x:,.0f}'.replace(',', ' '))
+        )
+        
+        plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+        fig.tight_layout()
+        
+        plot_path = file_path.with_suffix('.png')
+        fig.savefig(plot_path, dpi=100)
+        
+        logger.info(f"📊 Graphique sauvegardé : {plot_path}")
+        
+    except Exception as e:
+        logger.error(f"❌ Erreur création graphique {file_path.name}: {e}")
+
+
 class PolcoCSVGenerator:
     """Générateur de CSV POLCO via AWS Athena."""
     
-    def __init__(self):
-        """Initialise le générateur CSV."""
+    def __init__(self, partitioned: bool = False, resume: bool = False, unload: bool = False):
+        """
+        Initialise le générateur CSV.
+        
+        Args:
+            partitioned: Écrire en Parquet partitionné query_id=/store_id=
+                         (sous PARTITIONED_ROOT_DIR) au lieu des CSV par magasin
+            resume: Ne pas relancer les couples (magasin, requête) déjà produits
+                    aujourd'hui d'après le manifeste (reprise d'un run interrompu)
+            unload: Exporter les SELECT en Parquet via UNLOAD plutôt qu'en CSV de résultat
+        """
+        self.partitioned = partitioned
+        self.resume = resume
+        self.unload = unload
+        self._done = set()
+        self._manifest_lock = threading.Lock()
         self.athena_client = None
+        self.s3_client = None
+        self.transfer_config = None
         self.session = None
+        # Requêtes Athena en attente (id -> Future), suivies par un poller unique
+        self._pending_queries: Dict[str, asyncio.Future] = {}
+        self._poll_wakeup: Optional[asyncio.Event] = None
+        # Pool de processus pour le rendu des graphiques (actif pendant run)
+        self.plot_pool = None
+        # Caches (mtime du fichier, contenu) : relus seulement si le fichier change
+        self._queries_cache = None
+        self._stores_cache = None
         self.stats = {
             'total_stores': 0,
             'processed_stores': 0,
@@ -76,51 +334,61 @@ class PolcoCSVGenerator:
         logger.info("🚀 Initialisation du générateur CSV POLCO")
     
     def check_aws_credentials(self) -> bool:
-        """Vérifie et configure les credentials AWS."""
+        """
+        Vérifie et configure les credentials AWS.
+        
+        La session boto3 validée est conservée dans self.session pour init_athena.
+        Aucun sous-processus n'est lancé tant que le jeton SSO en cache est valide
+        ou que STS accepte les credentials du profil ; le login SSO n'est tenté
+        qu'en dernier recours.
+        """
         try:
-            # Vérifier si awsume est disponible
-            result = subprocess.run(['which', 'awsume'], capture_output=True, text=True)
-            if result.returncode != 0:
-                logger.error("❌ awsume non trouvé. Veuillez l'installer.")
-                return False
+            if sso_token_valid():
+                import boto3
+                self.session = boto3.Session(profile_name=PROFILE_NAME, region_name=REGION)
+                logger.info("✅ Jeton SSO AWS en cache encore valide")
+                return True
             
-            # Vérifier si on est connecté
-            result = subprocess.run(['aws', 'sts', 'get-caller-identity'], capture_output=True, text=True)
-            if result.returncode != 0:
-                logger.warning("⚠️ Pas connecté à AWS. Tentative de connexion...")
-                self._connect_aws()
+            if self._validate_session():
+                logger.info("✅ Credentials AWS vérifiés")
+                return True
             
-            logger.info("✅ Credentials AWS vérifiés")
-            return True
+            logger.warning("⚠️ Pas connecté à AWS. Tentative de connexion...")
+            if not self._connect_aws():
+                return False
+            
+            return self._validate_session()
             
         except Exception as e:
             logger.error(f"❌ Erreur vérification AWS: {e}")
             return False
     
+    def _validate_session(self) -> bool:
+        """Crée une session boto3 sur PROFILE_NAME et la valide via STS."""
+        import boto3
+        from botocore.exceptions import BotoCoreError, ClientError
+        
+        session = boto3.Session(profile_name=PROFILE_NAME, region_name=REGION)
+        try:
+            session.client('sts').get_caller_identity()
+        except (BotoCoreError, ClientError) as e:
+            logger.warning(f"⚠️ Credentials AWS invalides: {e}")
+            return False
+        
+        self.session = session
+        return True
+    
     def _connect_aws(self) -> bool:
         """Tente de se connecter à AWS via SSO."""
         try:
-            logger.info("🔐 Connexion AWS SSO...")
-            
-            # Login SSO
-            result = subprocess.run([
-                'aws-sso-util', 'login', 
-                'https://decathlon.awsapps.com/start/', 
-                'eu-west-1'
-            ], capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                logger.error(f"❌ Échec login SSO: {result.stderr}")
-                return False
-            
             # Connexion via SSO Decathlon
             logger.info("🔐 Connexion AWS SSO Decathlon...")
             
             # Login SSO
             result = subprocess.run([
                 'aws-sso-util', 'login', 
-                'https://decathlon.awsapps.com/start/', 
-                'eu-west-1'
+                SSO_START_URL, 
+                REGION
             ], capture_output=True, text=True)
             
             if result.returncode != 0:
@@ -147,9 +415,28 @@ class PolcoCSVGenerator:
         """Initialise la connexion Athena."""
         try:
             import boto3
+            from botocore.config import Config
+            from boto3.s3.transfer import TransferConfig
             
-            self.session = boto3.Session(profile_name=PROFILE_NAME, region_name=REGION)
-            self.athena_client = self.session.client('athena')
+            if self.session is None:
+                self.session = boto3.Session(profile_name=PROFILE_NAME, region_name=REGION)
+            
+            # Pool HTTP large et connexions persistantes : les appels concurrents
+            # (requêtes, états, lectures S3) ne se bloquent pas sur le pool
+            # et ne refont pas de handshake TLS à chaque appel
+            client_config = Config(
+                max_pool_connections=BOTO_MAX_POOL_CONNECTIONS,
+                retries={'mode': 'adaptive', 'max_attempts': 5},
+                tcp_keepalive=True
+            )
+            self.athena_client = self.session.client('athena', config=client_config)
+            self.s3_client = self.session.client('s3', config=client_config)
+            # Gros résultats téléchargés en plages d'octets parallèles
+            self.transfer_config = TransferConfig(
+                multipart_threshold=S3_MULTIPART_THRESHOLD,
+                multipart_chunksize=S3_MULTIPART_THRESHOLD,
+                max_concurrency=S3_DOWNLOAD_CONCURRENCY
+            )
             
             logger.info(f"✅ Athena initialisé avec le profil: {PROFILE_NAME}")
             return True
@@ -159,74 +446,228 @@ class PolcoCSVGenerator:
             return False
     
     def load_queries_config(self) -> Dict[str, Any]:
-        """Charge la configuration des requêtes."""
+        """Charge la configuration des requêtes (en cache tant que le fichier est inchangé)."""
         try:
             if not os.path.exists(QUERIES_CONFIG_FILE):
                 logger.error(f"❌ Fichier {QUERIES_CONFIG_FILE} non trouvé")
                 return {"queries": [], "store_groups": {}}
             
+            mtime = os.stat(QUERIES_CONFIG_FILE).st_mtime
+            if self._queries_cache and self._queries_cache[0] == mtime:
+                return self._queries_cache[1]
+            
             with open(QUERIES_CONFIG_FILE, 'r', encoding='utf-8') as f:
                 config = json.load(f)
                 logger.info(f"✅ Configuration chargée depuis {QUERIES_CONFIG_FILE}")
-                return config
+            
+            # Templates SQL découpés au chargement plutôt qu'à chaque (magasin, requête)
+            for query_config in config.get('queries', []):
+                query_config['_compiled_sql'] = compile_sql_template(query_config.get('sql_template', ''))
+                # Métrique tracée : explicite via metric_column, sinon déduite une fois pour toutes
+                # des colonnes attendues (première colonne hors identifiants)
+                metric_col = query_config.get('metric_column') or next(
+                    (col for col in query_config.get('expected_columns', []) if col not in PLOT_ID_COLUMNS), None
+                )
+                query_config['_metric_col'] = metric_col
+                query_config['_metric_label'] = plot_metric_label(metric_col) if metric_col else None
+            
+            self._queries_cache = (mtime, config)
+            return config
                 
         except Exception as e:
             logger.error(f"❌ Erreur chargement configuration: {e}")
             return {"queries": [], "store_groups": {}}
     
     def get_store_ids(self, store_group: str = "@priority_stores") -> List[str]:
-        """Récupère la liste des magasins depuis le CSV principal."""
+        """Récupère la liste des magasins depuis le CSV principal (en cache tant que le fichier est inchangé)."""
         try:
-            csv_path = "polco_mag_test - Feuille 1.csv"
+            csv_path = STORES_CSV_FILE
             
             if not os.path.exists(csv_path):
                 logger.error(f"❌ Fichier {csv_path} non trouvé")
                 return []
             
-            df = pd.read_csv(csv_path)
-            store_ids = df['store_id'].astype(str).tolist()
+            mtime = os.stat(csv_path).st_mtime
+            if self._stores_cache and self._stores_cache[0] == mtime:
+                return list(self._stores_cache[1])
+            
+            store_ids = read_store_ids(csv_path)
             
             logger.info(f"✅ {len(store_ids)} magasins chargés depuis {csv_path}")
-            return store_ids
+            self._stores_cache = (mtime, store_ids)
+            return list(store_ids)
             
         except Exception as e:
             logger.error(f"❌ Erreur lecture magasins: {e}")
             return []
     
     def run_athena_query(self, query: str) -> str:
-        """Lance une requête Athena."""
-        response = self.athena_client.start_query_execution(
-            QueryString=query,
-            QueryExecutionContext={'Database': DATABASE},
-            ResultConfiguration={'OutputLocation': CONFIG[ENV]['output_location']},
-            WorkGroup=WORKGROUP
-        )
+        """
+        Lance une requête Athena.
+        
+        Une requête identique exécutée depuis moins de result_reuse_minutes
+        est servie depuis ses résultats existants, sans nouveau scan (sauf
+        UNLOAD, qui doit réellement écrire dans son nouveau préfixe).
+        """
+        params = {
+            'QueryString': query,
+            'QueryExecutionContext': {'Database': DATABASE},
+            'ResultConfiguration': {'OutputLocation': CONFIG[ENV]['output_location']},
+            'WorkGroup': WORKGROUP
+        }
+        if QUERY_CONFIG['result_reuse_minutes'] > 0 and not query.lstrip().upper().startswith('UNLOAD'):
+            params['ResultReuseConfiguration'] = {
+                'ResultReuseByAgeConfiguration': {
+                    'Enabled': True,
+                    'MaxAgeInMinutes': QUERY_CONFIG['result_reuse_minutes']
+                }
+            }
+        response = self.athena_client.start_query_execution(**params)
         return response['QueryExecutionId']
     
-    def wait_for_query(self, query_execution_id: str) -> str:
-        """Attend la fin d'une requête Athena."""
-        start_time = time.time()
-        timeout_seconds = QUERY_CONFIG['timeout_minutes'] * 60
+    async def wait_for_query(self, query_execution_id: str) -> str:
+        """
+        Attend la fin d'une requête Athena.
         
-        while time.time() - start_time < timeout_seconds:
-            try:
-                response = self.athena_client.get_query_execution(QueryExecutionId=query_execution_id)
-                state = response['QueryExecution']['Status']['State']
-                
-                if state in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-                    return state
-                    
-                time.sleep(QUERY_CONFIG['sleep_time'])
+        La requête est enregistrée auprès du poller partagé (poll_pending_queries),
+        qui vérifie l'état de toutes les requêtes en cours en un seul appel
+        BatchGetQueryExecution par intervalle.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending_queries[query_execution_id] = future
+        self._poll_wakeup.set()
+        
+        try:
+            return await asyncio.wait_for(future, timeout=QUERY_CONFIG['timeout_minutes'] * 60)
+        except asyncio.TimeoutError:
+            self._pending_queries.pop(query_execution_id, None)
+            logger.warning(f"⚠️ Timeout pour la requête {query_execution_id}")
+            return 'TIMEOUT'
+    
+    async def poll_pending_queries(self):
+        """
+        Vérifie l'état des requêtes en attente par lots de poll_batch_size.
+        
+        L'intervalle croît de poll_initial_delay à poll_max_delay et revient au
+        minimum dès qu'une nouvelle requête est enregistrée : une requête courte
+        est détectée en quelques centaines de millisecondes, et K requêtes
+        longues ne coûtent qu'un appel par intervalle au lieu de K.
+        
+        Une limitation de débit (ThrottlingException...) n'est jamais traitée comme
+        un échec : la requête tourne toujours côté Athena, la déclarer FAILED
+        provoquerait sa resoumission et donc un nouveau scan.
+        """
+        from botocore.exceptions import ClientError
+        
+        delay = QUERY_CONFIG['poll_initial_delay']
+        batch_size = QUERY_CONFIG['poll_batch_size']
+        
+        while True:
+            if not self._pending_queries:
+                await self._poll_wakeup.wait()
+            if self._poll_wakeup.is_set():
+                self._poll_wakeup.clear()
+                delay = QUERY_CONFIG['poll_initial_delay']
+            
+            await asyncio.sleep(delay)
+            delay = min(QUERY_CONFIG['poll_max_delay'], delay * QUERY_CONFIG['poll_backoff'])
+            
+            query_ids = list(self._pending_queries)
+            for i in range(0, len(query_ids), batch_size):
+                try:
+                    response = await asyncio.to_thread(
+                        self.athena_client.batch_get_query_execution,
+                        QueryExecutionIds=query_ids[i:i + batch_size]
+                    )
+                except ClientError as e:
+                    error_code = e.response.get('Error', {}).get('Code')
+                    if error_code in THROTTLING_ERROR_CODES:
+                        # Limitation de débit : les requêtes tournent toujours, on réessaie plus tard
+                        logger.warning(f"⚠️ Vérification d'état limitée par Athena ({error_code}), nouvel essai")
+                        await asyncio.sleep(random.uniform(0, QUERY_CONFIG['poll_max_delay']))
+                    else:
+                        logger.error(f"❌ Erreur vérification état des requêtes Athena ({error_code}): {e}")
+                        for query_execution_id in query_ids[i:i + batch_size]:
+                            future = self._pending_queries.pop(query_execution_id, None)
+                            if future is not None and not future.done():
+                                future.set_result('FAILED')
+                    continue
+                except Exception as e:
+                    # Erreur réseau transitoire : état inconnu, on réessaie au prochain intervalle
+                    logger.warning(f"⚠️ Erreur vérification état des requêtes Athena: {e}")
+                    continue
                 
+                for execution in response.get('QueryExecutions', []):
+                    state = execution['Status']['State']
+                    if state in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
+                        future = self._pending_queries.pop(execution['QueryExecutionId'], None)
+                        if future is not None and not future.done():
+                            future.set_result(state)
+    
+    def get_query_results(self, query_execution_id: str, unload_prefix: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """
+        Récupère les résultats d'une requête Athena.
+        
+        Le CSV de résultat est lu directement depuis S3 (un seul GET) ; la
+        pagination GetQueryResults (1000 lignes par appel) ne sert que de repli.
+        Pour un UNLOAD, les fichiers Parquet du préfixe unload_prefix sont lus.
+        """
+        if unload_prefix:
+            try:
+                return self.read_unload_results(unload_prefix)
             except Exception as e:
-                logger.error(f"❌ Erreur attente requête {query_execution_id}: {e}")
-                return 'FAILED'
+                logger.error(f"❌ Erreur lecture UNLOAD {query_execution_id} ({unload_prefix}): {e}")
+                return None
+        
+        try:
+            return self.read_results_from_s3(query_execution_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Lecture S3 impossible pour {query_execution_id}, repli sur la pagination Athena: {e}")
+            return self.read_results_paginated(query_execution_id)
+    
+    def read_results_from_s3(self, query_execution_id: str) -> pd.DataFrame:
+        """Lit le CSV de résultat déposé par Athena dans OutputLocation."""
+        response = self.athena_client.get_query_execution(QueryExecutionId=query_execution_id)
+        output_location = response['QueryExecution']['ResultConfiguration']['OutputLocation']
+        bucket, key = parse_s3_uri(output_location)
         
-        logger.warning(f"⚠️ Timeout pour la requête {query_execution_id}")
-        return 'TIMEOUT'
+        return read_athena_csv(self.download_s3_object(bucket, key))
     
-    def get_query_results(self, query_execution_id: str) -> Optional[pd.DataFrame]:
-        """Récupère les résultats d'une requête Athena."""
+    def download_s3_object(self, bucket: str, key: str) -> bytes:
+        """
+        Télécharge un objet S3 en mémoire.
+        
+        Au-delà de S3_MULTIPART_THRESHOLD, le transfert est découpé en plages
+        d'octets téléchargées en parallèle (S3_DOWNLOAD_CONCURRENCY connexions).
+        """
+        buffer = io.BytesIO()
+        self.s3_client.download_fileobj(Bucket=bucket, Key=key, Fileobj=buffer, Config=self.transfer_config)
+        return buffer.getvalue()
+    
+    def new_unload_prefix(self) -> str:
+        """Préfixe S3 vide et unique pour le résultat d'un UNLOAD."""
+        return f"{CONFIG[ENV]['output_location'].rstrip('/')}/unload/{uuid.uuid4().hex}/"
+    
+    def read_unload_results(self, unload_prefix: str) -> pd.DataFrame:
+        """Lit et concatène les fichiers Parquet écrits par un UNLOAD."""
+        bucket, key_prefix = parse_s3_uri(unload_prefix)
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        keys = [
+            s3_object['Key']
+            for page in paginator.paginate(Bucket=bucket, Prefix=key_prefix)
+            for s3_object in page.get('Contents', [])
+        ]
+        
+        tables = [
+            pa_parquet.read_table(io.BytesIO(self.download_s3_object(bucket, key)))
+            for key in keys
+        ]
+        if not tables:
+            return pd.DataFrame()
+        return pa.concat_tables(tables).to_pandas()
+    
+    def read_results_paginated(self, query_execution_id: str) -> Optional[pd.DataFrame]:
+        """Récupère les résultats via la pagination GetQueryResults (repli)."""
         try:
             paginator = self.athena_client.get_paginator('get_query_results')
             results_iter = paginator.paginate(QueryExecutionId=query_execution_id)
@@ -238,12 +679,11 @@ class PolcoCSVGenerator:
                 
                 if i == 0:
                     columns = [col['Label'] for col in result_set['ResultSetMetadata']['ColumnInfo']]
-                    data_rows = result_set['Rows'][1:] if len(result_set['Rows']) > 1 else []
+                    data_rows = result_set['Rows'][1:]
                 else:
                     data_rows = result_set['Rows']
                 
-                for row in data_rows:
-                    rows.append([col.get('VarCharValue') for col in row['Data']])
+                rows.extend([[col.get('VarCharValue') for col in row['Data']] for row in data_rows])
             
             if not rows:
                 return pd.DataFrame(columns=columns)
@@ -254,57 +694,98 @@ class PolcoCSVGenerator:
             logger.error(f"❌ Erreur récupération résultats {query_execution_id}: {e}")
             return None
     
-    def create_and_save_plot(self, df: pd.DataFrame, file_path: Path):
-        """Crée et sauvegarde un graphique linéaire."""
+    def output_path(self, store_id: str, query_config: Dict[str, Any]) -> Path:
+        """
+        Chemin de sortie d'une requête pour un magasin.
+        
+        Par défaut data/<store_id>/FR_<store_id>_<nom>.csv (lu par polco_data_upload) ;
+        en mode partitionné <racine>/query_id=<id>/store_id=<id>/part.parquet, disposition
+        Hive exploitable par Athena, pyarrow ou duckdb avec élagage des partitions.
+        """
+        query_id_str = query_config.get('id', 'unknown')
+        if self.partitioned:
+            return Path(PARTITIONED_ROOT_DIR) / f"query_id={query_id_str}" / f"store_id={store_id}" / 'part.parquet'
+        
+        base_filename = query_config.get('output_filename', query_id_str)
+        return Path(DATA_ROOT_DIR) / str(store_id) / f"FR_{store_id}_{base_filename}.csv"
+    
+    @property
+    def manifest_path(self) -> Path:
+        """Manifeste de la disposition de sortie courante."""
+        return Path(PARTITIONED_ROOT_DIR if self.partitioned else DATA_ROOT_DIR) / MANIFEST_FILENAME
+    
+    def load_manifest(self) -> set:
+        """
+        Retourne les couples (store_id, query_id) déjà produits.
+        
+        Une entrée n'est retenue que si son fichier existe encore et date
+        d'aujourd'hui, après la dernière modification de la configuration des
+        requêtes : les requêtes sont relatives à current_date, un fichier d'un
+        jour précédent est donc périmé, et une requête modifiée est rejouée.
+        """
+        if not self.manifest_path.exists():
+            return set()
+        
+        config_mtime = os.stat(QUERIES_CONFIG_FILE).st_mtime if os.path.exists(QUERIES_CONFIG_FILE) else 0
+        today_start = datetime.combine(datetime.now().date(), datetime.min.time()).timestamp()
+        min_mtime = max(config_mtime, today_start)
+        done = set()
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    output_path = Path(entry['output_path'])
+                    if output_path.exists() and output_path.stat().st_mtime > min_mtime:
+                        done.add((entry['store_id'], entry['query_id']))
+                except (ValueError, KeyError):
+                    continue
+        
+        logger.info(f"♻️ {len(done)} couples (magasin, requête) déjà produits d'après {self.manifest_path}")
+        return done
+    
+    def record_in_manifest(self, store_id: str, query_id: str, query_execution_id: str, file_path: Path):
+        """Ajoute un couple (magasin, requête) produit au manifeste."""
+        entry = {
+            'store_id': store_id,
+            'query_id': query_id,
+            'query_execution_id': query_execution_id,
+            'output_path': str(file_path),
+            'mtime': file_path.stat().st_mtime
+        }
+        with self._manifest_lock:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+    
+    def create_and_save_plot(self, df: pd.DataFrame, file_path: Path, query_config: Optional[Dict[str, Any]] = None):
+        """Crée et sauvegarde un graphique linéaire (dans le pool de processus s'il est actif)."""
+        query_config = query_config or {}
+        args = (df, file_path, query_config.get('_metric_col'), query_config.get('_metric_label'))
+        if self.plot_pool is None:
+            save_plot(*args)
+            return
         try:
-            known_id_cols = ['mois', 'store_id', 'currency', 'store_name', 'date']
-            metric_col = next((col for col in df.columns if col not in known_id_cols), None)
-            
-            if not metric_col:
-                logger.warning(f"⚠️ Impossible de trouver la colonne de métrique pour {file_path.name}")
-                return
-            
-            df_plot = df.copy()
-            df_plot['mois'] = pd.to_datetime(df_plot['mois'])
-            df_plot = df_plot.sort_values('mois')
-            df_plot[metric_col] = pd.to_numeric(df_plot[metric_col], errors='coerce')
-            df_plot.dropna(subset=[metric_col], inplace=True)
-            
-            if df_plot.empty:
-                logger.warning(f"⚠️ Aucune donnée numérique valide pour {file_path.name}")
-                return
-            
-            store_id = df_plot['store_id'].iloc[0]
-            plt.figure(figsize=(16, 8))
-            sns.set_theme(style="whitegrid")
-            
-            plot_title = f"{metric_col.replace('_', ' ').title()} par mois pour le magasin {store_id}"
-            ax = sns.lineplot(data=df_plot, x='mois', y=metric_col, marker='o', color='royalblue', linewidth=2)
-            
-            plt.title(plot_title, fontsize=18, weight='bold')
-            plt.ylabel(metric_col.replace('_', ' ').title(), fontsize=14)
-            plt.xlabel("Mois", fontsize=14)
-            
-            ax.get_yaxis().set_major_formatter(
-                matplotlib.ticker.FuncFormatter(lambda x, p: f'{x:,.0f}'.replace(',', ' '))
-            )
-            
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            
-            plot_path = file_path.with_suffix('.png')
-            plt.savefig(plot_path, dpi=100)
-            plt.close()
-            
-            logger.info(f"📊 Graphique sauvegardé : {plot_path}")
-            
+            self.plot_pool.submit(save_plot, *args)
         except Exception as e:
-            logger.error(f"❌ Erreur création graphique {file_path.name}: {e}")
+            logger.warning(f"⚠️ Pool de graphiques indisponible, rendu direct: {e}")
+            save_plot(*args)
     
-    def process_single_query(self, store_id: str, query_config: Dict[str, Any], progress_counter) -> Optional[pd.DataFrame]:
-        """Traite une requête pour un magasin."""
+    async def process_single_query(self, store_id: str, query_config: Dict[str, Any], progress_counter,
+                                   semaphore: asyncio.Semaphore) -> Optional[pd.DataFrame]:
+        """
+        Traite une requête pour un magasin.
+        
+        Le sémaphore borne le nombre de requêtes Athena en cours ; les appels
+        boto3 (bloquants) passent par asyncio.to_thread.
+        """
         query_id_str = query_config.get('id', 'unknown')
         
+        if (store_id, query_id_str) in self._done:
+            # Déjà produit lors d'un run précédent : aucune exécution Athena
+            logger.info(f"⏭️ Store {store_id} - requête '{query_id_str}' déjà produite, ignorée")
+            progress_counter.increment_completed()
+            return None
+        
         for attempt in range(QUERY_CONFIG['retry_attempts']):
             try:
                 logger.info(f"🔍 Traitement store {store_id} - requête '{query_id_str}' (tentative {attempt + 1})")
@@ -320,35 +801,43 @@ class PolcoCSVGenerator:
                     **final_params
                 }
                 
-                query = sql_template.format(**format_params)
-                query_execution_id = self.run_athena_query(query)
-                state = self.wait_for_query(query_execution_id)
+                compiled_sql = query_config.get('_compiled_sql')
+                if compiled_sql is not None:
+                    query = render_sql(compiled_sql, format_params)
+                else:
+                    query = sql_template.format(**format_params)
+                # Export Parquet direct (UNLOAD) pour les requêtes de lecture ; CREATE/INSERT restent en CSV
+                unload_prefix = None
+                if self.unload and query.lstrip().lower().startswith(UNLOAD_SQL_PREFIXES):
+                    unload_prefix = self.new_unload_prefix()
+                    query = build_unload_query(query, unload_prefix)
+                
+                async with semaphore:
+                    query_execution_id = await asyncio.to_thread(self.run_athena_query, query)
+                    state = await self.wait_for_query(query_execution_id)
+                    df = await asyncio.to_thread(self.get_query_results, query_execution_id, unload_prefix) if state == 'SUCCEEDED' else None
                 
                 if state == 'SUCCEEDED':
-                    df = self.get_query_results(query_execution_id)
-                    
                     if df is not None and not df.empty:
-                        # Sauvegarder le CSV
-                        store_path = Path(DATA_ROOT_DIR) / str(store_id)
-                        store_path.mkdir(parents=True, exist_ok=True)
-                        
-                        base_filename = query_config.get('output_filename', query_id_str)
-                        output_filename = f"FR_{store_id}_{base_filename}.csv"
-                        file_path = store_path / output_filename
+                        # Sauvegarder le résultat (CSV par magasin ou Parquet partitionné)
+                        file_path = self.output_path(store_id, query_config)
+                        file_path.parent.mkdir(parents=True, exist_ok=True)
                         
-                        df.to_csv(file_path, index=False)
-                        logger.info(f"💾 CSV sauvegardé : {file_path}")
+                        writer = write_parquet if self.partitioned else write_csv
+                        await asyncio.to_thread(writer, df, file_path)
+                        logger.info(f"💾 Résultat sauvegardé : {file_path}")
+                        self.record_in_manifest(store_id, query_id_str, query_execution_id, file_path)
                         
                         # Créer un graphique si c'est une requête mensuelle
                         if "_monthly" in query_id_str or "par_mois" in query_id_str:
-                            self.create_and_save_plot(df, file_path)
+                            self.create_and_save_plot(df, file_path, query_config)
                         
                         progress_counter.increment_completed()
                         return df
                     else:
                         logger.warning(f"⚠️ Aucune donnée pour store {store_id} - requête {query_id_str}")
                 else:
-                    response = self.athena_client.get_query_execution(QueryExecutionId=query_execution_id)
+                    response = await asyncio.to_thread(self.athena_client.get_query_execution, QueryExecutionId=query_execution_id)
                     error_message = response['QueryExecution']['Status'].get('StateChangeReason', 'Raison inconnue')
                     logger.error(f"❌ Requête échouée store {store_id} (état: {state}). Raison: {error_message}")
                     
@@ -356,7 +845,7 @@ class PolcoCSVGenerator:
                 logger.error(f"❌ Erreur traitement store {store_id} (tentative {attempt + 1}): {e}")
             
             if attempt < QUERY_CONFIG['retry_attempts'] - 1:
-                time.sleep(5)
+                await asyncio.sleep(5)
         
         progress_counter.increment_failed()
         logger.error(f"❌ Échec définitif store {store_id} après {QUERY_CONFIG['retry_attempts']} tentatives")
@@ -364,40 +853,69 @@ class PolcoCSVGenerator:
     
     def run_queries_for_store(self, store_id: str, queries_config: List[Dict[str, Any]]) -> bool:
         """Exécute toutes les requêtes pour un magasin."""
-        logger.info(f"🏪 Démarrage génération CSV pour magasin {store_id}")
+        return self.run_queries_for_stores([store_id], queries_config)[store_id]
+    
+    def run_queries_for_stores(self, store_ids: List[str], queries_config: List[Dict[str, Any]]) -> Dict[str, bool]:
+        """
+        Exécute toutes les requêtes de tous les magasins sur une boucle asyncio.
         
-        progress_counter = ProgressCounter(len(queries_config))
-        all_dfs = []
+        Les couples (magasin, requête) partagent les max_concurrent_queries
+        slots Athena : les slots restent occupés d'un magasin à l'autre, et les
+        requêtes en attente ne monopolisent aucun thread.
         
-        with ThreadPoolExecutor(max_workers=QUERY_CONFIG['max_concurrent_queries']) as executor:
-            future_to_query = {
-                executor.submit(self.process_single_query, store_id, query_config, progress_counter): query_config
-                for query_config in queries_config
-            }
-            
-            for future in as_completed(future_to_query):
-                try:
-                    result_df = future.result()
-                    if result_df is not None:
-                        all_dfs.append(result_df)
-                except Exception as e:
-                    query_config = future_to_query[future]
-                    logger.error(f"❌ Exception non gérée pour store {store_id} - requête {query_config.get('id')}: {e}")
-                    progress_counter.increment_failed()
+        Returns:
+            Succès par magasin (plus de 50% des requêtes réussies)
+        """
+        logger.info(f"🏪 Démarrage génération CSV pour {len(store_ids)} magasin(s)")
+        
+        progress_counters = {store_id: ProgressCounter(len(queries_config)) for store_id in store_ids}
+        asyncio.run(self._run_queries_async(store_ids, queries_config, progress_counters))
         
-        success_rate = progress_counter.completed / len(queries_config) * 100
-        logger.info(f"✅ Magasin {store_id}: {progress_counter.completed}/{len(queries_config)} requêtes réussies ({success_rate:.1f}%)")
+        results = {}
+        for store_id, progress_counter in progress_counters.items():
+            self.stats['successful_queries'] += progress_counter.completed
+            self.stats['failed_queries'] += progress_counter.failed
+            success_rate = progress_counter.completed / len(queries_config) * 100
+            logger.info(f"✅ Magasin {store_id}: {progress_counter.completed}/{len(queries_config)} requêtes réussies ({success_rate:.1f}%)")
+            results[store_id] = success_rate > 50  # Considérer comme réussi si plus de 50% des requêtes passent
+        
+        return results
+    
+    async def _run_queries_async(self, store_ids: List[str], queries_config: List[Dict[str, Any]],
+                                 progress_counters: Dict[str, 'ProgressCounter']):
+        """Lance toutes les requêtes (magasin, requête) en parallèle, bornées par un sémaphore."""
+        semaphore = asyncio.Semaphore(QUERY_CONFIG['max_concurrent_queries'])
+        tasks = [(store_id, query_config) for store_id in store_ids for query_config in queries_config]
+        
+        self._pending_queries = {}
+        self._poll_wakeup = asyncio.Event()
+        poller = asyncio.create_task(self.poll_pending_queries())
+        try:
+            results = await asyncio.gather(
+                *(self.process_single_query(store_id, query_config, progress_counters[store_id], semaphore)
+                  for store_id, query_config in tasks),
+                return_exceptions=True
+            )
+        finally:
+            poller.cancel()
         
-        return success_rate > 50  # Considérer comme réussi si plus de 50% des requêtes passent
+        for (store_id, query_config), result in zip(tasks, results):
+            if isinstance(result, Exception):
+                logger.error(f"❌ Exception non gérée pour store {store_id} - requête {query_config.get('id')}: {result}")
+                progress_counters[store_id].increment_failed()
     
     def run(self, limit: Optional[int] = None, test_mode: bool = False, store_id: Optional[str] = None, query_ids: Optional[List[str]] = None) -> bool:
         """Lance la génération CSV avec les mêmes options que les autres modules POLCO."""
         logger.info("🚀 Démarrage génération CSV POLCO")
         logger.info("=" * 80)
         
-        self.stats['start_time'] = time.time()
+        self.stats['start_time'] = time.monotonic()
         
         # Vérifications
+        if (self.partitioned or self.unload) and not HAS_PYARROW:
+            logger.error("❌ Modes Parquet (partitionné / UNLOAD) indisponibles : pyarrow non installé")
+            return False
+        
         if not self.check_aws_credentials():
             return False
         
@@ -415,6 +933,8 @@ class PolcoCSVGenerator:
             logger.error("❌ Aucune requête à exécuter")
             return False
         
+        self._done = self.load_manifest() if self.resume else set()
+        
         # Déterminer les magasins à traiter
         all_store_ids = self.get_store_ids()
         
@@ -448,27 +968,30 @@ class PolcoCSVGenerator:
         logger.info(f"⏱️ Temps estimé: {len(store_ids) * len(queries_to_run) * 2:.0f} minutes")
         logger.info("")
         
-        # Traiter chaque magasin
-        for index, store_id in enumerate(store_ids):
-            try:
-                logger.info(f"🏪 [{index + 1}/{len(store_ids)}] Magasin {store_id}")
-                
-                success = self.run_queries_for_store(store_id, queries_to_run)
-                
+        # Traiter tous les couples (magasin, requête) sur une boucle asyncio ;
+        # les graphiques sont rendus en parallèle dans des processus séparés,
+        # démarrés en spawn : un fork du processus multi-threadé (threads asyncio,
+        # transferts boto3) peut hériter d'un verrou tenu et bloquer l'enfant
+        self.plot_pool = ProcessPoolExecutor(max_workers=PLOT_POOL_MAX_WORKERS,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        try:
+            store_results = self.run_queries_for_stores(store_ids, queries_to_run)
+            for store_id, success in store_results.items():
                 if success:
                     self.stats['processed_stores'] += 1
                 else:
                     self.stats['errors'].append(f"Échec magasin {store_id}")
-                
-            except KeyboardInterrupt:
-                logger.info("\n⏹️ Génération interrompue par l'utilisateur")
-                break
-            except Exception as e:
-                logger.error(f"❌ Erreur traitement magasin {store_id}: {e}")
-                self.stats['errors'].append(str(e))
+        except KeyboardInterrupt:
+            logger.info("\n⏹️ Génération interrompue par l'utilisateur")
+        except Exception as e:
+            logger.error(f"❌ Erreur traitement magasins: {e}")
+            self.stats['errors'].append(str(e))
+        finally:
+            self.plot_pool.shutdown(wait=True)
+            self.plot_pool = None
         
         # Rapport final
-        end_time = time.time()
+        end_time = time.monotonic()
         duration = (end_time - self.stats['start_time']) / 60
         
         logger.info("")
@@ -519,10 +1042,15 @@ def main():
     parser.add_argument('--limit', type=int, help='Nombre de magasins à traiter')
     parser.add_argument('--store-id', type=str, help='Traiter uniquement le magasin avec cet ID')
     parser.add_argument('--query-ids', nargs='+', help='IDs des requêtes spécifiques à exécuter')
+    parser.add_argument('--resume', action='store_true',
+                        help="Reprendre un run interrompu : ne pas relancer les requêtes déjà produites aujourd'hui")
+    parser.add_argument('--unload-parquet', action='store_true', help='Exporter les résultats Athena en Parquet ZSTD via UNLOAD')
+    parser.add_argument('--partitioned', action='store_true',
+                        help=f'Écrire en Parquet partitionné query_id=/store_id= dans {PARTITIONED_ROOT_DIR}/ au lieu des CSV')
     
     args = parser.parse_args()
     
-    generator = PolcoCSVGenerator()
+    generator = PolcoCSVGenerator(partitioned=args.partitioned, resume=args.resume, unload=args.unload_parquet)
     
     try:
         success = generator.run(
@@ -8,55 +8,229 @@ import os
 import sys
 import csv
 import json
+import hashlib
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import zip_longest
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable
 import logging
+import logging.handlers
+
+# Sérialisation JSON rapide si orjson est disponible
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Parsing CSV en C++ si pyarrow est disponible
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
 # Configuration
 PROJECT_ID = "polcoaigeneration-ved6"
 COLLECTION_NAME = "polco_magasins_data"
+BULK_WRITE_MAX_ATTEMPTS = 5
+# Débit du BulkWriter : départ puis plafond (montée progressive 500/50/5 gérée par le client)
+BULK_INITIAL_OPS_PER_SECOND = 500
+BULK_MAX_OPS_PER_SECOND = 5000
+STORE_NAMES_CSV = "polco_mag_test - Feuille 1.csv"
+STORE_NAMES_CACHE = os.path.join(".polco_cache", "store_names.pkl")
+# Lignes CSV déjà parsées, une entrée par fichier indexée par (mtime, taille) : une relance
+# (panne Firestore, --store-id) ne re-parse pas les CSV inchangés
+CSV_ROWS_CACHE_DIR = os.path.join(".polco_cache", "csv_rows")
+STORE_WORKERS = 16  # Magasins traités en parallèle (lecture disque + mise en file)
+READ_WORKERS = 16   # Lectures de fichiers simultanées, partagées entre magasins
+FIRESTORE_MAX_DOC_BYTES = 1024 * 1024  # Limite dure d'un document Firestore
+READ_BUFFER_SIZE = 1 << 20  # Tampon de lecture des CSV (1 Mo au lieu de 8 Ko)
 
-# Configuration des logs
+# Configuration des logs (fichier bufferisé : écrit par blocs, ou dès qu'une erreur survient)
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_BUFFER_CAPACITY = 4096
+_log_file_handler = logging.FileHandler('polco_data_upload.log')
+_log_file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
-        logging.FileHandler('polco_data_upload.log'),
+        logging.handlers.MemoryHandler(
+            capacity=LOG_BUFFER_CAPACITY,
+            flushLevel=logging.ERROR,
+            target=_log_file_handler
+        ),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
 
+def read_text(path: str) -> str:
+    """
+    Lit un fichier texte d'un bloc (octets puis décodage UTF-8, erreurs ignorées).
+    
+    Évite le découpage ligne à ligne du mode texte ; les fins de ligne sont
+    normalisées comme le ferait open() en mode texte.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-8', 'ignore')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+def read_csv_rows_arrow(path: str) -> List[Dict[str, str]]:
+    """
+    Lit un CSV avec le parseur pyarrow et retourne les lignes en dicts de chaînes.
+    
+    Toutes les colonnes sont typées string et les champs vides restent '' :
+    même résultat que csv.DictReader. Lève une exception pyarrow si le fichier
+    ne se parse pas proprement (l'appelant se replie alors sur read_csv_rows).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    header_end = data.find(b'\n')
+    header = data[:header_end if header_end >= 0 else len(data)].decode('utf-8', 'ignore').rstrip('\r')
+    columns = next(csv.reader([header]), [])
+    table = pa_csv.read_csv(
+        pa.BufferReader(data),
+        read_options=pa_csv.ReadOptions(block_size=READ_BUFFER_SIZE),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={column: pa.string() for column in columns},
+            strings_can_be_null=False
+        )
+    )
+    return table.to_pylist()
+
+
+def read_csv_rows(path: str) -> List[Dict[str, Optional[str]]]:
+    """
+    Lit un CSV avec csv.reader et construit les lignes par dict(zip(en-tête, valeurs)).
+    
+    Équivalent à csv.DictReader (lignes vides ignorées, champs manquants à None)
+    sans sa logique par ligne ; les valeurs en trop d'une ligne sont ignorées.
+    """
+    with open(path, 'r', encoding='utf-8', errors='ignore', newline='', buffering=READ_BUFFER_SIZE) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return []
+        width = len(header)
+        return [
+            dict(zip(header, row)) if len(row) == width else dict(zip_longest(header, row[:width]))
+            for row in reader if row
+        ]
+
+
+def payload_digest(obj: Any) -> str:
+    """Empreinte BLAKE2 (clés triées) d'un contenu, pour détecter un document inchangé."""
+    if HAS_ORJSON:
+        encoded = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    else:
+        encoded = json.dumps(obj, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def payload_size(obj: Any) -> int:
+    """Taille en octets de l'encodage JSON d'un document (orjson si disponible)."""
+    if HAS_ORJSON:
+        return len(orjson.dumps(obj))
+    return len(json.dumps(obj, ensure_ascii=False).encode('utf-8'))
+
+
 class PolcoDataUploader:
     """Uploader de données magasin vers Firestore."""
     
-    def __init__(self):
-        """Initialise l'uploader."""
+    def __init__(self, force: bool = False, ops_per_second: int = BULK_INITIAL_OPS_PER_SECOND,
+                 max_ops_per_second: int = BULK_MAX_OPS_PER_SECOND):
+        """
+        Initialise l'uploader.
+        
+        Args:
+            force: Réécrire tous les magasins, même ceux dont le contenu n'a pas changé
+            ops_per_second: Débit initial des écritures BulkWriter
+            max_ops_per_second: Débit maximal des écritures BulkWriter
+        """
+        self.force = force
+        self.ops_per_second = ops_per_second
+        self.max_ops_per_second = max(ops_per_second, max_ops_per_second)
+        self._remote_hashes = {}  # store_id -> metadata.payload_hash déjà dans Firestore
+        self._pending_hashes = {}  # store_id -> empreinte d'un magasin réparti, posée après confirmation
+        self._failed_stores = set()  # magasins dont une écriture (document ou fichier) a échoué
+        self._committing_hashes = False
         self.project_id = PROJECT_ID
         self.collection_name = COLLECTION_NAME
         self.db = None
+        self.bulk = None
+        self._bulk_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._read_pool = None
         self.store_names = {}  # Cache pour les noms de magasins
         self.stats = {
             'stores_processed': 0,
             'stores_success': 0,
             'stores_failed': 0,
+            'stores_skipped': 0,
             'total_csv_files': 0,
             'total_md_files': 0,
+            'total_payload_bytes': 0,
             'start_time': None,
             'errors': []
         }
         
         logger.info("🚀 Initialisation de l'uploader de données magasin")
     
+    def _load_store_names_cache(self, key: tuple) -> Optional[Dict[str, str]]:
+        """Retourne les noms en cache disque s'ils correspondent à la version du CSV."""
+        try:
+            with open(STORE_NAMES_CACHE, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if entry.get('key') != key:
+            return None
+        return entry['data']
+    
+    def _save_store_names_cache(self, key: tuple):
+        """Enregistre les noms parsés (écriture atomique)."""
+        try:
+            os.makedirs(os.path.dirname(STORE_NAMES_CACHE), exist_ok=True)
+            tmp_path = STORE_NAMES_CACHE + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'key': key, 'data': self.store_names}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, STORE_NAMES_CACHE)
+        except OSError as e:
+            logger.warning(f"⚠️ Écriture cache noms de magasins impossible: {e}")
+    
     def load_store_names(self) -> bool:
-        """Charge les noms des magasins depuis le CSV principal."""
-        csv_path = "polco_mag_test - Feuille 1.csv"
+        """
+        Charge les noms des magasins depuis le CSV principal.
         
-        if not os.path.exists(csv_path):
+        Le résultat est mis en cache disque, indexé par (mtime, taille) du CSV :
+        tant que le fichier ne change pas, il n'est pas re-parsé.
+        """
+        csv_path = STORE_NAMES_CSV
+        
+        try:
+            stat = os.stat(csv_path)
+        except FileNotFoundError:
             logger.warning(f"⚠️ CSV principal {csv_path} non trouvé, noms de magasins non disponibles")
             return False
         
+        cache_key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._load_store_names_cache(cache_key)
+        if cached is not None:
+            self.store_names = cached
+            logger.info(f"♻️ {len(self.store_names)} noms de magasins chargés depuis le cache")
+            return True
+        
         try:
             with open(csv_path, 'r', encoding='utf-8', errors='ignore') as f:
                 reader = csv.DictReader(f)
@@ -68,6 +242,7 @@ class PolcoDataUploader:
                         self.store_names[store_id] = store_name
             
             logger.info(f"✅ {len(self.store_names)} noms de magasins chargés depuis {csv_path}")
+            self._save_store_names_cache(cache_key)
             return True
             
         except Exception as e:
@@ -85,51 +260,167 @@ class PolcoDataUploader:
         return True
     
     def init_firestore(self) -> bool:
-        """Initialise Firestore."""
+        """
+        Initialise Firestore.
+        
+        Les écritures passent par un BulkWriter : elles sont envoyées en lots
+        parallèles par son pool interne, avec reprise exponentielle, au lieu
+        d'un aller-retour set() bloquant par magasin.
+        """
         try:
-            from google.cloud import firestore
-            self.db = firestore.Client(project=self.project_id)
-            logger.info("✅ Firestore initialisé")
+            from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions, BulkRetry
+            from polco_firestore_client import get_firestore_client
+            
+            self.db = get_firestore_client(self.project_id)
+            self.bulk = self.db.bulk_writer(options=BulkWriterOptions(
+                initial_ops_per_second=self.ops_per_second,
+                max_ops_per_second=self.max_ops_per_second,
+                retry=BulkRetry.exponential
+            ))
+            self.bulk.on_write_result(self._on_write_result)
+            self.bulk.on_write_error(self._on_write_error)
+            logger.info(f"✅ Firestore initialisé (BulkWriter {self.ops_per_second} → {self.max_ops_per_second} ops/s)")
             return True
         except Exception as e:
             logger.error(f"❌ Erreur lors de l'initialisation de Firestore: {e}")
             return False
     
+    def _incr_stat(self, key: str, amount: int = 1):
+        """Incrémente un compteur de stats (appelé depuis plusieurs threads)."""
+        with self._stats_lock:
+            self.stats[key] += amount
+    
+    def _is_store_document(self, reference) -> bool:
+        """Vrai pour un document magasin (et non un sous-document de fichier)."""
+        return reference.parent.id == self.collection_name
+    
+    def _store_id_of(self, reference) -> str:
+        """Identifiant magasin d'un document magasin ou d'un de ses sous-documents de fichier."""
+        store_ref = reference if self._is_store_document(reference) else reference.parent.parent
+        return store_ref.id[len("store_"):]
+    
+    def _on_write_result(self, reference, write_result, bulk_writer):
+        """Callback BulkWriter : écriture d'un magasin confirmée."""
+        if self._committing_hashes or not self._is_store_document(reference):
+            return
+        self._incr_stat('stores_success')
+        logger.info(f"✅ Magasin {reference.id} uploadé vers Firestore")
+    
+    def _on_write_error(self, failure, bulk_writer) -> bool:
+        """Callback BulkWriter : retourne True pour retenter l'écriture."""
+        if failure.attempts < BULK_WRITE_MAX_ATTEMPTS:
+            return True
+        
+        reference = getattr(failure.operation, 'reference', None)
+        doc_id = reference.path if reference is not None else '?'
+        if self._committing_hashes:
+            # Empreinte non posée : le magasin sera simplement réécrit au prochain run
+            logger.warning(f"⚠️ Empreinte non enregistrée pour {doc_id}: {failure.message}")
+            return False
+        logger.error(f"❌ Erreur upload {doc_id} après {failure.attempts} tentatives: {failure.message}")
+        with self._stats_lock:
+            if reference is not None:
+                self._failed_stores.add(self._store_id_of(reference))
+            if reference is None or self._is_store_document(reference):
+                self.stats['stores_failed'] += 1
+            self.stats['errors'].append(f"{doc_id}: {failure.message}")
+        return False
+    
+    @staticmethod
+    def _csv_cache_path(csv_path: str) -> str:
+        """Fichier du cache disque des lignes d'un CSV (un par chemin, écrasé s'il change)."""
+        name = hashlib.blake2b(os.path.abspath(csv_path).encode('utf-8'), digest_size=16).hexdigest()
+        return os.path.join(CSV_ROWS_CACHE_DIR, f"{name}.pkl")
+    
+    def _load_csv_cache(self, cache_path: str, key: tuple) -> Optional[List[Dict]]:
+        """Retourne les lignes en cache disque si elles correspondent à la version du CSV."""
+        try:
+            with open(cache_path, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if entry.get('key') != key:
+            return None
+        return entry['rows']
+    
+    def _save_csv_cache(self, cache_path: str, key: tuple, rows: List[Dict]):
+        """Enregistre les lignes parsées d'un CSV (écriture atomique, lectures parallèles possibles)."""
+        try:
+            os.makedirs(CSV_ROWS_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'key': key, 'rows': rows}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"⚠️ Écriture cache CSV impossible: {e}")
+    
     def read_csv_file(self, csv_path: str) -> Optional[List[Dict]]:
-        """Lit un fichier CSV et retourne les données."""
+        """
+        Lit un fichier CSV et retourne les données.
+        
+        Les lignes parsées sont mises en cache disque, indexées par (chemin, mtime, taille) :
+        tant que le fichier ne change pas, il n'est pas re-parsé d'une exécution à l'autre.
+        """
         try:
-            data = []
-            with open(csv_path, 'r', encoding='utf-8', errors='ignore') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    data.append(row)
-            return data
-        except Exception as e:
+            stat = os.stat(csv_path)
+        except OSError as e:
             logger.warning(f"⚠️ Erreur lecture CSV {csv_path}: {e}")
             return None
+        
+        cache_key = (stat.st_mtime_ns, stat.st_size)
+        cache_path = self._csv_cache_path(csv_path)
+        rows = self._load_csv_cache(cache_path, cache_key)
+        if rows is None:
+            rows = self._parse_csv_file(csv_path)
+            if rows is not None:
+                self._save_csv_cache(cache_path, cache_key, rows)
+        return rows
     
-    def read_txt_file(self, txt_path: str) -> Optional[str]:
-        """Lit un fichier TXT et retourne le contenu."""
+    def _parse_csv_file(self, csv_path: str) -> Optional[List[Dict]]:
+        """Parse un fichier CSV (pyarrow si disponible, sinon csv.reader)."""
+        if HAS_PYARROW:
+            try:
+                return read_csv_rows_arrow(csv_path)
+            except (pa.ArrowException, UnicodeDecodeError) as e:
+                logger.debug(f"CSV {csv_path} non lisible par pyarrow ({e}), repli sur csv.reader")
+            except OSError as e:
+                logger.warning(f"⚠️ Erreur lecture CSV {csv_path}: {e}")
+                return None
         try:
-            with open(txt_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
+            return read_csv_rows(csv_path)
         except Exception as e:
-            logger.warning(f"⚠️ Erreur lecture TXT {txt_path}: {e}")
+            logger.warning(f"⚠️ Erreur lecture CSV {csv_path}: {e}")
             return None
     
-    def read_md_file(self, md_path: str) -> Optional[str]:
-        """Lit un fichier MD et retourne le contenu."""
+    def read_text_file(self, path: str) -> Optional[str]:
+        """Lit un fichier texte (TXT de synthèse, MD de captation) et retourne le contenu."""
         try:
-            with open(md_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read()
+            return read_text(path)
         except Exception as e:
-            logger.warning(f"⚠️ Erreur lecture MD {md_path}: {e}")
+            logger.warning(f"⚠️ Erreur lecture {path}: {e}")
             return None
     
-    def process_store_data_folder(self, store_id: str) -> Dict[str, Any]:
-        """Traite le dossier data/[store_id] et retourne les données structurées."""
+    def _read_files(self, jobs: List[Tuple[Callable[[str], Any], str]]) -> List[Any]:
+        """
+        Exécute les lectures (lecteur, chemin) et retourne les résultats dans l'ordre.
+        
+        Les lectures passent par le pool partagé quand il existe : le GIL est
+        relâché pendant les I/O, les latences disque se recouvrent.
+        """
+        if self._read_pool is None:
+            return [reader(path) for reader, path in jobs]
+        futures = [self._read_pool.submit(reader, path) for reader, path in jobs]
+        return [future.result() for future in futures]
+    
+    def process_store_folder(self, store_id: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Traite le dossier data/[store_id] en une seule passe.
+        
+        Retourne (store_data, captation_data) : données internes (CSV + synthèse)
+        et données de captation (MD).
+        """
         
-        data_folder = f"data/{store_id}"
+        store_folder = f"data/{store_id}"
         store_data = {
             'store_id': store_id,
             'internal_data': {},
@@ -137,35 +428,55 @@ class PolcoDataUploader:
             'synthesis_file': None,
             'processing_timestamp': datetime.now().isoformat()
         }
+        captation_data = {
+            'store_id': store_id,
+            'captation_results': {},
+            'md_files': {}
+        }
         
-        if not os.path.exists(data_folder):
-            logger.warning(f"⚠️ Dossier {data_folder} non trouvé")
-            return store_data
-        
-        # Lister tous les fichiers
-        files = os.listdir(data_folder)
-        csv_files = [f for f in files if f.endswith('.csv')]
-        txt_files = [f for f in files if f.endswith('.txt')]
-        
-        logger.info(f"📂 Magasin {store_id}: {len(csv_files)} CSV, {len(txt_files)} TXT")
+        # Lister tous les fichiers (scandir : le type vient de la lecture du dossier, sans stat)
+        csv_files, txt_files, md_files = [], set(), []
+        try:
+            with os.scandir(store_folder) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    if entry.name.endswith('.csv'):
+                        csv_files.append(entry.name)
+                    elif entry.name.endswith('.txt'):
+                        txt_files.add(entry.name)
+                    elif entry.name.endswith('.md'):
+                        md_files.append(entry.name)
+        except FileNotFoundError:
+            logger.warning(f"⚠️ Dossier {store_folder} non trouvé")
+            return store_data, captation_data
+        
+        logger.info(f"📂 Magasin {store_id}: {len(csv_files)} CSV, {len(txt_files)} TXT, {len(md_files)} MD")
+        
+        # Lancer toutes les lectures du magasin en parallèle
+        synthesis_file = f"FR_{store_id}_synthese_complete.txt"
+        has_synthesis = synthesis_file in txt_files  # déjà listé par le scan : ni open ni stat en plus
+        jobs = []
+        if has_synthesis:
+            jobs.append((self.read_text_file, os.path.join(store_folder, synthesis_file)))
+        jobs += [(self.read_csv_file, os.path.join(store_folder, f)) for f in csv_files]
+        jobs += [(self.read_text_file, os.path.join(store_folder, f)) for f in md_files]
+        results = iter(self._read_files(jobs))
         
         # Traiter le fichier de synthèse
-        synthesis_file = f"FR_{store_id}_synthese_complete.txt"
-        if synthesis_file in txt_files:
-            synthesis_path = os.path.join(data_folder, synthesis_file)
-            content = self.read_txt_file(synthesis_path)
+        if has_synthesis:
+            content = next(results)
             if content:
                 store_data['synthesis_file'] = {
                     'filename': synthesis_file,
                     'content': content,
                     'size_chars': len(content)
                 }
-                logger.info(f"✅ Synthèse {store_id}: {len(content)} caractères")
+                logger.debug(f"✅ Synthèse {store_id}: {len(content)} caractères")
         
         # Traiter les fichiers CSV
         for csv_file in csv_files:
-            csv_path = os.path.join(data_folder, csv_file)
-            csv_data = self.read_csv_file(csv_path)
+            csv_data = next(results)
             
             if csv_data is not None:
                 # Extraire le nom logique du fichier (sans préfixe FR_XX_)
@@ -177,36 +488,13 @@ class PolcoDataUploader:
                     'row_count': len(csv_data),
                     'columns': list(csv_data[0].keys()) if csv_data else []
                 }
-                self.stats['total_csv_files'] += 1
+                self._incr_stat('total_csv_files')
                 
                 logger.debug(f"✅ CSV {logical_name}: {len(csv_data)} lignes")
         
-        return store_data
-    
-    def process_store_captation_folder(self, store_id: str) -> Dict[str, Any]:
-        """Traite le dossier data/[store_id] et retourne les données de captation."""
-        
-        captation_folder = f"data/{store_id}"
-        captation_data = {
-            'store_id': store_id,
-            'captation_results': {},
-            'md_files': {}
-        }
-        
-        if not os.path.exists(captation_folder):
-            logger.warning(f"⚠️ Dossier captation {captation_folder} non trouvé")
-            return captation_data
-        
-        # Lister tous les fichiers MD
-        files = os.listdir(captation_folder)
-        md_files = [f for f in files if f.endswith('.md')]
-        
-        logger.info(f"📂 Captation {store_id}: {len(md_files)} fichiers MD")
-        
-        # Traiter chaque fichier MD
+        # Traiter chaque fichier MD (captation)
         for md_file in md_files:
-            md_path = os.path.join(captation_folder, md_file)
-            content = self.read_md_file(md_path)
+            content = next(results)
             
             if content:
                 logical_name = md_file.replace(".md", "")
@@ -215,15 +503,37 @@ class PolcoDataUploader:
                     'content': content,
                     'size_chars': len(content)
                 }
-                self.stats['total_md_files'] += 1
+                self._incr_stat('total_md_files')
                 
                 logger.debug(f"✅ MD {logical_name}: {len(content)} caractères")
         
-        return captation_data
+        return store_data, captation_data
+    
+    def _split_store_files(self, complete_store_data: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """
+        Déporte le contenu des CSV et MD hors du document magasin.
+        
+        Le document ne garde que les métadonnées de chaque fichier (metadata.sharded = True) ;
+        retourne les sous-documents à écrire sous la forme (sous-collection, nom, payload).
+        """
+        from polco_firestore_client import STORE_FILE_SHARDS
+        
+        shards = []
+        sources = complete_store_data['data_sources']
+        for subcollection, source, content_key in STORE_FILE_SHARDS:
+            files = sources[source].get(subcollection, {})
+            for logical_name, file_info in files.items():
+                shards.append((subcollection, logical_name, {
+                    'filename': file_info['filename'],
+                    content_key: file_info[content_key]
+                }))
+                files[logical_name] = {k: v for k, v in file_info.items() if k != content_key}
+        complete_store_data['metadata']['sharded'] = True
+        return shards
     
     def upload_store_to_firestore(self, store_id: str, store_data: Dict[str, Any], 
                                   captation_data: Dict[str, Any]) -> bool:
-        """Upload les données d'un magasin vers Firestore."""
+        """Met en file l'upload des données d'un magasin vers Firestore (BulkWriter)."""
         
         try:
             # Obtenir le nom du magasin depuis le cache
@@ -242,28 +552,117 @@ class PolcoDataUploader:
                     'csv_files_count': len(store_data.get('csv_files', {})),
                     'md_files_count': len(captation_data.get('md_files', {})),
                     'has_synthesis': store_data.get('synthesis_file') is not None,
+                    'sharded': False,
+                    'payload_hash': None,
                     'processing_version': '1.0_complete_data'
                 }
             }
             
-            # Sauvegarder dans Firestore
+            # Magasin inchangé depuis le dernier upload : pas de réécriture
+            # (les horodatages, différents à chaque exécution, sont exclus de l'empreinte)
+            digest = payload_digest({
+                'store_name': store_name,
+                'internal_data': {k: v for k, v in store_data.items() if k != 'processing_timestamp'},
+                'captation_data': captation_data
+            })
+            complete_store_data['metadata']['payload_hash'] = digest
+            if not self.force and self._remote_hashes.get(store_id) == digest:
+                self._incr_stat('stores_skipped')
+                logger.info(f"⏭️ Magasin {store_id} inchangé, upload ignoré")
+                return True
+            
+            # Au-delà de la limite Firestore, le contenu des fichiers part en sous-documents.
+            # L'empreinte n'est alors posée qu'une fois tous les sous-documents confirmés
+            # (voir _commit_payload_hashes) : un fichier en échec sera réécrit au prochain run
+            shards = []
+            size_bytes = payload_size(complete_store_data)
+            if size_bytes > FIRESTORE_MAX_DOC_BYTES:
+                shards = self._split_store_files(complete_store_data)
+                complete_store_data['metadata']['payload_hash'] = None
+                size_bytes = payload_size(complete_store_data)
+                logger.info(f"✂️ Magasin {store_id}: contenu réparti en {len(shards)} sous-documents")
+            
+            # Rejeter d'emblée un document au-delà de la limite (plutôt qu'à l'appel RPC)
+            shard_sizes = [payload_size(payload) for _, _, payload in shards]
+            if max([size_bytes] + shard_sizes) > FIRESTORE_MAX_DOC_BYTES:
+                logger.error(f"❌ Magasin {store_id}: document de {max([size_bytes] + shard_sizes) / 1024:.0f} Ko, "
+                             f"au-delà de la limite Firestore ({FIRESTORE_MAX_DOC_BYTES // 1024} Ko)")
+                with self._stats_lock:
+                    self.stats['errors'].append(f"Store {store_id}: document trop volumineux")
+                return False
+            total_bytes = size_bytes + sum(shard_sizes)
+            self._incr_stat('total_payload_bytes', total_bytes)
+            
+            # Mise en file dans le BulkWriter (succès / échec comptés par ses callbacks)
             doc_ref = self.db.collection(self.collection_name).document(f"store_{store_id}")
-            doc_ref.set(complete_store_data)
+            with self._bulk_lock:
+                if shards:
+                    self._pending_hashes[store_id] = digest
+                for subcollection, logical_name, payload in shards:
+                    self.bulk.set(doc_ref.collection(subcollection).document(logical_name), payload)
+                self.bulk.set(doc_ref, complete_store_data)
             
-            logger.info(f"✅ Magasin {store_id} uploadé vers Firestore")
+            logger.info(f"📤 Magasin {store_id} mis en file pour Firestore ({total_bytes / 1024:.0f} Ko)")
             return True
             
         except Exception as e:
-            logger.error(f"❌ Erreur upload magasin {store_id}: {e}")
-            self.stats['errors'].append(f"Store {store_id}: {str(e)}")
+            logger.error(f"❌ Erreur préparation upload magasin {store_id}: {e}")
+            with self._stats_lock:
+                self.stats['errors'].append(f"Store {store_id}: {str(e)}")
             return False
     
+    def _commit_payload_hashes(self):
+        """
+        Pose l'empreinte des magasins répartis dont toutes les écritures ont été confirmées.
+        
+        À appeler après flush() : un magasin dont un sous-document a échoué garde une
+        empreinte vide et sera donc réécrit intégralement au prochain run.
+        """
+        ready = {store_id: digest for store_id, digest in self._pending_hashes.items()
+                 if store_id not in self._failed_stores}
+        if not ready:
+            return
+        
+        self._committing_hashes = True
+        for store_id, digest in ready.items():
+            doc_ref = self.db.collection(self.collection_name).document(f"store_{store_id}")
+            self.bulk.update(doc_ref, {'metadata.payload_hash': digest})
+        self.bulk.flush()
+        self._committing_hashes = False
+        
+        skipped = len(self._pending_hashes) - len(ready)
+        logger.info(f"🔏 Empreinte posée pour {len(ready)} magasins répartis"
+                    + (f", {skipped} laissés à réécrire" if skipped else ""))
+    
+    def _load_remote_hashes(self, store_ids: List[str]):
+        """Récupère en un seul get_all les empreintes des documents déjà uploadés."""
+        refs = [self.db.collection(self.collection_name).document(f"store_{store_id}") for store_id in store_ids]
+        try:
+            for doc in self.db.get_all(refs, field_paths=['metadata.payload_hash']):
+                if doc.exists and (digest := (doc.to_dict() or {}).get('metadata', {}).get('payload_hash')):
+                    self._remote_hashes[doc.id[len("store_"):]] = digest
+        except Exception as e:
+            logger.warning(f"⚠️ Empreintes Firestore indisponibles, upload complet: {e}")
+            return
+        logger.info(f"🔎 {len(self._remote_hashes)}/{len(store_ids)} magasins déjà présents dans Firestore")
+    
+    def _handle_store(self, store_id: str) -> bool:
+        """Traite un magasin (données internes + captation) et met en file son upload."""
+        # Traiter les données internes et de captation (une seule lecture du dossier)
+        store_data, captation_data = self.process_store_folder(store_id)
+        
+        # Upload vers Firestore
+        return self.upload_store_to_firestore(store_id, store_data, captation_data)
+    
     def process_all_stores(self) -> bool:
         """Traite tous les magasins disponibles."""
         
         data_folders = []
-        if os.path.exists("data"):
-            data_folders = [d for d in os.listdir("data") if os.path.isdir(f"data/{d}")]
+        try:
+            with os.scandir("data") as entries:
+                data_folders = [e.name for e in entries if e.is_dir()]
+        except FileNotFoundError:
+            pass
         
         if not data_folders:
             logger.error("❌ Aucun dossier magasin trouvé dans data/")
@@ -271,24 +670,39 @@ class PolcoDataUploader:
         
         logger.info(f"📊 {len(data_folders)} magasins trouvés à traiter")
         
-        for i, store_id in enumerate(sorted(data_folders), 1):
-            logger.info(f"🏪 [{i}/{len(data_folders)}] Traitement magasin {store_id}...")
-            
-            self.stats['stores_processed'] += 1
-            
-            # Traiter les données internes
-            store_data = self.process_store_data_folder(store_id)
-            
-            # Traiter les données de captation
-            captation_data = self.process_store_captation_folder(store_id)
-            
-            # Upload vers Firestore
-            success = self.upload_store_to_firestore(store_id, store_data, captation_data)
+        if not self.force:
+            self._load_remote_hashes(data_folders)
+        
+        # Lecture des dossiers en parallèle : les workers se recouvrent sur les I/O disque.
+        # Les fichiers de chaque magasin sont lus via un pool commun (pas de threads par magasin).
+        with ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix='polco-read') as read_pool, \
+                ThreadPoolExecutor(max_workers=STORE_WORKERS, thread_name_prefix='polco-store') as executor:
+            self._read_pool = read_pool
+            futures = {
+                executor.submit(self._handle_store, store_id): store_id
+                for store_id in sorted(data_folders)
+            }
+            for i, future in enumerate(as_completed(futures), 1):
+                store_id = futures[future]
+                self._incr_stat('stores_processed')
+                try:
+                    queued = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Erreur traitement magasin {store_id}: {e}")
+                    with self._stats_lock:
+                        self.stats['errors'].append(f"Store {store_id}: {str(e)}")
+                    queued = False
+                
+                if not queued:
+                    self._incr_stat('stores_failed')
+                logger.info(f"🏪 [{i}/{len(data_folders)}] Magasin {store_id} traité")
             
-            if success:
-                self.stats['stores_success'] += 1
-            else:
-                self.stats['stores_failed'] += 1
+            self._read_pool = None
+        
+        # Attendre la fin des écritures en cours, puis valider les magasins répartis
+        self.bulk.flush()
+        self._commit_payload_hashes()
+        self.bulk.close()
         
         return True
     
@@ -362,14 +776,16 @@ class PolcoDataUploader:
         logger.info(f"🏪 Magasins traités: {self.stats['stores_processed']}")
         logger.info(f"✅ Magasins réussis: {self.stats['stores_success']}")
         logger.info(f"❌ Magasins échoués: {self.stats['stores_failed']}")
+        logger.info(f"⏭️ Magasins inchangés: {self.stats['stores_skipped']}")
         logger.info(f"📄 Fichiers CSV traités: {self.stats['total_csv_files']}")
         logger.info(f"📝 Fichiers MD traités: {self.stats['total_md_files']}")
+        logger.info(f"📦 Volume mis en file: {self.stats['total_payload_bytes'] / (1024 * 1024):.1f} Mo")
         logger.info(f"🗄️ Collection: {self.collection_name}")
         
         if self.stats['errors']:
             logger.warning(f"⚠️ {len(self.stats['errors'])} erreurs (voir logs)")
         
-        if self.stats['stores_success'] > 0:
+        if self.stats['stores_success'] + self.stats['stores_skipped'] > 0:
             logger.info("\\n🎉 Upload réussi ! Données disponibles dans Firestore.")
             return True
         else:
@@ -386,11 +802,20 @@ def main():
     parser.add_argument('--test', action='store_true', help='Mode test (1 magasin)')
     parser.add_argument('--limit', type=int, help='Nombre de magasins à traiter')
     parser.add_argument('--store-id', type=str, help='Traiter uniquement le magasin avec cet ID')
+    parser.add_argument('--force', action='store_true', help='Réécrire tous les magasins, même inchangés')
+    parser.add_argument('--ops-per-sec', type=int, default=BULK_INITIAL_OPS_PER_SECOND,
+                        help=f'Débit initial des écritures Firestore (défaut: {BULK_INITIAL_OPS_PER_SECOND})')
+    parser.add_argument('--max-ops-per-sec', type=int, default=BULK_MAX_OPS_PER_SECOND,
+                        help=f'Débit maximal des écritures Firestore (défaut: {BULK_MAX_OPS_PER_SECOND})')
     
     args = parser.parse_args()
     
     try:
-        uploader = PolcoDataUploader()
+        uploader = PolcoDataUploader(
+            force=args.force,
+            ops_per_second=args.ops_per_sec,
+            max_ops_per_second=args.max_ops_per_sec
+        )
         success = uploader.run(
             generate_csv=args.generate_csv,
             limit=args.limit,
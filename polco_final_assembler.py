@@ -7,70 +7,58 @@ Fusion intelligente des 4 sections d'analyse en rapport final enrichi
 import os
 import sys
 import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-
-class PolcoFinalAssembler:
-    """Assembleur final pour créer le rapport complet."""
-    
-    def __init__(self):
-        """Initialise l'assembleur."""
-        pass
-    
-    def calculate_total_analysis_metrics(self, sections: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Calcule les métriques globales de l'analyse."""
-        
-        metrics = {
-            'total_sections': len(sections),
-            'total_generation_time': 0,
-            'total_input_length': 0,
-            'total_output_length': 0,
-            'sections_summary': {},
-            'processing_timestamp': datetime.now().isoformat()
-        }
-        
-        for section in sections:
-            section_name = section.get('section', 'UNKNOWN')
-            metrics['total_generation_time'] += section.get('generation_time', 0)
-            metrics['total_input_length'] += section.get('input_length', 0)
-            metrics['total_output_length'] += section.get('output_length', 0)
-            
-            metrics['sections_summary'][section_name] = {
-                'output_length': section.get('output_length', 0),
-                'generation_time': section.get('generation_time', 0),
-                'timestamp': section.get('timestamp', 'N/A')
-            }
-        
-        return metrics
-    
-    def create_executive_summary(self, store_id: str, sections: List[Dict[str, Any]], 
-                                complete_data: Dict[str, Any]) -> str:
-        """Crée un résumé exécutif basé sur les 4 sections."""
-        
-        # Extraire quelques métriques clés pour le résumé
-        data_sources = complete_data.get('data_sources', {})
-        internal_data = data_sources.get('internal_data', {})
-        csv_files = internal_data.get('csv_files', {})
-        
-        # Données clés
-        ca_par_m2_data = csv_files.get('ca_instore_par_m2', {}).get('data', [])
-        ca_par_m2 = ca_par_m2_data[0].get('revenue_per_square_meter', 'N/A') if ca_par_m2_data else 'N/A'
-        
-        classement_data = csv_files.get('classement_national_du_magasin_par_gmv', {}).get('data', [])
-        rang_national = classement_data[0].get('national_rank', 'N/A') if classement_data else 'N/A'
-        
-        surface_data = csv_files.get('surface_de_vente', {}).get('data', [])
-        surface = surface_data[0].get('surface_m2', 'N/A') if surface_data else 'N/A'
-        
-        ca_sports = csv_files.get('ca_par_sport', {}).get('data', [])
-        top_sport = ca_sports[0].get('sport_department_label', 'N/A') if ca_sports else 'N/A'
-        
-        summary = f"""
+# Ordre des chapitres du rapport ; les parties I à IV sont nettoyées de leurs recommandations
+SECTION_ORDER = ('CONTEXTE', 'CIBLES', 'POTENTIEL', 'OFFRE', 'ACTIONS')
+CLEANED_SECTIONS = frozenset(SECTION_ORDER[:4])
+
+# Titres de chapitre attendus : section -> (motif des titres mal numérotés, titre corrigé)
+SECTION_TITLE_FIXES = {
+    'CONTEXTE': (re.compile(r'^##?\s*(I{1,4}|[1-4])\.\s*CONTEXTE.*$', re.MULTILINE | re.IGNORECASE),
+                 '## I. CONTEXTE GÉNÉRAL ET LOCAL'),
+    'CIBLES': (re.compile(r'^##?\s*(I{1,4}|[1-4])\.\s*À QUI VENDRE.*$', re.MULTILINE | re.IGNORECASE),
+               '## II. À QUI VENDRE (CIBLES CLIENTS)'),
+    'POTENTIEL': (re.compile(r'^##?\s*(I{1,4}|[1-4])\.\s*COMBIEN VENDRE.*$', re.MULTILINE | re.IGNORECASE),
+                  '## III. COMBIEN VENDRE (POTENTIEL DE MARCHÉ)'),
+    'OFFRE': (re.compile(r'^##?\s*(I{1,4}|[1-4])\.\s*QUOI VENDRE.*$', re.MULTILINE | re.IGNORECASE),
+              '## IV. QUOI VENDRE (OFFRE PRODUIT ET SPORTIVE)'),
+    'ACTIONS': (re.compile(r'^##?\s*(I{1,5}|[1-5])\.\s*PROPOSITIONS.*$', re.MULTILINE | re.IGNORECASE),
+                "## V. PROPOSITIONS D'ACTIONS À CHALLENGER PAR VOS ÉQUIPES"),
+}
+
+# Sous-parties retirées des sections I à IV (recommandations, plans d'action, actions, propositions),
+# jusqu'au titre suivant : une seule passe sur le texte. Le titre est pris en entier (#{2,}) pour
+# qu'un "####" retiré ne laisse pas de "#" orphelin.
+SECTION_CLEANUP_PATTERN = re.compile(
+    r"#{2,}\s*\d*\.?\d*\s*(?:[Rr]ecommandations?|Plan d'action|[Aa]ctions?|[Pp]ropositions?).*?(?=##|\Z)",
+    re.DOTALL | re.IGNORECASE
+)
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n\s*\n+')
+
+# Limites d'un commit Firestore : 500 écritures et 10 Mo par requête (marge gardée sur la taille)
+FIRESTORE_BATCH_MAX_WRITES = 500
+FIRESTORE_BATCH_MAX_BYTES = 9 * 1024 * 1024
+
+# Cache des contenus de rapport déjà assemblés (entrées identiques -> texte identique)
+REPORT_CACHE_MAXSIZE = 128
+
+# Empreinte des entrées -> contenu du rapport, en LRU borné partagé par tous les assembleurs
+# du processus (chaque instance n'assemble en général qu'un rapport par magasin)
+_report_content_cache: "OrderedDict[str, str]" = OrderedDict()
+_report_content_cache_lock = threading.Lock()
+
+# Gabarits markdown statiques du rapport (seules les valeurs sont interpolées à chaque appel)
+EXECUTIVE_SUMMARY_TEMPLATE = """
 # RÉSUMÉ EXÉCUTIF - ANALYSE POLCO 3.0
 
 ## Magasin Decathlon {store_id}
@@ -101,12 +89,8 @@ Cette analyse POLCO 3.0 présente une approche révolutionnaire avec **5 process
 
 ---
 """
-        return summary
-    
-    def create_methodology_section(self, metrics: Dict[str, Any]) -> str:
-        """Crée la section méthodologie."""
-        
-        methodology = f"""
+
+METHODOLOGY_HEADER_TEMPLATE = """
 ---
 
 ## 🔬 MÉTHODOLOGIE POLCO ANALYZER 3.0
@@ -145,25 +129,24 @@ Cette analyse a été produite par le système **POLCO ANALYZER 3.0**, première
 
 ### 📈 **Métriques de Traitement**
 
-- **Sections générées** : {metrics['total_sections']}
-- **Temps total d'analyse** : {metrics['total_generation_time']:.1f} secondes
-- **Données en entrée** : {metrics['total_input_length']:,} caractères
-- **Analyse produite** : {metrics['total_output_length']:,} caractères
-- **Ratio d'exploitation** : {(metrics['total_output_length'] / max(metrics['total_input_length'], 1) * 100):.1f}%
+- **Sections générées** : {total_sections}
+- **Temps total d'analyse** : {total_generation_time:.1f} secondes
+- **Données en entrée** : {total_input_length:,} caractères
+- **Analyse produite** : {total_output_length:,} caractères
+- **Ratio d'exploitation** : {exploitation_ratio:.1f}%
 
 ### 🎯 **Performance par Processeur**
 
 """
-        
-        for section_name, section_metrics in metrics['sections_summary'].items():
-            methodology += f"""
+
+METHODOLOGY_SECTION_TEMPLATE = """
 **{section_name}** :
-- Analyse générée : {section_metrics['output_length']:,} caractères
-- Temps de traitement : {section_metrics['generation_time']:.1f}s
-- Efficacité : {(section_metrics['output_length'] / max(section_metrics['generation_time'], 0.1)):.0f} caractères/seconde
+- Analyse générée : {output_length:,} caractères
+- Temps de traitement : {generation_time:.1f}s
+- Efficacité : {efficiency:.0f} caractères/seconde
 """
-        
-        methodology += f"""
+
+METHODOLOGY_FOOTER = """
 
 ### 🔧 **Technologies Utilisées**
 
@@ -182,183 +165,201 @@ Cette analyse a été produite par le système **POLCO ANALYZER 3.0**, première
 
 ---
 """
-        return methodology
+
+
+class PolcoFinalAssembler:
+    """Assembleur final pour créer le rapport complet."""
     
-    def fix_section_numbering(self, content: str, chapter_number: int, section_name: str) -> str:
-        """Corrige la numérotation des sections pour assurer l'ordre logique."""
+    def __init__(self):
+        """Initialise l'assembleur."""
+        pass
+    
+    def calculate_total_analysis_metrics(self, sections: List[Dict[str, Any]],
+                                         timestamp: Optional[str] = None) -> Dict[str, Any]:
+        """Calcule les métriques globales de l'analyse (horodatées à timestamp, ou maintenant)."""
         
-        # Mapping des chapitres
-        chapter_titles = {
-            1: "I. CONTEXTE GÉNÉRAL ET LOCAL",
-            2: "II. À QUI VENDRE (CIBLES CLIENTS)", 
-            3: "III. COMBIEN VENDRE (POTENTIEL DE MARCHÉ)",
-            4: "IV. QUOI VENDRE (OFFRE PRODUIT ET SPORTIVE)",
-            5: "V. PROPOSITIONS D'ACTIONS À CHALLENGER PAR VOS ÉQUIPES"
+        metrics = {
+            'total_sections': len(sections),
+            'total_generation_time': sum(section.get('generation_time', 0) for section in sections),
+            'total_input_length': sum(section.get('input_length', 0) for section in sections),
+            'total_output_length': sum(section.get('output_length', 0) for section in sections),
+            'sections_summary': {
+                section.get('section', 'UNKNOWN'): {
+                    'output_length': section.get('output_length', 0),
+                    'generation_time': section.get('generation_time', 0),
+                    'timestamp': section.get('timestamp', 'N/A')
+                }
+                for section in sections
+            },
+            'processing_timestamp': timestamp or datetime.now().isoformat()
         }
         
-        # Patterns de remplacement pour corriger la numérotation
-        wrong_patterns = [
-            r"^##?\s*(I{1,4}|[1-4])\.\s*.*$",  # Titles mal numérotés
-            r"^##?\s*II\.\s*À QUI VENDRE.*$",
-            r"^##?\s*III\.\s*COMBIEN VENDRE.*$", 
-            r"^##?\s*IV\.\s*QUOI VENDRE.*$",
-            r"^##?\s*I\.\s*CONTEXTE.*$"
-        ]
-        
-        # Correction spécifique par section
-        if section_name == "CONTEXTE":
-            # Remplacer toute variation de titre par le bon
-            content = re.sub(
-                r'^##?\s*(I{1,4}|[1-4])\.\s*CONTEXTE.*$',
-                f'## {chapter_titles[1]}',
-                content,
-                flags=re.MULTILINE | re.IGNORECASE
-            )
-        elif section_name == "CIBLES":
-            content = re.sub(
-                r'^##?\s*(I{1,4}|[1-4])\.\s*À QUI VENDRE.*$',
-                f'## {chapter_titles[2]}',
-                content,
-                flags=re.MULTILINE | re.IGNORECASE
-            )
-        elif section_name == "POTENTIEL":
-            content = re.sub(
-                r'^##?\s*(I{1,4}|[1-4])\.\s*COMBIEN VENDRE.*$',
-                f'## {chapter_titles[3]}',
-                content,
-                flags=re.MULTILINE | re.IGNORECASE
-            )
-        elif section_name == "OFFRE":
-            content = re.sub(
-                r'^##?\s*(I{1,4}|[1-4])\.\s*QUOI VENDRE.*$',
-                f'## {chapter_titles[4]}',
-                content,
-                flags=re.MULTILINE | re.IGNORECASE
-            )
-        elif section_name == "ACTIONS":
-            content = re.sub(
-                r'^##?\s*(I{1,5}|[1-5])\.\s*PROPOSITIONS.*$',
-                f'## {chapter_titles[5]}',
-                content,
-                flags=re.MULTILINE | re.IGNORECASE
-            )
+        return metrics
+    
+    def create_executive_summary(self, store_id: str, sections: List[Dict[str, Any]], 
+                                complete_data: Dict[str, Any]) -> str:
+        """Crée un résumé exécutif basé sur les 4 sections."""
+        
+        # Extraire quelques métriques clés pour le résumé
+        data_sources = complete_data.get('data_sources', {})
+        internal_data = data_sources.get('internal_data', {})
+        csv_files = internal_data.get('csv_files', {})
+        
+        # Données clés
+        ca_par_m2_data = csv_files.get('ca_instore_par_m2', {}).get('data', [])
+        ca_par_m2 = ca_par_m2_data[0].get('revenue_per_square_meter', 'N/A') if ca_par_m2_data else 'N/A'
+        
+        classement_data = csv_files.get('classement_national_du_magasin_par_gmv', {}).get('data', [])
+        rang_national = classement_data[0].get('national_rank', 'N/A') if classement_data else 'N/A'
+        
+        surface_data = csv_files.get('surface_de_vente', {}).get('data', [])
+        surface = surface_data[0].get('surface_m2', 'N/A') if surface_data else 'N/A'
+        
+        ca_sports = csv_files.get('ca_par_sport', {}).get('data', [])
+        top_sport = ca_sports[0].get('sport_department_label', 'N/A') if ca_sports else 'N/A'
+        
+        return EXECUTIVE_SUMMARY_TEMPLATE.format(
+            store_id=store_id,
+            surface=surface,
+            ca_par_m2=ca_par_m2,
+            rang_national=rang_national,
+            top_sport=top_sport
+        )
+    
+    def create_methodology_section(self, metrics: Dict[str, Any]) -> str:
+        """Crée la section méthodologie."""
+        
+        parts = [METHODOLOGY_HEADER_TEMPLATE.format(
+            exploitation_ratio=metrics['total_output_length'] / max(metrics['total_input_length'], 1) * 100,
+            **metrics
+        )]
+        
+        for section_name, section_metrics in metrics['sections_summary'].items():
+            parts.append(METHODOLOGY_SECTION_TEMPLATE.format(
+                section_name=section_name,
+                output_length=section_metrics['output_length'],
+                generation_time=section_metrics['generation_time'],
+                efficiency=section_metrics['output_length'] / max(section_metrics['generation_time'], 0.1)
+            ))
+        
+        parts.append(METHODOLOGY_FOOTER)
+        return "".join(parts)
+    
+    def fix_section_numbering(self, content: str, chapter_number: int, section_name: str) -> str:
+        """Corrige la numérotation des sections pour assurer l'ordre logique."""
+        
+        # Remplacer toute variation de titre de la section par le bon
+        if section_name in SECTION_TITLE_FIXES:
+            pattern, title = SECTION_TITLE_FIXES[section_name]
+            content = pattern.sub(title, content)
         
         return content
     
     def clean_section_content(self, content: str, section_name: str) -> str:
         """Nettoie le contenu des sections en supprimant les recommandations et éléments indésirables."""
-        import re
         
         # Supprimer les sections de recommandations des parties I à IV
-        if section_name in ['CONTEXTE', 'CIBLES', 'POTENTIEL', 'OFFRE']:
-            # Supprimer les sections avec "Recommandations"
-            content = re.sub(
-                r'###?\s*\d*\.?\d*\s*[Rr]ecommandations?.*?(?=###?|\Z)',
-                '',
-                content,
-                flags=re.DOTALL | re.IGNORECASE
-            )
-            
-            # Supprimer les sections "Plan d'action"
-            content = re.sub(
-                r'###?\s*\d*\.?\d*\s*Plan d\'action.*?(?=###?|\Z)',
-                '',
-                content,
-                flags=re.DOTALL | re.IGNORECASE
-            )
-            
-            # Supprimer les sections "Actions" ou "Propositions"
-            content = re.sub(
-                r'###?\s*\d*\.?\d*\s*[Aa]ctions?.*?(?=###?|\Z)',
-                '',
-                content,
-                flags=re.DOTALL | re.IGNORECASE
-            )
-            
-            content = re.sub(
-                r'###?\s*\d*\.?\d*\s*[Pp]ropositions?.*?(?=###?|\Z)',
-                '',
-                content,
-                flags=re.DOTALL | re.IGNORECASE
-            )
+        if section_name in CLEANED_SECTIONS:
+            # Supprimer les sections "Recommandations", "Plan d'action", "Actions" et "Propositions"
+            content = SECTION_CLEANUP_PATTERN.sub('', content)
         
         # Nettoyer les lignes vides multiples
-        content = re.sub(r'\n\s*\n\s*\n+', '\n\n', content)
+        content = BLANK_LINES_PATTERN.sub('\n\n', content)
         
         return content.strip()
     
-    def assemble_final_report(self, store_id: str, sections: List[Dict[str, Any]], 
-                             complete_data: Dict[str, Any], 
-                             chart_integration: str = "") -> Dict[str, Any]:
-        """Assemble le rapport final complet."""
-        
-        logger.info(f"🔧 Assemblage rapport final magasin {store_id}")
-        
-        # Calculer les métriques
-        metrics = self.calculate_total_analysis_metrics(sections)
-        
-        # Créer les sections du rapport
-        executive_summary = self.create_executive_summary(store_id, sections, complete_data)
-        methodology = self.create_methodology_section(metrics)
-        
-        # Assembler le contenu principal dans l'ordre logique
-        section_order = ['CONTEXTE', 'CIBLES', 'POTENTIEL', 'OFFRE', 'ACTIONS']
-        main_content = ""
+    def process_section_content(self, content: str, section_name: str, chapter_number: int) -> str:
+        """
+        Prépare le texte d'une section pour le rapport, en trois passes regex au total :
+        retrait des sous-parties indésirables (parties I à IV), lignes vides, titre du chapitre.
+        """
+        return self.fix_section_numbering(self.clean_section_content(content, section_name),
+                                          chapter_number, section_name)
+    
+    @staticmethod
+    def report_cache_key(executive_summary: str, sections: List[Dict[str, Any]], chart_integration: str) -> str:
+        """Empreinte BLAKE2 de tout ce dont dépend le contenu du rapport."""
+        digest = hashlib.blake2b(digest_size=32)
+        for part in [executive_summary, chart_integration or ""]:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        for section in sections:
+            digest.update(str(section.get('section', '')).encode('utf-8'))
+            digest.update(b'\x00')
+            digest.update(str(section.get('content', '')).encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+    
+    def build_report_content(self, executive_summary: str, sections: List[Dict[str, Any]],
+                             chart_integration: str = "") -> str:
+        """
+        Assemble le texte du rapport (sans partie technique/méthodologie) :
+        résumé, sections dans l'ordre logique puis graphiques. Les morceaux sont
+        joints une seule fois à la fin, sans chaîne intermédiaire ni recopie par +=.
+        """
+        parts = [executive_summary, "\n\n"]
         
         # Créer un dictionnaire pour accès rapide
         sections_dict = {section.get('section', ''): section for section in sections}
         
-        for i, section_name in enumerate(section_order, 1):
+        for i, section_name in enumerate(SECTION_ORDER, 1):
             if section_name in sections_dict:
                 section = sections_dict[section_name]
                 section_content = section.get('content', '')
                 
-                # S'assurer que la numérotation est correcte
+                # Nettoyer le contenu (recommandations des sections I-IV) et corriger la numérotation
                 if section_content:
-                    # Nettoyer le contenu (supprimer les recommandations des sections I-IV)
-                    cleaned_content = self.clean_section_content(section_content, section_name)
-                    
-                    # Remplacer les numérotations incorrectes par la bonne
-                    section_content = self.fix_section_numbering(cleaned_content, i, section_name)
+                    section_content = self.process_section_content(section_content, section_name, i)
                     
-                    main_content += f"""
-
----
-
-{section_content}
-
-"""
+                    parts.append("\n\n---\n\n")
+                    parts.append(section_content)
+                    parts.append("\n\n")
             else:
                 logger.warning(f"⚠️ Section {section_name} manquante dans l'analyse")
         
         # Ajouter les sections non prévues à la fin
-        processed_sections = set(section_order)
-        for section in sections:
-            section_name = section.get('section', '')
-            if section_name not in processed_sections and section_name:
-                section_content = section.get('content', '')
-                main_content += f"""
-
----
-
-### Section Additionnelle: {section_name}
-
-{section_content}
-
-"""
+        extras = [name for name in sections_dict if name and name not in SECTION_ORDER]
+        for section_name in extras:
+            section_content = sections_dict[section_name].get('content', '')
+            parts.append(f"\n\n---\n\n### Section Additionnelle: {section_name}\n\n")
+            parts.append(section_content)
+            parts.append("\n\n")
         
         # Intégrer les graphiques si disponibles
-        graphics_section = ""
-        if chart_integration:
-            graphics_section = chart_integration
+        parts.append("\n\n")
+        parts.append(chart_integration or "")
+        parts.append("\n")
+        return "".join(parts)
+    
+    def assemble_final_report(self, store_id: str, sections: List[Dict[str, Any]], 
+                             complete_data: Dict[str, Any], 
+                             chart_integration: str = "") -> Dict[str, Any]:
+        """Assemble le rapport final complet."""
         
-        # Assembler le rapport complet (sans partie technique/méthodologie)
-        final_report_content = f"""{executive_summary}
-
-{main_content}
-
-{graphics_section}
-"""
+        logger.info(f"🔧 Assemblage rapport final magasin {store_id}")
+        now_iso = datetime.now().isoformat()
+        
+        # Calculer les métriques
+        metrics = self.calculate_total_analysis_metrics(sections, timestamp=now_iso)
+        
+        # Le résumé (peu coûteux) fait partie de l'empreinte : il résume ce que le
+        # rapport tire de complete_data
+        executive_summary = self.create_executive_summary(store_id, sections, complete_data)
+        cache_key = self.report_cache_key(executive_summary, sections, chart_integration)
+        
+        with _report_content_cache_lock:
+            final_report_content = _report_content_cache.get(cache_key)
+            if final_report_content is not None:
+                _report_content_cache.move_to_end(cache_key)
+        
+        if final_report_content is None:
+            final_report_content = self.build_report_content(executive_summary, sections, chart_integration)
+            with _report_content_cache_lock:
+                _report_content_cache[cache_key] = final_report_content
+                while len(_report_content_cache) > REPORT_CACHE_MAXSIZE:
+                    _report_content_cache.popitem(last=False)
+        else:
+            logger.info(f"♻️ Contenu du rapport {store_id} servi depuis le cache")
         
         # Préparer le résultat final
         final_report = {
@@ -367,7 +368,7 @@ Cette analyse a été produite par le système **POLCO ANALYZER 3.0**, première
             'metrics': metrics,
             'sections_processed': [s.get('section') for s in sections],
             'total_length': len(final_report_content),
-            'generation_timestamp': datetime.now().isoformat(),
+            'generation_timestamp': now_iso,
             'analyzer_version': '3.0_sectorial'
         }
         
@@ -376,20 +377,80 @@ Cette analyse a été produite par le système **POLCO ANALYZER 3.0**, première
         
         return final_report
     
+    def save_many_final_reports(self, reports: List[Dict[str, Any]], db,
+                                collection_name: str = "polco_analyzer_3_0") -> List[str]:
+        """
+        Sauvegarde plusieurs rapports finaux dans Firestore par lots (WriteBatch).
+        
+        Un commit regroupe jusqu'à FIRESTORE_BATCH_MAX_WRITES rapports sans dépasser
+        FIRESTORE_BATCH_MAX_BYTES : un aller-retour réseau pour tout le lot. Un lot
+        d'un seul rapport est écrit directement (doc_ref.set), sans WriteBatch.
+        
+        Returns:
+            Les store_id des rapports effectivement sauvegardés
+        """
+        batches = []
+        current, current_bytes = [], 0
+        for report in reports:
+            size = len(json.dumps(report, ensure_ascii=False, default=str).encode('utf-8'))
+            if current and (len(current) >= FIRESTORE_BATCH_MAX_WRITES or current_bytes + size > FIRESTORE_BATCH_MAX_BYTES):
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append(report)
+            current_bytes += size
+        if current:
+            batches.append(current)
+        
+        saved = []
+        for chunk in batches:
+            doc_ids = [f"analyzer_3_0_{report['store_id']}" for report in chunk]
+            try:
+                if len(chunk) == 1:
+                    db.collection(collection_name).document(doc_ids[0]).set(chunk[0])
+                else:
+                    batch = db.batch()
+                    for doc_id, report in zip(doc_ids, chunk):
+                        batch.set(db.collection(collection_name).document(doc_id), report)
+                    batch.commit()
+                saved.extend(report['store_id'] for report in chunk)
+                logger.info(f"✅ Rapport(s) final(aux) sauvegardé(s): {', '.join(doc_ids)}")
+            except Exception as e:
+                logger.error(f"❌ Erreur sauvegarde lot de {len(chunk)} rapport(s) final(aux): {e}")
+        
+        return saved
+    
+    def assemble_and_save_batch(self, store_inputs: List[Tuple[str, List[Dict[str, Any]], Dict[str, Any], str]],
+                                db, collection_name: str = "polco_analyzer_3_0") -> List[Optional[Dict[str, Any]]]:
+        """
+        Assemble et sauvegarde les rapports finaux de plusieurs magasins.
+        
+        L'assemblage (regex + concaténation, lié au CPU) se fait à la suite ; les
+        sauvegardes partent ensuite groupées via save_many_final_reports : un
+        aller-retour Firestore par lot au lieu d'un par magasin.
+        
+        Args:
+            store_inputs: Tuples (store_id, sections, complete_data, chart_integration)
+        
+        Returns:
+            Le rapport final de chaque magasin dans l'ordre des entrées (None si
+            l'assemblage ou la sauvegarde a échoué)
+        """
+        reports: List[Optional[Dict[str, Any]]] = []
+        for store_id, sections, complete_data, chart_integration in store_inputs:
+            try:
+                reports.append(self.assemble_final_report(store_id, sections, complete_data, chart_integration))
+            except Exception as e:
+                logger.error(f"❌ Erreur assemblage rapport final magasin {store_id}: {e}")
+                reports.append(None)
+        
+        saved_ids = set(self.save_many_final_reports([r for r in reports if r], db, collection_name))
+        logger.info(f"📦 {len(saved_ids)}/{len(store_inputs)} rapports finaux assemblés et sauvegardés")
+        return [report if report and report['store_id'] in saved_ids else None for report in reports]
+    
     def save_final_report_to_firestore(self, final_report: Dict[str, Any], 
                                       db, collection_name: str = "polco_analyzer_3_0") -> bool:
         """Sauvegarde le rapport final dans Firestore."""
-        
-        try:
-            store_id = final_report['store_id']
-            doc_ref = db.collection(collection_name).document(f"analyzer_3_0_{store_id}")
-            doc_ref.set(final_report)
-            
-            logger.info(f"✅ Rapport final sauvegardé: analyzer_3_0_{store_id}")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Erreur sauvegarde rapport final: {e}")
-            return False
+        return bool(self.save_many_final_reports([final_report], db, collection_name))
 
 
 def main():
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+POLCO - Accès Firestore partagé
+Client Firestore unique par processus et cache des documents de captation
+Évite de recréer un client et de relire le même document pour chaque processeur
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+from google.cloud import firestore
+
+# Configuration
+PROJECT_ID = "polcoaigeneration-ved6"
+CAPTATION_CACHE_TTL = 900  # secondes
+CAPTATION_CACHE_MAXSIZE = 1024
+# Seuls les résultats de prompts sont lus par les processeurs de section
+CAPTATION_FIELDS = ("prompts_results",)
+IO_POOL_MAX_WORKERS = 32
+# Documents magasin trop gros : contenu des fichiers déporté en sous-collections
+# (sous-collection, source dans data_sources, champ de contenu)
+STORE_FILE_SHARDS = (
+    ('csv_files', 'internal_data', 'data'),
+    ('md_files', 'captation_data', 'content'),
+)
+
+logger = logging.getLogger(__name__)
+
+# Instance globale pour réutilisation
+_firestore_client = None
+_firestore_client_lock = threading.Lock()
+
+# Cache LRU à durée de vie limitée : (collection, store_id) -> (horodatage, données)
+_captation_cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_captation_cache_lock = threading.Lock()
+
+# Pool partagé pour les lectures Firestore bloquantes (tous processeurs confondus)
+IO_POOL = ThreadPoolExecutor(max_workers=IO_POOL_MAX_WORKERS, thread_name_prefix="polco-io")
+
+
+def get_firestore_client(project_id: str = PROJECT_ID):
+    """
+    Retourne l'instance globale du client Firestore.
+
+    Le client (canal gRPC + jeton d'authentification) est créé une seule fois
+    par processus, sous verrou car les sections sont traitées en parallèle
+    dans des threads ; tous les appelants partagent ensuite le même canal.
+    """
+    global _firestore_client
+    if _firestore_client is None:
+        with _firestore_client_lock:
+            if _firestore_client is None:
+                _firestore_client = firestore.Client(project=project_id)
+                logger.info(f"🔄 Nouveau client Firestore créé ({project_id})")
+    return _firestore_client
+
+
+def _store_in_cache(key: Tuple[str, str], data: Dict[str, Any], now: float):
+    """Ajoute une entrée au cache en respectant la taille maximale (appelant sans verrou)."""
+    with _captation_cache_lock:
+        _captation_cache[key] = (now, data)
+        _captation_cache.move_to_end(key)
+        while len(_captation_cache) > CAPTATION_CACHE_MAXSIZE:
+            _captation_cache.popitem(last=False)
+
+
+def get_captation_document(collection: str, store_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Retourne le document de captation d'un magasin, en cache pendant CAPTATION_CACHE_TTL.
+
+    Seuls les champs CAPTATION_FIELDS sont transférés (projection Firestore) :
+    les métadonnées du document ne transitent pas sur le réseau.
+
+    Args:
+        collection: Collection Firestore de captation
+        store_id: Identifiant du magasin
+
+    Returns:
+        Le contenu projeté du document ou None s'il n'existe pas
+    """
+    key = (collection, str(store_id))
+    now = time.monotonic()
+
+    with _captation_cache_lock:
+        cached = _captation_cache.get(key)
+        if cached and now - cached[0] < CAPTATION_CACHE_TTL:
+            _captation_cache.move_to_end(key)
+            logger.info(f"♻️ Captation store {store_id} servie depuis le cache")
+            return cached[1]
+
+    doc_ref = get_firestore_client().collection(collection).document(f"store_{store_id}")
+    doc = doc_ref.get(field_paths=list(CAPTATION_FIELDS))
+    if not doc.exists:
+        return None
+
+    data = doc.to_dict()
+    _store_in_cache(key, data, now)
+    return data
+
+
+def get_prompts_results(collection: str, store_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Retourne les prompts_results de captation d'un magasin, partagés par toutes les sections.
+
+    Le document est lu une seule fois par exécution (cache de get_captation_document) ;
+    chaque processeur applique ensuite son propre filtre via select_prompt_responses.
+
+    Returns:
+        Le dictionnaire prompt_key -> résultat, ou None si le document n'existe pas
+    """
+    data = get_captation_document(collection, store_id)
+    if data is None:
+        return None
+    return data.get('prompts_results', {})
+
+
+def select_prompt_responses(prompts_results: Dict[str, Any], prompt_keys: Tuple[str, ...],
+                            max_chars: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    Filtre les réponses complétées des prompts demandés, dans l'ordre de prompt_keys.
+
+    Args:
+        prompts_results: Résultats renvoyés par get_prompts_results
+        prompt_keys: Prompts pertinents pour la section
+        max_chars: Longueur maximale de chaque réponse (None = pas de troncature)
+
+    Returns:
+        Liste de couples (prompt_key, réponse)
+    """
+    responses = []
+    for prompt_key in prompt_keys:
+        if (prompt_data := prompts_results.get(prompt_key)) and prompt_data.get('status') == 'completed' and prompt_data.get('response'):
+            response_text = prompt_data['response']
+            responses.append((prompt_key, response_text[:max_chars] if max_chars else response_text))
+    return responses
+
+
+def prefetch_captation_documents(collection: str, store_ids: List[str]) -> int:
+    """
+    Charge en cache les documents de captation de plusieurs magasins en un seul appel get_all.
+
+    Returns:
+        Le nombre de documents trouvés
+    """
+    if not store_ids:
+        return 0
+    db = get_firestore_client()
+    refs = [db.collection(collection).document(f"store_{store_id}") for store_id in store_ids]
+    now = time.monotonic()
+    found = 0
+    for doc in db.get_all(refs, field_paths=list(CAPTATION_FIELDS)):
+        if doc.exists:
+            _store_in_cache((collection, doc.id[len("store_"):]), doc.to_dict(), now)
+            found += 1
+    logger.info(f"📥 {found}/{len(store_ids)} documents de captation préchargés")
+    return found
+
+
+def hydrate_store_document(collection: str, store_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Réintègre dans un document magasin le contenu des fichiers déportés en sous-collections.
+
+    Les documents dépassant la limite Firestore sont uploadés avec metadata.sharded :
+    chaque CSV / MD est alors un sous-document store_{id}/{sous-collection}/{nom}.
+    Les documents non découpés sont retournés tels quels.
+    """
+    if not store_data.get('metadata', {}).get('sharded'):
+        return store_data
+
+    doc_ref = get_firestore_client().collection(collection).document(f"store_{store_data['store_id']}")
+    sources = store_data.get('data_sources', {})
+    for subcollection, source, content_key in STORE_FILE_SHARDS:
+        files = sources.get(source, {}).get(subcollection, {})
+        for doc in doc_ref.collection(subcollection).stream():
+            if doc.id in files:
+                files[doc.id][content_key] = doc.to_dict().get(content_key)
+    return store_data
+
+
+def clear_captation_cache():
+    """Vide le cache des documents de captation."""
+    with _captation_cache_lock:
+        _captation_cache.clear()
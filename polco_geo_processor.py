@@ -8,10 +8,18 @@ Analyse automatiquement les résultats de captation pour créer des cartes adapt
 import os
 import re
 import json
+import atexit
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 import folium
 import requests
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from geopy.geocoders import Nominatim
+from geopy.adapters import RequestsAdapter
 from geopy.distance import geodesic
 from typing import Dict, List, Optional
 import logging
@@ -19,17 +27,26 @@ from datetime import datetime
 from google.cloud import firestore
 import vertexai
 from vertexai.generative_models import GenerativeModel
+from polco_llm_client import get_generative_cache, GenerativeCache
 import warnings
 warnings.filterwarnings('ignore')
 
+# Désérialisation JSON rapide si orjson est disponible
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Imports pour isochrones réalistes
 try:
     import osmnx as ox
     import networkx as nx
-    from shapely.geometry import Point, Polygon, MultiPoint
+    from shapely.geometry import Polygon, MultiPoint
     from shapely.ops import unary_union
     import geopandas as gpd
     from pyproj import Geod
+    import shapely
     HAS_REALISTIC_LIBS = True
 except ImportError:
     HAS_REALISTIC_LIBS = False
@@ -39,9 +56,7 @@ except ImportError:
 try:
     from selenium import webdriver
     from selenium.webdriver.chrome.options import Options
-    from selenium.webdriver.common.by import By
     from selenium.webdriver.support.ui import WebDriverWait
-    from selenium.webdriver.support import expected_conditions as EC
     import time
     HAS_SELENIUM = True
 except ImportError:
@@ -81,6 +96,77 @@ REGION = "us-central1"
 MODEL_NAME = "gemini-2.5-flash"
 CAPTATION_COLLECTION = "polco_magasins_captation"
 
+# Capture des cartes : attente des tuiles Leaflet plutôt qu'un délai fixe
+MAP_TILES_SELECTOR = '.leaflet-tile-loaded'
+MAP_LOAD_TIMEOUT_MS = 10000
+MAP_TILES_TIMEOUT_MS = 8000
+MAP_SETTLE_MS = 300
+# Selenium : au moins une tuile chargée et plus aucune en cours de chargement
+MAP_TILES_READY_JS = (
+    "return document.querySelectorAll('.leaflet-tile-loaded').length > 0"
+    " && document.querySelectorAll('.leaflet-tile:not(.leaflet-tile-loaded)').length === 0"
+)
+
+# Pool HTTP partagé pour les API d'isochrones (ORS, HERE) : connexions keep-alive
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 16
+HTTP_MAX_RETRIES = 2
+HTTP_BACKOFF_FACTOR = 0.3
+
+# Isochrones multi-magasins : points traités en parallèle, appels API plafonnés (quotas ORS)
+ISOCHRONE_BATCH_WORKERS = 8
+ISOCHRONE_API_CONCURRENCY = 4
+
+# Approximation d'isochrones : un point tous les 5° autour du magasin
+APPROX_BEARINGS_DEG = np.arange(0, 360, 5, dtype=np.float64)
+EARTH_RADIUS_KM = 6371.0088
+_rng = np.random.default_rng()
+
+# Motifs d'extraction des résultats de captation (compilés une fois)
+STORE_ZONE_PATTERNS = {
+    'name': re.compile(r'\*\*Nom :\*\* (.+)', re.IGNORECASE),
+    'address': re.compile(r'\*\*Adresse :\*\* (.+)', re.IGNORECASE),
+    'coordinates': re.compile(r'Latitude : ([\d.]+), Longitude : ([\d.]+)', re.IGNORECASE),
+    'surface': re.compile(r'(\d+) ?m²', re.IGNORECASE)
+}
+COMPETITOR_PATTERNS = [
+    re.compile(r'\*\*([^\*]+)\*\* ?: ?([^,\n]+)[,\n].*?[Dd]istance[^\d]*([\d,\.]*)\s*([km])', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'([A-Z][^\n]*Sport[^\n]*) ?[:-] ?([^\n]+distance[^\d]*([\d,\.]*)\s*([km]))', re.IGNORECASE | re.MULTILINE),
+    re.compile(r'([A-Z][A-Za-z\s&]+) \([^\)]*([\\d,\.]+)\s*([km])\)', re.IGNORECASE | re.MULTILINE)
+]
+POPULATION_PATTERN = re.compile(r'Population[^\d]*(\d[\d\s,]+)', re.IGNORECASE)
+INCOME_PATTERN = re.compile(r'[Rr]evenu.*?([\d\s,]+)\s*€')
+INFRASTRUCTURE_PATTERNS = [
+    re.compile(r'\*\*([^\*]+(?:[Ss]tade|[Pp]iscine|[Gg]ym|[Cc]omplexe)[^\*]*)\*\*[^\n]*([^\n]+)', re.IGNORECASE),
+    re.compile(r'([A-Z][^\n]*(?:Stade|Piscine|Gym|Complexe)[^\n]*)[^\d]*(\d+[^\n]*)', re.IGNORECASE)
+]
+VISITOR_PATTERNS = [
+    re.compile(r'([\d\s,]+)\s*(?:visiteurs|nuitées|touristes)', re.IGNORECASE),
+    re.compile(r'([\d\s,]+)\s*(?:entrées|passages)', re.IGNORECASE)
+]
+COMPETITOR_TABLE_PATTERN = re.compile(r'\|\s*([^|]+)\s*\|\s*([^|]+)\s*\|\s*([^|]+)\s*\|')
+NUMBER_PATTERN = re.compile(r'([\d,\.]+)')
+BIKE_LANES_PATTERN = re.compile(r'([\d,\.]+)\s*km.*?(?:pistes?|cyclables?)', re.IGNORECASE)
+
+# Bloc JSON des réponses LLM : ```json prioritaire, sinon premier bloc ``` (fermeture optionnelle)
+LLM_JSON_FENCE_PATTERN = re.compile(r'```json(.*?)(?:```|\Z)', re.DOTALL)
+LLM_FENCE_PATTERN = re.compile(r'```(.*?)(?:```|\Z)', re.DOTALL)
+
+# Géocodage Nominatim : une session partagée, résultats mémorisés par adresse
+GEOCODER_USER_AGENT = "polco_decathlon_analysis"
+GEOCODE_CACHE_MAXSIZE = 2048
+GEOCODE_TIMEOUT = 10
+
+# Réseaux OSMnx déjà téléchargés et enrichis (vitesses, temps de parcours)
+OSM_GRAPH_CACHE_MAXSIZE = 8
+OSM_GRAPH_CACHE_SUBDIR = "_osm_cache"
+
+# Shapely 2 : construction de polygones en lot à partir de tableaux NumPy
+HAS_SHAPELY_VECTORIZED = HAS_REALISTIC_LIBS and hasattr(shapely, 'linearrings')
+
+# Ellipsoïde partagé pour les calculs d'aires (un seul contexte PROJ)
+_GEOD_WGS84 = Geod(ellps="WGS84") if HAS_REALISTIC_LIBS else None
+
 # Configuration des logs
 logging.basicConfig(
     level=logging.INFO,
@@ -93,13 +179,64 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+_geolocator = None
+_geolocator_lock = threading.Lock()
+
+
+def get_geolocator() -> Nominatim:
+    """Géocodeur Nominatim partagé, connexions HTTP keep-alive poolées."""
+    global _geolocator
+    if _geolocator is None:
+        with _geolocator_lock:
+            if _geolocator is None:
+                _geolocator = Nominatim(
+                    user_agent=GEOCODER_USER_AGENT,
+                    adapter_factory=lambda proxies, ssl_context: RequestsAdapter(
+                        proxies=proxies,
+                        ssl_context=ssl_context,
+                        pool_connections=HTTP_POOL_CONNECTIONS,
+                        pool_maxsize=HTTP_POOL_MAXSIZE,
+                        max_retries=Retry(total=3, backoff_factor=0.5)
+                    )
+                )
+    return _geolocator
+
+
+@lru_cache(maxsize=GEOCODE_CACHE_MAXSIZE)
+def _geocode_cached(address: str) -> Optional[tuple]:
+    """(lat, lon) d'une adresse, ou None si introuvable. Les erreurs réseau ne sont pas mémorisées."""
+    location = get_geolocator().geocode(address, timeout=GEOCODE_TIMEOUT)
+    if location:
+        return location.latitude, location.longitude
+    return None
+
+
 class RealisticIsochroneGenerator:
     """Générateur d'isochrones basé sur le réseau routier réel"""
     
-    def __init__(self, openrouteservice_key=None, here_api_key=None):
+    def __init__(self, openrouteservice_key=None, here_api_key=None, graph_cache_dir=None):
         self.ors_key = openrouteservice_key
         self.here_key = here_api_key
         
+        # Cache des graphes OSMnx : LRU en mémoire + GraphML sur disque (optionnel)
+        self.graph_cache_dir = graph_cache_dir
+        self._graph_cache = OrderedDict()
+        self._origin_nodes = {}
+        self._graph_cache_lock = threading.Lock()
+        
+        # Session réutilisée entre les appels : TCP + TLS négociés une seule fois par hôte
+        self._http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_CONNECTIONS,
+            pool_maxsize=HTTP_POOL_MAXSIZE,
+            max_retries=Retry(total=HTTP_MAX_RETRIES, backoff_factor=HTTP_BACKOFF_FACTOR)
+        )
+        self._http.mount('https://', adapter)
+        self._api_semaphore = threading.Semaphore(ISOCHRONE_API_CONCURRENCY)
+        
+        # Facteurs directionnels interpolés sur APPROX_BEARINGS_DEG, par mode de transport
+        self._dir_factor_tables = {}
+        
     def get_real_isochrones(self, lat, lon, times=[10, 20, 30], transport_mode='car'):
         """Génère des isochrones réelles basées sur le réseau routier"""
         methods = [
@@ -121,6 +258,31 @@ class RealisticIsochroneGenerator:
         
         raise Exception("Impossible de générer des isochrones avec tous les services")
     
+    def get_real_isochrones_batch(self, points, times=[10, 20, 30], transport_mode='car'):
+        """
+        Isochrones de plusieurs points (lat, lon) en parallèle sur la session partagée.
+        
+        Retourne une liste alignée sur points ; None pour un point en échec.
+        """
+        results = [None] * len(points)
+        if not points:
+            return results
+        
+        with ThreadPoolExecutor(max_workers=min(ISOCHRONE_BATCH_WORKERS, len(points))) as executor:
+            futures = {
+                executor.submit(self.get_real_isochrones, lat, lon, times, transport_mode): i
+                for i, (lat, lon) in enumerate(points)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    lat, lon = points[i]
+                    logger.warning(f"Échec isochrones ({lat}, {lon}): {e}")
+        
+        return results
+    
     def _get_ors_isochrones(self, lat, lon, times, transport_mode):
         """OpenRouteService - Service gratuit avec limite"""
         if not self.ors_key:
@@ -147,7 +309,8 @@ class RealisticIsochroneGenerator:
             "smoothing": 10
         }
         
-        response = requests.post(url, json=body, headers=headers, timeout=30)
+        with self._api_semaphore:
+            response = self._http.post(url, json=body, headers=headers, timeout=30)
         
         if response.status_code == 200:
             data = response.json()
@@ -160,10 +323,10 @@ class RealisticIsochroneGenerator:
                 isochrones.append({
                     'time': times[i],
                     'coordinates': folium_coords,
-                    'area_km2': self._calculate_polygon_area(folium_coords),
                     'method': 'openrouteservice'
                 })
             
+            self._assign_polygon_areas(isochrones)
             return isochrones
         
         return None
@@ -182,9 +345,7 @@ class RealisticIsochroneGenerator:
         mode = here_modes.get(transport_mode, 'car')
         url = "https://isoline.route.ls.hereapi.com/routing/7.2/calculateisoline.json"
         
-        isochrones = []
-        
-        for time_min in times:
+        def fetch(time_min):
             params = {
                 'apikey': self.here_key,
                 'start': f'geo!{lat},{lon}',
@@ -192,9 +353,16 @@ class RealisticIsochroneGenerator:
                 'range': str(time_min * 60),
                 'rangetype': 'time'
             }
-            
-            response = requests.get(url, params=params, timeout=30)
-            
+            with self._api_semaphore:
+                return self._http.get(url, params=params, timeout=30)
+        
+        # Un GET par seuil, en parallèle sur la même session (ordre des seuils conservé)
+        with ThreadPoolExecutor(max_workers=min(len(times), HTTP_POOL_MAXSIZE) or 1) as pool:
+            responses = list(pool.map(fetch, times))
+        
+        isochrones = []
+        
+        for time_min, response in zip(times, responses):
             if response.status_code == 200:
                 data = response.json()
                 
@@ -210,10 +378,10 @@ class RealisticIsochroneGenerator:
                     isochrones.append({
                         'time': time_min,
                         'coordinates': coords,
-                        'area_km2': self._calculate_polygon_area(coords),
                         'method': 'here_maps'
                     })
         
+        self._assign_polygon_areas(isochrones)
         return isochrones if isochrones else None
     
     def _get_osmnx_isochrones(self, lat, lon, times, transport_mode):
@@ -241,34 +409,32 @@ class RealisticIsochroneGenerator:
             max_time = max(times)
             search_radius = (speed_kmh * max_time / 60) * 1000 * 1.5
             
-            logger.info(f"Téléchargement du réseau {network_type} autour de {lat}, {lon}...")
-            G = ox.graph_from_point((lat, lon), dist=search_radius, network_type=network_type)
+            G, graph_key = self._get_osmnx_graph(lat, lon, search_radius, network_type, transport_mode, speed_kmh)
             
-            origin_node = ox.distance.nearest_nodes(G, lon, lat)
-            
-            G = ox.add_edge_speeds(G)
-            G = ox.add_edge_travel_times(G)
-            
-            for u, v, data in G.edges(data=True):
-                if transport_mode == 'car':
-                    data['speed_kph'] = min(data.get('speed_kph', speed_kmh), speed_kmh)
-                else:
-                    data['speed_kph'] = speed_kmh
-                    
-                data['travel_time'] = data['length'] / (data['speed_kph'] * 1000 / 3600)
+            origin_key = (graph_key, round(lat, 5), round(lon, 5))
+            origin_node = self._origin_nodes.get(origin_key)
+            if origin_node is None:
+                origin_node = ox.distance.nearest_nodes(G, lon, lat)
+                self._origin_nodes[origin_key] = origin_node
             
             isochrones = []
             
             for time_limit in times:
                 subgraph = nx.ego_graph(G, origin_node, radius=time_limit*60, distance='travel_time')
                 
-                node_points = []
-                for node in subgraph.nodes():
-                    node_data = G.nodes[node]
-                    node_points.append(Point(node_data['x'], node_data['y']))
+                # Coordonnées des nœuds atteints en un tableau (x=lon, y=lat), sans Point par nœud
+                node_count = subgraph.number_of_nodes()
+                nodes = G.nodes
+                xy = np.fromiter(
+                    (coord for node in subgraph.nodes() for coord in (nodes[node]['x'], nodes[node]['y'])),
+                    dtype=np.float64, count=2 * node_count
+                ).reshape(-1, 2)
                 
-                if len(node_points) >= 3:
-                    multipoint = MultiPoint(node_points)
+                if node_count >= 3:
+                    if HAS_SHAPELY_VECTORIZED:
+                        multipoint = shapely.multipoints(xy)
+                    else:
+                        multipoint = MultiPoint([tuple(p) for p in xy])
                     hull = multipoint.convex_hull
                     expanded = hull.buffer(0.001)
                     
@@ -278,17 +444,75 @@ class RealisticIsochroneGenerator:
                         isochrones.append({
                             'time': time_limit,
                             'coordinates': coords,
-                            'area_km2': self._calculate_polygon_area(coords),
-                            'nodes_count': len(node_points),
+                            'nodes_count': node_count,
                             'method': 'osmnx'
                         })
             
+            self._assign_polygon_areas(isochrones)
             return isochrones if isochrones else None
             
         except Exception as e:
             logger.warning(f"Erreur OSMnx: {e}")
             return None
     
+    def _get_osmnx_graph(self, lat, lon, search_radius, network_type, transport_mode, speed_kmh):
+        """
+        Réseau routier enrichi (vitesses plafonnées, temps de parcours) autour du point.
+        
+        Les graphes sont partagés par zone (~1 km, rayon arrondi au km) : LRU en mémoire,
+        puis GraphML sur disque, avant tout téléchargement Overpass.
+        """
+        center_lat, center_lon = round(lat, 2), round(lon, 2)
+        radius_km = int(search_radius / 1000) + 1
+        graph_key = (transport_mode, network_type, center_lat, center_lon, radius_km)
+        
+        with self._graph_cache_lock:
+            G = self._graph_cache.get(graph_key)
+            if G is not None:
+                self._graph_cache.move_to_end(graph_key)
+                return G, graph_key
+        
+        graph_path = None
+        if self.graph_cache_dir:
+            graph_path = os.path.join(
+                self.graph_cache_dir,
+                f"{transport_mode}_{network_type}_{center_lat:.2f}_{center_lon:.2f}_{radius_km}km.graphml"
+            )
+        
+        if graph_path and os.path.exists(graph_path):
+            logger.info(f"Réseau {network_type} chargé depuis le cache: {graph_path}")
+            G = ox.load_graphml(graph_path)
+        else:
+            # Centre arrondi : le rayon couvre l'écart (<1 km) avec le point demandé
+            logger.info(f"Téléchargement du réseau {network_type} autour de {lat}, {lon}...")
+            G = ox.graph_from_point((center_lat, center_lon), dist=(radius_km + 1) * 1000,
+                                    network_type=network_type)
+            
+            G = ox.add_edge_speeds(G)
+            G = ox.add_edge_travel_times(G)
+            
+            for u, v, data in G.edges(data=True):
+                if transport_mode == 'car':
+                    data['speed_kph'] = min(data.get('speed_kph', speed_kmh), speed_kmh)
+                else:
+                    data['speed_kph'] = speed_kmh
+                    
+                data['travel_time'] = data['length'] / (data['speed_kph'] * 1000 / 3600)
+            
+            if graph_path:
+                try:
+                    os.makedirs(self.graph_cache_dir, exist_ok=True)
+                    ox.save_graphml(G, graph_path)
+                except Exception as e:
+                    logger.warning(f"Cache réseau non écrit ({graph_path}): {e}")
+        
+        with self._graph_cache_lock:
+            self._graph_cache[graph_key] = G
+            while len(self._graph_cache) > OSM_GRAPH_CACHE_MAXSIZE:
+                self._graph_cache.popitem(last=False)
+        
+        return G, graph_key
+    
     def _get_smart_approximation(self, lat, lon, times, transport_mode):
         """Approximation intelligente tenant compte des contraintes géographiques"""
         logger.info("Utilisation de l'approximation intelligente...")
@@ -321,93 +545,132 @@ class RealisticIsochroneGenerator:
         base_speed = mode_params['base_speed']
         directions = mode_params['directions']
         
-        isochrones = []
+        # Facteurs directionnels par cap : ne dépendent que du mode, calculés une fois
+        dir_factors = self._dir_factor_tables.get(transport_mode)
+        if dir_factors is None:
+            dir_factors = self._interpolate_direction_factors(APPROX_BEARINGS_DEG, directions)
+            self._dir_factor_tables[transport_mode] = dir_factors
         
-        for time_minutes in times:
-            base_distance = (base_speed * time_minutes) / 60
-            
-            points = []
-            
-            for bearing in range(0, 360, 5):
-                dir_factor = self._interpolate_direction_factor(bearing, directions)
-                adjusted_distance = base_distance * dir_factor
-                local_variation = np.random.uniform(0.85, 1.15)
-                final_distance = adjusted_distance * local_variation
-                
-                point = geodesic(kilometers=final_distance).destination((lat, lon), bearing)
-                points.append([point.latitude, point.longitude])
-            
-            smoothed_points = self._smooth_isochrone_shape(points)
-            
-            isochrones.append({
+        # Tous les seuils et tous les caps en une passe, tableaux (seuils, caps) :
+        # variation locale, destination sur la sphère (formule directe du grand
+        # cercle) puis lissage du contour
+        base_distances = base_speed * np.asarray(times, dtype=np.float64) / 60
+        local_variation = _rng.uniform(0.85, 1.15, size=(len(times), APPROX_BEARINGS_DEG.size))
+        final_distances = base_distances[:, None] * dir_factors * local_variation
+        
+        points = self._destination_points(lat, lon, APPROX_BEARINGS_DEG, final_distances)
+        smoothed_contours = self._smooth_isochrone_shape(points)
+        
+        isochrones = [
+            {
                 'time': time_minutes,
                 'coordinates': smoothed_points,
-                'area_km2': self._calculate_polygon_area(smoothed_points),
                 'method': 'smart_approximation'
-            })
+            }
+            for time_minutes, smoothed_points in zip(times, smoothed_contours)
+        ]
         
+        self._assign_polygon_areas(isochrones)
         return isochrones
     
-    def _interpolate_direction_factor(self, bearing, direction_factors):
-        """Interpolation des facteurs directionnels"""
+    @staticmethod
+    def _interpolate_direction_factors(bearings, direction_factors):
+        """Interpolation linéaire (circulaire) des facteurs directionnels pour un tableau de caps"""
         directions = sorted(direction_factors.keys())
+        factors = [direction_factors[d] for d in directions]
         
-        for i, dir_angle in enumerate(directions):
-            if bearing <= dir_angle:
-                if i == 0:
-                    prev_dir = directions[-1] - 360
-                    next_dir = dir_angle
-                else:
-                    prev_dir = directions[i-1]
-                    next_dir = dir_angle
-                break
-        else:
-            prev_dir = directions[-1]
-            next_dir = directions[0] + 360
-        
-        if bearing < prev_dir:
-            bearing += 360
-            
-        weight = (bearing - prev_dir) / (next_dir - prev_dir)
-        prev_factor = direction_factors.get(prev_dir % 360, 1.0)
-        next_factor = direction_factors.get(next_dir % 360, 1.0)
+        # Axe replié : le dernier cap avant 0° et le premier après 360° bouclent le cercle
+        xp = np.array([directions[-1] - 360] + directions + [directions[0] + 360], dtype=np.float64)
+        fp = np.array([factors[-1]] + factors + [factors[0]], dtype=np.float64)
         
-        return prev_factor * (1 - weight) + next_factor * weight
+        return np.interp(np.mod(bearings, 360), xp, fp)
+    
+    @staticmethod
+    def _destination_points(lat, lon, bearings_deg, distances_km):
+        """
+        Points [lat, lon] atteints depuis (lat, lon) pour chaque cap/distance.
+        
+        distances_km peut porter des dimensions en tête (un contour par ligne) ;
+        le résultat est un tableau de forme distances_km.shape + (2,).
+        """
+        lat1 = np.radians(lat)
+        lon1 = np.radians(lon)
+        theta = np.radians(bearings_deg)
+        delta = np.asarray(distances_km, dtype=np.float64) / EARTH_RADIUS_KM
+        
+        sin_lat1, cos_lat1 = np.sin(lat1), np.cos(lat1)
+        sin_delta, cos_delta = np.sin(delta), np.cos(delta)
+        
+        lat2 = np.arcsin(sin_lat1 * cos_delta + cos_lat1 * sin_delta * np.cos(theta))
+        lon2 = lon1 + np.arctan2(np.sin(theta) * sin_delta * cos_lat1,
+                                 cos_delta - sin_lat1 * np.sin(lat2))
+        
+        return np.stack([np.degrees(lat2), np.degrees(lon2)], axis=-1)
     
     def _smooth_isochrone_shape(self, points, iterations=2):
         """Lisse la forme de l'isochrone pour un aspect plus naturel"""
-        smoothed = points[:]
+        # Moyenne pondérée (0.25, 0.5, 0.25) avec les voisins, le contour étant fermé.
+        # Les points sont sur l'avant-dernier axe : plusieurs contours lissés d'un coup
+        smoothed = np.asarray(points, dtype=np.float64)
         
         for _ in range(iterations):
-            new_points = []
-            for i in range(len(smoothed)):
-                prev_idx = (i - 1) % len(smoothed)
-                next_idx = (i + 1) % len(smoothed)
-                
-                current = smoothed[i]
-                prev_point = smoothed[prev_idx]
-                next_point = smoothed[next_idx]
-                
-                smooth_lat = (prev_point[0] * 0.25 + current[0] * 0.5 + next_point[0] * 0.25)
-                smooth_lon = (prev_point[1] * 0.25 + current[1] * 0.5 + next_point[1] * 0.25)
-                
-                new_points.append([smooth_lat, smooth_lon])
-            
-            smoothed = new_points
+            smoothed = (0.25 * np.roll(smoothed, 1, axis=-2) + 0.5 * smoothed
+                        + 0.25 * np.roll(smoothed, -1, axis=-2))
         
-        return smoothed
+        return smoothed.tolist()
     
     def _calculate_polygon_area(self, coordinates):
         """Calcule l'aire d'un polygone en km²"""
+        return self._calculate_polygon_areas([coordinates])[0]
+    
+    def _calculate_polygon_areas(self, coordinates_list):
+        """Calcule l'aire (km²) de plusieurs polygones [[lat, lon], ...] en un seul lot"""
+        areas = [0.0] * len(coordinates_list)
+        if not HAS_REALISTIC_LIBS:
+            return areas
+        
+        valid = [i for i, coords in enumerate(coordinates_list) if len(coords) >= 3]
+        if not valid:
+            return areas
+        
         try:
-            if HAS_REALISTIC_LIBS and len(coordinates) >= 3:
-                poly = Polygon([(coord[1], coord[0]) for coord in coordinates])
-                geod = Geod(ellps="WGS84")
-                area_m2 = abs(geod.geometry_area_perimeter(poly)[0])
-                return area_m2 / 1_000_000
-        except:
-            pass
-        return 0.0
+            # (lat, lon) -> (lon, lat) pour shapely/pyproj
+            arrays = [np.asarray(coordinates_list[i], dtype=np.float64)[:, ::-1] for i in valid]
+            if HAS_SHAPELY_VECTORIZED:
+                ring_indices = np.repeat(np.arange(len(arrays)), [len(a) for a in arrays])
+                polygons = shapely.polygons(shapely.linearrings(np.concatenate(arrays), indices=ring_indices))
+            else:
+                polygons = [Polygon(a) for a in arrays]
+        except Exception:
+            # Un contour invalide fait échouer le lot : repli polygone par polygone
+            if len(valid) == 1:
+                return areas
+            return [self._calculate_polygon_area(coords) for coords in coordinates_list]
+        
+        for i, poly in zip(valid, polygons):
+            try:
+                areas[i] = abs(_GEOD_WGS84.geometry_area_perimeter(poly)[0]) / 1_000_000
+            except Exception:
+                pass
+        return areas
+    
+    def _assign_polygon_areas(self, isochrones):
+        """Renseigne 'area_km2' de chaque isochrone, aires calculées en lot"""
+        areas = self._calculate_polygon_areas([iso['coordinates'] for iso in isochrones])
+        for iso, area in zip(isochrones, areas):
+            iso['area_km2'] = area
+    
+    
+    @staticmethod
+    def _max_distance_km(center_lat, center_lon, coords):
+        """Distance max (haversine, km) entre le centre et les sommets [[lat, lon], ...]"""
+        coords_arr = np.radians(np.asarray(coords, dtype=np.float64))
+        lat1, lon1 = np.radians(center_lat), np.radians(center_lon)
+        lats, lons = coords_arr[:, 0], coords_arr[:, 1]
+        
+        a = (np.sin((lats - lat1) / 2) ** 2
+             + np.cos(lat1) * np.cos(lats) * np.sin((lons - lon1) / 2) ** 2)
+        return float((2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))).max())
     
     def validate_isochrones(self, isochrones, center_lat, center_lon):
         """Valide que les isochrones sont cohérentes et réalistes"""
@@ -420,10 +683,7 @@ class RealisticIsochroneGenerator:
             if len(coords) < 3:
                 continue
             
-            max_distance = 0
-            for coord in coords:
-                dist = geodesic((center_lat, center_lon), (coord[0], coord[1])).kilometers
-                max_distance = max(max_distance, dist)
+            max_distance = self._max_distance_km(center_lat, center_lon, coords)
             
             max_realistic_distance = {
                 5: 8, 10: 15, 15: 22, 20: 25, 30: 40
@@ -448,12 +708,13 @@ class PolcoGeoProcessor:
         self.model = None
         self.output_dir = "analytics_charts"
         self.maps_output_dir = "geo_maps"
-        self.geolocator = Nominatim(user_agent="polco_decathlon_analysis")
+        self.geolocator = get_geolocator()
         
         # Générateur d'isochrones réalistes
         self.isochrone_generator = RealisticIsochroneGenerator(
             openrouteservice_key=os.getenv('OPENROUTESERVICE_KEY'),
-            here_api_key=os.getenv('HERE_API_KEY')
+            here_api_key=os.getenv('HERE_API_KEY'),
+            graph_cache_dir=os.path.join(self.maps_output_dir, OSM_GRAPH_CACHE_SUBDIR)
         )
         
         # Générateur d'isochrones précises (nouvelle version)
@@ -464,6 +725,11 @@ class PolcoGeoProcessor:
         else:
             self.precise_isochrone_mapper = None
         
+        # Navigateurs headless réutilisés d'une conversion HTML -> image à l'autre
+        self._pw = None
+        self._pw_browser = None
+        self._selenium_driver = None
+        
         # Créer les dossiers de sortie
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.maps_output_dir, exist_ok=True)
@@ -496,41 +762,96 @@ class PolcoGeoProcessor:
         logger.error("❌ Impossible de convertir en image. HTML conservé.")
         return html_path
     
+    def _get_playwright_browser(self):
+        """Chromium Playwright lancé une seule fois (relancé s'il a été perdu)."""
+        if self._pw_browser is None or not self._pw_browser.is_connected():
+            if self._pw is None:
+                self._pw = sync_playwright().start()
+            self._pw_browser = self._pw.chromium.launch(headless=True)
+            atexit.register(self.close)
+        return self._pw_browser
+    
+    def _get_selenium_driver(self):
+        """Chrome Selenium lancé une seule fois pour toutes les conversions."""
+        if self._selenium_driver is None:
+            chrome_options = Options()
+            chrome_options.add_argument("--headless")
+            chrome_options.add_argument("--no-sandbox")
+            chrome_options.add_argument("--disable-dev-shm-usage")
+            chrome_options.add_argument("--window-size=1200,800")
+            
+            self._selenium_driver = webdriver.Chrome(options=chrome_options)
+            atexit.register(self.close)
+        return self._selenium_driver
+    
+    def close(self):
+        """Ferme les navigateurs headless ouverts pour les conversions."""
+        # Plus rien à fermer en sortie de processus : libérer la référence tenue par atexit
+        atexit.unregister(self.close)
+        if self._pw_browser is not None:
+            try:
+                self._pw_browser.close()
+            except Exception as e:
+                logger.debug(f"Fermeture Chromium Playwright: {e}")
+            self._pw_browser = None
+        if self._pw is not None:
+            try:
+                self._pw.stop()
+            except Exception as e:
+                logger.debug(f"Arrêt Playwright: {e}")
+            self._pw = None
+        self._close_selenium_driver()
+    
+    def _close_selenium_driver(self):
+        """Ferme le Chrome Selenium partagé s'il est ouvert."""
+        if self._selenium_driver is not None:
+            try:
+                self._selenium_driver.quit()
+            except Exception as e:
+                logger.debug(f"Fermeture Chrome Selenium: {e}")
+            self._selenium_driver = None
+    
     def _convert_with_playwright(self, html_path: str, image_path: str) -> str:
-        """Conversion avec Playwright."""
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page(viewport={'width': 1200, 'height': 800})
-            
+        """Conversion avec Playwright (navigateur partagé, une page par carte)."""
+        page = self._get_playwright_browser().new_page(viewport={'width': 1200, 'height': 800})
+        
+        try:
             # Charger la carte HTML
             page.goto(f"file://{os.path.abspath(html_path)}")
             
-            # Attendre que la carte soit complètement chargée
-            page.wait_for_timeout(3000)  # 3 secondes
+            # Attendre le réseau au repos et les premières tuiles, puis l'animation
+            try:
+                page.wait_for_load_state('networkidle', timeout=MAP_LOAD_TIMEOUT_MS)
+                page.wait_for_selector(MAP_TILES_SELECTOR, timeout=MAP_TILES_TIMEOUT_MS)
+            except Exception as e:
+                logger.debug(f"Tuiles non confirmées ({html_path}): {e}")
+            page.wait_for_timeout(MAP_SETTLE_MS)
             
             # Prendre une capture d'écran
             page.screenshot(path=image_path, full_page=True)
-            browser.close()
             
             logger.info(f"✅ Image générée avec Playwright: {image_path}")
             return image_path
+            
+        finally:
+            page.close()
     
     def _convert_with_selenium(self, html_path: str, image_path: str) -> str:
-        """Conversion avec Selenium."""
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--window-size=1200,800")
-        
-        driver = webdriver.Chrome(options=chrome_options)
+        """Conversion avec Selenium (navigateur partagé)."""
+        driver = self._get_selenium_driver()
         
         try:
             # Charger la carte HTML
             driver.get(f"file://{os.path.abspath(html_path)}")
             
-            # Attendre que la carte soit chargée
-            time.sleep(3)
+            # Attendre que toutes les tuiles soient chargées, puis l'animation
+            try:
+                WebDriverWait(driver, MAP_LOAD_TIMEOUT_MS / 1000).until(
+                    lambda d: d.execute_script(MAP_TILES_READY_JS)
+                )
+            except Exception as e:
+                logger.debug(f"Tuiles non confirmées ({html_path}): {e}")
+            time.sleep(MAP_SETTLE_MS / 1000)
             
             # Prendre une capture d'écran
             driver.save_screenshot(image_path)
@@ -538,8 +859,10 @@ class PolcoGeoProcessor:
             logger.info(f"✅ Image générée avec Selenium: {image_path}")
             return image_path
             
-        finally:
-            driver.quit()
+        except Exception:
+            # Session probablement cassée : la relancer à la prochaine conversion
+            self._close_selenium_driver()
+            raise
     
     def save_map_as_image(self, folium_map, store_id: str, map_type: str) -> str:
         """Sauve une carte Folium directement en image."""
@@ -570,7 +893,8 @@ class PolcoGeoProcessor:
         """Récupère le contenu complet de captation depuis Firestore."""
         try:
             doc_ref = self.db.collection(self.captation_collection).document(f"store_{store_id}")
-            doc = doc_ref.get()
+            # Seul prompts_results est utilisé : ne pas transférer ni décoder le reste du document
+            doc = doc_ref.get(field_paths=['prompts_results'])
             
             if not doc.exists:
                 logger.error(f"❌ Données de captation non trouvées pour le magasin {store_id}")
@@ -578,15 +902,17 @@ class PolcoGeoProcessor:
             
             captation_data = doc.to_dict()
             
-            # Fusionner tous les résultats de captation
-            captation_content = "=== RÉSULTATS DE CAPTATION GÉOGRAPHIQUE ===\n\n"
+            # Fusionner tous les résultats de captation (une seule jointure)
+            parts = ["=== RÉSULTATS DE CAPTATION GÉOGRAPHIQUE ===\n\n"]
             prompts_results = captation_data.get('prompts_results', {})
             
             for key, value in prompts_results.items():
                 if isinstance(value, dict) and 'response' in value:
-                    captation_content += f"--- {key.upper()} ---\n{value['response']}\n\n"
+                    parts.append(f"--- {key.upper()} ---\n{value['response']}\n\n")
                 elif isinstance(value, dict) and 'result' in value:
-                    captation_content += f"--- {key.upper()} ---\n{value['result']}\n\n"
+                    parts.append(f"--- {key.upper()} ---\n{value['result']}\n\n")
+            
+            captation_content = "".join(parts)
             
             logger.info(f"✅ Contenu de captation récupéré pour le magasin {store_id}")
             return captation_content
@@ -699,21 +1025,27 @@ EXIGENCES RENFORCÉES:
 JSON de sortie:
 """
             
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
+            # Captation inchangée -> même prompt : réponse servie par le cache disque LLM
+            cache = get_generative_cache()
+            cache_key = GenerativeCache.make_key('geo_structure', MODEL_NAME, prompt)
+            raw_response = cache.get(cache_key, MODEL_NAME, None)
+            from_cache = raw_response is not None
+            if not from_cache:
+                response = self.model.generate_content(prompt)
+                raw_response = response.text.strip()
+            response_text = raw_response
+            
+            # Extraire le JSON du bloc de code éventuel, sans recopier la réponse
+            match = LLM_JSON_FENCE_PATTERN.search(response_text) or LLM_FENCE_PATTERN.search(response_text)
+            if match:
+                response_text = match.group(1).strip()
             
-            # Nettoyer la réponse pour extraire le JSON
-            if '```json' in response_text:
-                json_start = response_text.find('```json') + 7
-                json_end = response_text.find('```', json_start)
-                response_text = response_text[json_start:json_end].strip()
-            elif '```' in response_text:
-                json_start = response_text.find('```') + 3
-                json_end = response_text.find('```', json_start)
-                response_text = response_text[json_start:json_end].strip()
+            # Parser le JSON (orjson.JSONDecodeError hérite de json.JSONDecodeError)
+            structured_data = orjson.loads(response_text) if HAS_ORJSON else json.loads(response_text)
             
-            # Parser le JSON
-            structured_data = json.loads(response_text)
+            # Ne mettre en cache qu'une réponse exploitable
+            if not from_cache:
+                cache.set(cache_key, raw_response, MODEL_NAME, None)
             
             logger.info(f"✅ Données structurées par LLM pour magasin {store_id}")
             logger.info(f"📊 Résumé: {len(structured_data.get('competitors', []))} concurrents, {len(structured_data.get('sports_infrastructure', []))} infrastructures")
@@ -733,15 +1065,8 @@ JSON de sortie:
         store_info = {}
         
         # Rechercher les informations du magasin
-        store_patterns = {
-            'name': r'\*\*Nom :\*\* (.+)',
-            'address': r'\*\*Adresse :\*\* (.+)',
-            'coordinates': r'Latitude : ([\d.]+), Longitude : ([\d.]+)',
-            'surface': r'(\d+) ?m²'
-        }
-        
-        for key, pattern in store_patterns.items():
-            match = re.search(pattern, content, re.IGNORECASE)
+        for key, pattern in STORE_ZONE_PATTERNS.items():
+            match = pattern.search(content)
             if match:
                 if key == 'coordinates':
                     store_info['latitude'] = float(match.group(1))
@@ -758,14 +1083,8 @@ JSON de sortie:
         competitors = []
         
         # Rechercher les concurrents avec pattern flexible
-        competitor_patterns = [
-            r'\*\*([^\*]+)\*\* ?: ?([^,\n]+)[,\n].*?[Dd]istance[^\d]*([\d,\.]*)\s*([km])',
-            r'([A-Z][^\n]*Sport[^\n]*) ?[:-] ?([^\n]+distance[^\d]*([\d,\.]*)\s*([km]))',
-            r'([A-Z][A-Za-z\s&]+) \([^\)]*([\\d,\.]+)\s*([km])\)'
-        ]
-        
-        for pattern in competitor_patterns:
-            matches = re.finditer(pattern, content, re.IGNORECASE | re.MULTILINE)
+        for pattern in COMPETITOR_PATTERNS:
+            matches = pattern.finditer(content)
             for match in matches:
                 try:
                     name = match.group(1).strip()
@@ -788,11 +1107,11 @@ JSON de sortie:
         demographics = {}
         
         # Population et revenus
-        population_match = re.search(r'Population[^\d]*(\d[\d\s,]+)', content, re.IGNORECASE)
+        population_match = POPULATION_PATTERN.search(content)
         if population_match:
             demographics['population'] = int(population_match.group(1).replace(' ', '').replace(',', ''))
         
-        income_match = re.search(r'[Rr]evenu.*?([\d\s,]+)\s*€', content)
+        income_match = INCOME_PATTERN.search(content)
         if income_match:
             demographics['median_income'] = int(income_match.group(1).replace(' ', '').replace(',', ''))
         
@@ -803,13 +1122,8 @@ JSON de sortie:
         infrastructures = []
         
         # Rechercher stades, piscines, etc.
-        infra_patterns = [
-            r'\*\*([^\*]+(?:[Ss]tade|[Pp]iscine|[Gg]ym|[Cc]omplexe)[^\*]*)\*\*[^\n]*([^\n]+)',
-            r'([A-Z][^\n]*(?:Stade|Piscine|Gym|Complexe)[^\n]*)[^\d]*(\d+[^\n]*)',
-        ]
-        
-        for pattern in infra_patterns:
-            matches = re.finditer(pattern, content, re.IGNORECASE)
+        for pattern in INFRASTRUCTURE_PATTERNS:
+            matches = pattern.finditer(content)
             for match in matches:
                 name = match.group(1).strip()
                 details = match.group(2) if len(match.groups()) > 1 else ''
@@ -832,13 +1146,8 @@ JSON de sortie:
         tourism = {}
         
         # Rechercher les chiffres de fréquentation
-        visitor_patterns = [
-            r'([\d\s,]+)\s*(?:visiteurs|nuitées|touristes)',
-            r'([\d\s,]+)\s*(?:entrées|passages)'
-        ]
-        
-        for pattern in visitor_patterns:
-            match = re.search(pattern, content, re.IGNORECASE)
+        for pattern in VISITOR_PATTERNS:
+            match = pattern.search(content)
             if match:
                 try:
                     visitors = int(match.group(1).replace(' ', '').replace(',', ''))
@@ -854,8 +1163,7 @@ JSON de sortie:
         competitors = []
         
         # Tableau de concurrents
-        table_pattern = r'\|\s*([^|]+)\s*\|\s*([^|]+)\s*\|\s*([^|]+)\s*\|'
-        matches = re.finditer(table_pattern, content)
+        matches = COMPETITOR_TABLE_PATTERN.finditer(content)
         
         for match in matches:
             enseigne = match.group(1).strip()
@@ -863,7 +1171,7 @@ JSON de sortie:
             distance = match.group(3).strip()
             
             if enseigne and enseigne not in ['Enseigne', ':---'] and len(enseigne) > 2:
-                distance_num = re.search(r'([\d,\.]+)', distance)
+                distance_num = NUMBER_PATTERN.search(distance)
                 if distance_num:
                     competitors.append({
                         'name': enseigne,
@@ -879,8 +1187,7 @@ JSON de sortie:
         mobility = {}
         
         # Rechercher les km de pistes cyclables
-        bike_pattern = r'([\d,\.]+)\s*km.*?(?:pistes?|cyclables?)'
-        match = re.search(bike_pattern, content, re.IGNORECASE)
+        match = BIKE_LANES_PATTERN.search(content)
         if match:
             mobility['bike_lanes_km'] = float(match.group(1).replace(',', '.'))
         
@@ -930,10 +1237,10 @@ JSON de sortie:
         
         for addr in addresses_to_try:
             try:
-                location = self.geolocator.geocode(addr, timeout=10)
+                location = _geocode_cached(addr)
                 if location:
-                    logger.info(f"✅ Géocodage réussi avec: {addr} -> {location.latitude:.4f}, {location.longitude:.4f}")
-                    return location.latitude, location.longitude
+                    logger.info(f"✅ Géocodage réussi avec: {addr} -> {location[0]:.4f}, {location[1]:.4f}")
+                    return location
             except Exception as e:
                 logger.debug(f"Échec géocodage {addr}: {e}")
                 continue
@@ -1402,6 +1709,19 @@ JSON de sortie:
             # Fallback vers l'ancienne méthode si nécessaire
             return self._get_fallback_isochrones(lat, lon, times)
     
+    def get_realistic_isochrones_batch(self, points: List[tuple], times: List[int] = [10, 20, 30],
+                                       transport_mode: str = 'car') -> List[List[Dict]]:
+        """Isochrones réalistes validées pour plusieurs magasins, requêtes API en parallèle."""
+        batch = self.isochrone_generator.get_real_isochrones_batch(points, times, transport_mode)
+        
+        results = []
+        for (lat, lon), isochrones in zip(points, batch):
+            if isochrones:
+                results.append(self.isochrone_generator.validate_isochrones(isochrones, lat, lon))
+            else:
+                results.append(self._get_fallback_isochrones(lat, lon, times))
+        return results
+    
     def _get_fallback_isochrones(self, lat: float, lon: float, times: List[int]) -> List[Dict]:
         """Méthode de fallback avec cercles approximatifs si les isochrones réalistes échouent."""
         logger.warning("🔄 Utilisation du mode fallback avec cercles approximatifs")
@@ -1979,6 +2299,9 @@ def main():
     except Exception as e:
         logger.error(f"❌ Erreur fatale: {e}")
         return 1
+    
+    finally:
+        processor.close()
 
 
 if __name__ == "__main__":
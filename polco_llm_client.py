@@ -6,18 +6,56 @@ Basée sur la méthode qui fonctionne dans polco_captation.py
 """
 
 import os
+import json
 import time
+import asyncio
+import re
+import random
+import hashlib
+import functools
 import logging
-from typing import Optional, Dict, Any, List
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Awaitable, Callable, AsyncIterator
 from datetime import datetime
 
-# Configuration des logs
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Sérialisation JSON rapide si orjson est disponible
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Configuration des logs : laissée au script appelant (analyzer, captation...)
 logger = logging.getLogger(__name__)
 
+def json_loads(data):
+    """Décode du JSON (str ou bytes) avec orjson si disponible."""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps_bytes(obj: Any) -> bytes:
+    """Encode en JSON UTF-8 (bytes) avec orjson si disponible."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+# Batching multi-prompts : plafond de sortie du modèle et marqueurs de découpage
+MAX_OUTPUT_TOKENS = 65535
+# Backoff exponentiel avec jitter entre tentatives (secondes)
+RETRY_WAIT_BASE = 5
+RETRY_WAIT_BASE_UNAVAILABLE = 15
+RETRY_WAIT_MAX = 60
+BATCH_RESPONSE_PATTERN = re.compile(r'^===RESPONSE (\d+)===[ \t]*$', re.MULTILINE)
+
+# Cache disque des réponses LLM (désactivable avec POLCO_LLM_CACHE=0)
+LLM_CACHE_DIR = os.environ.get("POLCO_LLM_CACHE_DIR", ".polco_llm_cache")
+LLM_CACHE_ENABLED = os.environ.get("POLCO_LLM_CACHE", "1") != "0"
+# Référentiel POLCO injecté dans les prompts de section
+POLCO_FR_FILE = "polcoFR.txt"
+
 
 class PolcoLLMClient:
     """Client LLM standardisé pour tous les modules POLCO."""
@@ -65,12 +103,109 @@ class PolcoLLMClient:
             logger.error(f"❌ Erreur initialisation client LLM: {e}")
             return False
     
+    def _ensure_initialized(self) -> bool:
+        """Initialise le client à la première utilisation."""
+        if not self.is_initialized:
+            if not self.check_credentials() or not self.init_client():
+                logger.error("❌ Client LLM non initialisé")
+                return False
+        return True
+    
+    def _build_request(self,
+                       prompt: str,
+                       temperature: float,
+                       max_tokens: int,
+                       use_google_search: bool,
+                       response_schema: Optional[Dict[str, Any]]) -> tuple:
+        """Construit le contenu et la configuration d'un appel generate_content."""
+        contents = [
+            self.genai_types.Content(
+                role="user",
+                parts=[self.genai_types.Part(text=prompt)]
+            )
+        ]
+        
+        # Outils (Google Search optionnel)
+        tools = []
+        if use_google_search:
+            tools.append(self.genai_types.Tool(google_search=self.genai_types.GoogleSearch()))
+        
+        generate_content_config = self.genai_types.GenerateContentConfig(
+            temperature=temperature,
+            max_output_tokens=max_tokens,  # Ajusté par l'appelant selon le prompt
+            safety_settings=[
+                self.genai_types.SafetySetting(
+                    category="HARM_CATEGORY_HATE_SPEECH",
+                    threshold="OFF"
+                ),
+                self.genai_types.SafetySetting(
+                    category="HARM_CATEGORY_DANGEROUS_CONTENT",
+                    threshold="OFF"
+                ),
+                self.genai_types.SafetySetting(
+                    category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                    threshold="OFF"
+                ),
+                self.genai_types.SafetySetting(
+                    category="HARM_CATEGORY_HARASSMENT",
+                    threshold="OFF"
+                )
+            ],
+            tools=tools if tools else None,
+            response_mime_type="application/json" if response_schema else None,
+            response_schema=response_schema,
+        )
+        return contents, generate_content_config
+    
+    def _extract_text(self, response) -> str:
+        """Extrait le texte de la première candidate avec logs clairs."""
+        if response and response.candidates and len(response.candidates) > 0:
+            candidate = response.candidates[0]
+            if candidate.content and candidate.content.parts and len(candidate.content.parts) > 0:
+                result = candidate.content.parts[0].text.strip()
+                logger.info(f"📥 Réponse reçue ({len(result)} chars)")
+                return result
+            logger.warning(f"⚠️ Réponse vide (finish_reason: {candidate.finish_reason})")
+            return ""
+        logger.warning("⚠️ Réponse malformée")
+        return ""
+    
+    @staticmethod
+    def _is_truncated(response) -> bool:
+        """Vrai si la génération s'est arrêtée sur le plafond de tokens (réponse coupée)."""
+        if response and response.candidates:
+            finish_reason = response.candidates[0].finish_reason
+            return getattr(finish_reason, 'name', str(finish_reason)) == 'MAX_TOKENS'
+        return False
+    
+    def _retry_wait_time(self, error: Exception, attempt: int, max_retries: int) -> Optional[float]:
+        """
+        Journalise l'erreur et retourne l'attente avant la tentative suivante (None si dernière).
+        
+        Backoff exponentiel avec jitter complet : l'attente est tirée dans
+        [0, min(RETRY_WAIT_MAX, base * 2^attempt)] pour que les magasins traités
+        en parallèle ne relancent pas tous leurs requêtes au même instant.
+        """
+        error_msg = str(error)
+        if "503" in error_msg or "Server disconnected" in error_msg or "Socket closed" in error_msg:
+            logger.warning(f"⚠️ Erreur 503/Connexion (tentative {attempt + 1}/{max_retries}): {error_msg}")
+            base = RETRY_WAIT_BASE_UNAVAILABLE  # Attente plus longue pour les erreurs 503
+        else:
+            logger.warning(f"⚠️ Erreur API Vertex (tentative {attempt + 1}/{max_retries}): {error_msg}")
+            base = RETRY_WAIT_BASE
+        if attempt >= max_retries - 1:
+            return None
+        wait_time = random.uniform(0, min(RETRY_WAIT_MAX, base * 2 ** attempt))
+        logger.info(f"⏳ Attente {wait_time:.1f}s avant nouvelle tentative...")
+        return wait_time
+    
     def generate_content(self, 
                         prompt: str, 
                         max_retries: int = 3, 
                         temperature: float = 0.1,
                         max_tokens: int = 8192,
-                        use_google_search: bool = False) -> Optional[str]:
+                        use_google_search: bool = False,
+                        response_schema: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """
         Génère du contenu avec le LLM avec gestion d'erreurs robuste.
         
@@ -80,52 +215,31 @@ class PolcoLLMClient:
             temperature: Température pour la génération
             max_tokens: Nombre maximum de tokens
             use_google_search: Utiliser Google Search ou non
+            response_schema: Schéma JSON imposé à la réponse (sortie structurée)
         
         Returns:
             Le contenu généré ou None en cas d'échec
         """
-        if not self.is_initialized:
-            if not self.check_credentials() or not self.init_client():
-                logger.error("❌ Client LLM non initialisé")
-                return None
+        result, _ = self._generate_content_checked(
+            prompt, max_retries, temperature, max_tokens, use_google_search, response_schema
+        )
+        return result
+    
+    def _generate_content_checked(self,
+                                  prompt: str,
+                                  max_retries: int,
+                                  temperature: float,
+                                  max_tokens: int,
+                                  use_google_search: bool,
+                                  response_schema: Optional[Dict[str, Any]]) -> Tuple[Optional[str], bool]:
+        """generate_content, en indiquant aussi si la réponse a été coupée (MAX_TOKENS)."""
+        if not self._ensure_initialized():
+            return None, False
         
         for attempt in range(max_retries):
             try:
-                # Configuration de l'appel
-                contents = [
-                    self.genai_types.Content(
-                        role="user",
-                        parts=[self.genai_types.Part(text=prompt)]
-                    )
-                ]
-                
-                # Outils (Google Search optionnel)
-                tools = []
-                if use_google_search:
-                    tools.append(self.genai_types.Tool(google_search=self.genai_types.GoogleSearch()))
-                
-                generate_content_config = self.genai_types.GenerateContentConfig(
-                    temperature=temperature,
-                    max_output_tokens=8192,  # Augmenter pour éviter MAX_TOKENS
-                    safety_settings=[
-                        self.genai_types.SafetySetting(
-                            category="HARM_CATEGORY_HATE_SPEECH",
-                            threshold="OFF"
-                        ),
-                        self.genai_types.SafetySetting(
-                            category="HARM_CATEGORY_DANGEROUS_CONTENT",
-                            threshold="OFF"
-                        ),
-                        self.genai_types.SafetySetting(
-                            category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                            threshold="OFF"
-                        ),
-                        self.genai_types.SafetySetting(
-                            category="HARM_CATEGORY_HARASSMENT",
-                            threshold="OFF"
-                        )
-                    ],
-                    tools=tools if tools else None,
+                contents, generate_content_config = self._build_request(
+                    prompt, temperature, max_tokens, use_google_search, response_schema
                 )
                 
                 # Appel non-streaming pour éviter les problèmes de MAX_TOKENS
@@ -136,50 +250,192 @@ class PolcoLLMClient:
                     config=generate_content_config
                 )
                 
-                # Traitement de la réponse avec logs clairs
-                if response and response.candidates and len(response.candidates) > 0:
-                    candidate = response.candidates[0]
-                    if candidate.content and candidate.content.parts and len(candidate.content.parts) > 0:
-                        result = candidate.content.parts[0].text.strip()
-                        logger.info(f"📥 Réponse reçue ({len(result)} chars)")
-                    else:
-                        result = ""
-                        logger.warning("⚠️ Réponse vide (finish_reason: {candidate.finish_reason})")
+                result = self._extract_text(response)
+                if result:
+                    truncated = self._is_truncated(response)
+                    if truncated:
+                        logger.warning(f"⚠️ Réponse coupée par la limite de {max_tokens} tokens")
+                    logger.info(f"✅ Génération LLM réussie ({len(result)} chars)")
+                    return result, truncated
                 else:
-                    result = ""
-                    logger.warning("⚠️ Réponse malformée")
+                    logger.warning(f"⚠️ Réponse vide (tentative {attempt + 1}/{max_retries})")
+                    
+            except Exception as e:
+                wait_time = self._retry_wait_time(e, attempt, max_retries)
+                if wait_time:
+                    time.sleep(wait_time)
+        
+        logger.error(f"❌ Échec définitif après {max_retries} tentatives")
+        return None, False
+    
+    async def generate_content_async(self,
+                                     prompt: str,
+                                     max_retries: int = 3,
+                                     temperature: float = 0.1,
+                                     max_tokens: int = 8192,
+                                     use_google_search: bool = False,
+                                     response_schema: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Variante asynchrone de generate_content (client.aio du SDK GenAI).
+        
+        Les attentes entre tentatives utilisent asyncio.sleep pour ne jamais
+        bloquer la boucle d'événements pendant qu'un autre magasin est traité.
+        """
+        if not self._ensure_initialized():
+            return None
+        
+        for attempt in range(max_retries):
+            try:
+                contents, generate_content_config = self._build_request(
+                    prompt, temperature, max_tokens, use_google_search, response_schema
+                )
                 
-                if result and len(result) > 0:  # Seuil très bas pour le test
+                logger.info(f"📤 Envoi prompt async ({len(prompt)} chars) vers {self.model_name}...")
+                response = await self.genai_client.aio.models.generate_content(
+                    model=self.model_name,
+                    contents=contents,
+                    config=generate_content_config
+                )
+                
+                result = self._extract_text(response)
+                if result:
                     logger.info(f"✅ Génération LLM réussie ({len(result)} chars)")
                     return result
                 else:
                     logger.warning(f"⚠️ Réponse vide (tentative {attempt + 1}/{max_retries})")
                     
             except Exception as e:
-                error_msg = str(e)
-                if "503" in error_msg or "Server disconnected" in error_msg or "Socket closed" in error_msg:
-                    logger.warning(f"⚠️ Erreur 503/Connexion (tentative {attempt + 1}/{max_retries}): {error_msg}")
-                    if attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 15  # Attente plus longue pour les erreurs 503
-                        logger.info(f"⏳ Attente {wait_time}s avant nouvelle tentative...")
-                        time.sleep(wait_time)
-                else:
-                    logger.warning(f"⚠️ Erreur API Vertex (tentative {attempt + 1}/{max_retries}): {error_msg}")
-                    if attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 5
-                        logger.info(f"⏳ Attente {wait_time}s avant nouvelle tentative...")
-                        time.sleep(wait_time)
+                wait_time = self._retry_wait_time(e, attempt, max_retries)
+                if wait_time:
+                    await asyncio.sleep(wait_time)
         
         logger.error(f"❌ Échec définitif après {max_retries} tentatives")
         return None
     
+    async def generate_stream_async(self,
+                                    prompt: str,
+                                    max_retries: int = 3,
+                                    temperature: float = 0.1,
+                                    max_tokens: int = 8192,
+                                    use_google_search: bool = False) -> AsyncIterator[str]:
+        """
+        Génère du contenu en streaming et produit les fragments de texte au fil de l'eau.
+        
+        Une nouvelle tentative n'est faite que si l'erreur survient avant le premier
+        fragment : une fois le flux entamé, l'erreur est propagée à l'appelant.
+        """
+        if not self._ensure_initialized():
+            return
+        
+        for attempt in range(max_retries):
+            received = False
+            try:
+                contents, generate_content_config = self._build_request(
+                    prompt, temperature, max_tokens, use_google_search, None
+                )
+                
+                logger.info(f"📤 Envoi prompt en streaming ({len(prompt)} chars) vers {self.model_name}...")
+                stream = await self.genai_client.aio.models.generate_content_stream(
+                    model=self.model_name,
+                    contents=contents,
+                    config=generate_content_config
+                )
+                async for chunk in stream:
+                    if chunk.text:
+                        received = True
+                        yield chunk.text
+                
+                if received:
+                    return
+                logger.warning(f"⚠️ Flux vide (tentative {attempt + 1}/{max_retries})")
+                
+            except Exception as e:
+                if received:
+                    raise
+                wait_time = self._retry_wait_time(e, attempt, max_retries)
+                if wait_time:
+                    await asyncio.sleep(wait_time)
+        
+        logger.error(f"❌ Échec définitif du streaming après {max_retries} tentatives")
+    
+    async def generate_simple_streamed(self,
+                                       prompt: str,
+                                       max_retries: int = 3,
+                                       temperature: float = 0.1,
+                                       max_tokens: int = 8192,
+                                       on_chunk: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """Génère sans Google Search en streaming ; on_chunk reçoit chaque fragment dès son arrivée."""
+        parts = []
+        async for text in self.generate_stream_async(prompt, max_retries, temperature, max_tokens):
+            parts.append(text)
+            if on_chunk:
+                on_chunk(text)
+        result = "".join(parts).strip()
+        if result:
+            logger.info(f"✅ Génération LLM (streaming) réussie ({len(result)} chars)")
+        return result or None
+    
     def generate_with_search(self, prompt: str, max_retries: int = 3, temperature: float = 0.1, max_tokens: int = 8192) -> Optional[str]:
         """Génère du contenu avec Google Search activé."""
         return self.generate_content(prompt, max_retries, temperature, max_tokens, use_google_search=True)
     
+    def generate_with_search_checked(self, prompt: str, max_retries: int = 3, temperature: float = 0.1, max_tokens: int = 8192) -> Tuple[Optional[str], bool]:
+        """generate_with_search, en indiquant aussi si la réponse a été coupée (MAX_TOKENS)."""
+        return self._generate_content_checked(prompt, max_retries, temperature, max_tokens, True, None)
+    
     def generate_simple(self, prompt: str, max_retries: int = 3, temperature: float = 0.1, max_tokens: int = 8192) -> Optional[str]:
         """Génère du contenu sans Google Search."""
         return self.generate_content(prompt, max_retries, temperature, max_tokens, use_google_search=False)
+    
+    async def generate_simple_async(self, prompt: str, max_retries: int = 3, temperature: float = 0.1, max_tokens: int = 8192) -> Optional[str]:
+        """Génère du contenu sans Google Search (version asynchrone)."""
+        return await self.generate_content_async(prompt, max_retries, temperature, max_tokens, use_google_search=False)
+    
+    def generate_batch(self, prompts: List[str], max_retries: int = 3, temperature: float = 0.1, max_tokens: int = 8192) -> List[Optional[str]]:
+        """
+        Regroupe plusieurs prompts indépendants dans un seul appel (sans Google Search).
+        
+        Chaque prompt est délimité par ===STORE i=== et le modèle doit répondre par
+        blocs ===RESPONSE i===. max_tokens est le budget par prompt : un appel ne
+        regroupe que MAX_OUTPUT_TOKENS // max_tokens prompts, pour que chacun garde
+        le budget de l'appel individuel. Les réponses manquantes, ou coupées par la
+        limite de tokens, valent None afin que l'appelant relance ces prompts seuls.
+        """
+        per_call = max(1, MAX_OUTPUT_TOKENS // max_tokens)
+        if len(prompts) > per_call:
+            responses: List[Optional[str]] = []
+            for start in range(0, len(prompts), per_call):
+                responses.extend(self.generate_batch(prompts[start:start + per_call], max_retries, temperature, max_tokens))
+            return responses
+        
+        if len(prompts) == 1:
+            return [self.generate_simple(prompts[0], max_retries, temperature, max_tokens)]
+        
+        parts = [
+            f"Tu vas recevoir {len(prompts)} demandes indépendantes, numérotées de 0 à {len(prompts) - 1}.\n"
+            "Traite chaque demande séparément et intégralement, sans mélanger leurs données.\n"
+            "Commence chaque réponse par une ligne contenant uniquement ===RESPONSE i=== "
+            "(i = numéro de la demande), dans l'ordre, sans autre texte avant ou entre les blocs.\n"
+        ]
+        for i, prompt in enumerate(prompts):
+            parts.append(f"\n\n===STORE {i}===\n\n{prompt}")
+        
+        result, truncated = self._generate_content_checked(
+            "".join(parts), max_retries, temperature, max_tokens * len(prompts), False, None
+        )
+        return split_batch_response(result, len(prompts), truncated)
+    
+    def generate_json(self, prompt: str, response_schema: Dict[str, Any], max_retries: int = 3, temperature: float = 0.1, max_tokens: int = 8192) -> Optional[Dict[str, Any]]:
+        """Génère une réponse structurée conforme au schéma JSON fourni (sans Google Search)."""
+        result = self.generate_content(prompt, max_retries, temperature, max_tokens,
+                                       use_google_search=False, response_schema=response_schema)
+        if not result:
+            return None
+        try:
+            return json_loads(result)
+        except ValueError as e:  # json.JSONDecodeError et orjson.JSONDecodeError en héritent
+            logger.error(f"❌ Réponse JSON invalide: {e}")
+            return None
 
 
 # Instance globale pour réutilisation
@@ -192,3 +448,140 @@ def get_llm_client(model_name: str = "gemini-2.5-pro") -> PolcoLLMClient:
         _llm_client = PolcoLLMClient(model_name=model_name)
         logger.info(f"🔄 Nouveau client LLM créé avec {model_name}")
     return _llm_client
+
+
+def split_batch_response(result: Optional[str], count: int, truncated: bool = False) -> List[Optional[str]]:
+    """
+    Découpe une réponse groupée en blocs ===RESPONSE i=== (None si un bloc manque).
+    
+    Si la réponse a été coupée (truncated), le dernier bloc est incomplet : seuls
+    les blocs suivis d'un autre marqueur sont conservés.
+    """
+    responses: List[Optional[str]] = [None] * count
+    if not result:
+        return responses
+    
+    markers = list(BATCH_RESPONSE_PATTERN.finditer(result))
+    if truncated and markers:
+        logger.warning(f"⚠️ Réponse groupée coupée: bloc {markers[-1].group(1)} ignoré")
+        result = result[:markers[-1].start()]
+        markers = markers[:-1]
+    for marker, next_marker in zip(markers, markers[1:] + [None]):
+        index = int(marker.group(1))
+        end = next_marker.start() if next_marker else len(result)
+        text = result[marker.end():end].strip()
+        if 0 <= index < count and text:
+            responses[index] = text
+    
+    missing = sum(1 for r in responses if r is None)
+    if missing:
+        logger.warning(f"⚠️ Réponse groupée incomplète: {missing}/{count} blocs manquants")
+    return responses
+
+class GenerativeCache:
+    """
+    Cache disque des réponses LLM, indexé par un hash BLAKE2 des entrées.
+    
+    Une entrée n'est servie que si le modèle et la température correspondent
+    à ceux de l'appel courant ; sinon la génération est relancée.
+    """
+    
+    def __init__(self, cache_dir: str = LLM_CACHE_DIR, enabled: bool = LLM_CACHE_ENABLED):
+        self.cache_dir = Path(cache_dir)
+        self.enabled = enabled
+    
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Calcule la clé de cache à partir des éléments qui déterminent la réponse."""
+        digest = hashlib.blake2b(digest_size=32)
+        for part in parts:
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+    
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+    
+    def get(self, key: str, model: str, temperature: float) -> Optional[str]:
+        """Retourne la réponse en cache si elle correspond au modèle et à la température."""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                entry = json_loads(f.read())
+        except (OSError, ValueError):
+            return None
+        if entry.get('model') != model or entry.get('temperature') != temperature:
+            return None
+        logger.info(f"♻️ Réponse LLM servie depuis le cache ({len(entry['response'])} chars)")
+        return entry['response']
+    
+    def set(self, key: str, response: str, model: str, temperature: float):
+        """Enregistre une réponse (écriture atomique)."""
+        if not self.enabled or not response:
+            return
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(json_dumps_bytes({
+                    'response': response,
+                    'model': model,
+                    'temperature': temperature,
+                    'output_length': len(response),
+                    'timestamp': datetime.now().isoformat()
+                }))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Écriture cache LLM impossible: {e}")
+    
+    def get_or_compute(self, key: str, compute: Callable[[], Optional[str]], model: str, temperature: float) -> Optional[str]:
+        """Retourne la réponse en cache ou l'obtient via compute() puis la met en cache."""
+        cached = self.get(key, model, temperature)
+        if cached is not None:
+            return cached
+        response = compute()
+        if response:
+            self.set(key, response, model, temperature)
+        return response
+    
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[Optional[str]]], model: str, temperature: float) -> Optional[str]:
+        """Variante asynchrone de get_or_compute."""
+        cached = self.get(key, model, temperature)
+        if cached is not None:
+            return cached
+        response = await compute()
+        if response:
+            self.set(key, response, model, temperature)
+        return response
+
+
+# Instance globale pour réutilisation
+_generative_cache = None
+
+def get_generative_cache() -> GenerativeCache:
+    """Retourne l'instance globale du cache de réponses LLM."""
+    global _generative_cache
+    if _generative_cache is None:
+        _generative_cache = GenerativeCache()
+    return _generative_cache
+
+
+@functools.cache
+def load_polco_fr() -> str:
+    """Charge polcoFR.txt une seule fois par processus (lève une exception si absent)."""
+    content = Path(POLCO_FR_FILE).read_text(encoding="utf-8")
+    logger.info(f"✅ polcoFR.txt chargé ({len(content)} caractères)")
+    return content
+
+
+async def gather_with_concurrency(coroutines: List[Awaitable[Any]], max_concurrency: int = 16) -> List[Any]:
+    """Exécute des coroutines en parallèle en limitant le nombre d'appels LLM simultanés."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def _bounded(coroutine):
+        async with semaphore:
+            return await coroutine
+    
+    return await asyncio.gather(*(_bounded(c) for c in coroutines))
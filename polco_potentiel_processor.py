@@ -5,17 +5,18 @@ Génère une analyse du potentiel de marché propre pour les rapports profession
 """
 
 import os
+import time
 import logging
 from typing import Dict, Any, Optional
 from datetime import datetime
 from polco_llm_client import get_llm_client
+from polco_firestore_client import get_captation_document
 
 # Configuration
 PROJECT_ID = "polcoaigeneration-ved6"
 REGION = "us-central1"
 MODEL_NAME = "gemini-2.5-flash"
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class PolcoPotentielProcessorV3:
@@ -39,16 +40,12 @@ class PolcoPotentielProcessorV3:
     def get_captation_results(self, store_id: str) -> str:
         """Récupère les résultats de captation depuis polco_magasins_enhanced."""
         try:
-            from google.cloud import firestore
-            db = firestore.Client(project="polcoaigeneration-ved6")
-            doc_ref = db.collection(self.captation_collection).document(f"store_{store_id}")
-            doc = doc_ref.get()
+            data = get_captation_document(self.captation_collection, store_id)
             
-            if not doc.exists:
+            if data is None:
                 logger.warning(f"⚠️ Aucun résultat de captation trouvé pour store {store_id}")
                 return ""
             
-            data = doc.to_dict()
             prompts_results = data.get('prompts_results', {})
             
             if len(prompts_results) < 6:
@@ -174,30 +171,16 @@ Génère maintenant le contenu complet et professionnel selon cette structure, e
             logger.info(f"📝 Prompt potentiel: {len(prompt)} caractères")
             
             # Générer l'analyse avec retry
-            start_time = datetime.now()
-            max_retries = 3
-            
-            for attempt in range(max_retries):
-                try:
-                    response_text = self.llm_client.generate_simple(
+            start_time = time.perf_counter()
+            # Les tentatives (backoff exponentiel avec jitter) sont gérées par le client LLM
+            response_text = self.llm_client.generate_simple(
                 prompt=prompt,
                 max_retries=3,
                 temperature=0.2,
-                max_tokens=32000
+                max_tokens=8192
             )
-                    break  # Succès, sortir de la boucle
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        wait_time = (attempt + 1) * 5
-                        logger.warning(f"⚠️ Erreur API Vertex (tentative {attempt + 1}/{max_retries}): {e}")
-                        logger.info(f"⏳ Attente {wait_time}s avant nouvelle tentative...")
-                        import time
-                        time.sleep(wait_time)
-                    else:
-                        raise e
             
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
+            duration = time.perf_counter() - start_time
             
             if response_text:
                 result_length = len(response_text)
@@ -227,6 +210,7 @@ Génère maintenant le contenu complet et professionnel selon cette structure, e
 
 def main():
     """Point d'entrée pour test."""
+    logging.basicConfig(level=logging.INFO)
     processor = PolcoPotentielProcessorV3()
     logger.info("📈 Test Processeur POTENTIEL v3 (Version Nettoyée)")
     logger.info("✅ Processeur POTENTIEL v3 initialisé")